@@ -0,0 +1,54 @@
+"""
+Measure end-to-end OpenFlights load time as the number of loading connections grows.
+
+Each run drops and recreates airports, airlines and routes in the target
+database, loads the .dat files with load_openflights() on a pool of the given
+size and builds the secondary indexes afterwards (unless --no-indexes).
+Connection settings come from the AUTOOPT_DB_* environment variables:
+
+    python benchmarks/bench_load.py [--workers 1 2 3] [--method auto|load_data|insert] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mariadb_autoopt.loader import load_openflights  # noqa: E402
+from mariadb_autoopt.pool import ConnectionPool, connection_settings_from_env, make_connection_factory  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "data"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--method", default="auto", choices=["auto", "load_data", "insert"])
+    parser.add_argument("--no-indexes", action="store_true", help="skip the secondary index build")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    factory = make_connection_factory(**connection_settings_from_env(local_infile=True))
+    print(f"{'workers':>7} {'load (s)':>9} {'indexes (s)':>12} {'total (s)':>10} {'rows/s':>10}  method")
+    baseline = None
+    for workers in args.workers:
+        runs = []
+        for _ in range(args.repeat):
+            with ConnectionPool(factory, size=workers) as pool:
+                runs.append(load_openflights(pool, args.data_dir, method=args.method,
+                                             indexes=not args.no_indexes, verbose=False))
+        total = statistics.median(r["seconds"] for r in runs)
+        # The slowest table's load and index build, for the run with the median total
+        run = sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2]
+        load = max(t["seconds"] for t in run["tables"].values())
+        indexes = max(t["index_seconds"] for t in run["tables"].values())
+        methods = sorted({t["method"] for t in run["tables"].values()})
+        baseline = baseline or total
+        print(f"{workers:>7} {load:9.2f} {indexes:12.2f} {total:10.2f} {run['rows'] / total:10,.0f}  "
+              f"{', '.join(methods)} ({baseline / total:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
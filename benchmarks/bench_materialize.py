@@ -0,0 +1,94 @@
+"""
+Compare peak memory and time of pd.read_sql_query against typed materialization.
+
+Each method runs the query on a fresh connection under tracemalloc, which
+sees the driver's row tuples, the Python strings and numpy's buffers. Arrow
+buffers are allocated outside Python, so for engine "arrow" the bytes
+pyarrow's memory pool still holds for the result are added. Connection
+settings come from the AUTOOPT_DB_* environment variables:
+
+    python benchmarks/bench_materialize.py [--query "SELECT * FROM airports"] [--repeat 3]
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mariadb_autoopt.materialize import read_typed  # noqa: E402
+from mariadb_autoopt.pool import connection_settings_from_env, make_connection_factory  # noqa: E402
+
+QUERIES = [
+    "SELECT * FROM airports",
+    "SELECT * FROM routes",
+    "SELECT a.name, r.equipment, r.stops FROM routes r JOIN airports a ON a.airport_id = r.source_airport_id",
+]
+
+
+def read_sql(conn, query):
+    import pandas as pd
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*pandas only supports SQLAlchemy connectable.*")
+        return pd.read_sql_query(query, conn)
+
+
+def arrow_pool():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pa.default_memory_pool()
+
+
+def measure(factory, query, method, repeat):
+    """Median seconds, median peak MiB and the DataFrame's deep size in MiB."""
+    seconds, peaks = [], []
+    size = 0.0
+    for _ in range(repeat):
+        conn = factory()
+        try:
+            gc.collect()
+            pool = arrow_pool() if method == "arrow" else None
+            arrow_base = pool.bytes_allocated() if pool else 0
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            df = read_sql(conn, query) if method == "read_sql_query" else read_typed(conn, query, engine=method)
+            seconds.append(time.perf_counter() - t0)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if pool:
+                peak += max(pool.bytes_allocated() - arrow_base, 0)
+            peaks.append(peak / 2**20)
+            size = df.memory_usage(deep=True).sum() / 2**20
+            del df
+        finally:
+            conn.close()
+    return statistics.median(seconds), statistics.median(peaks), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--query", action="append", help="query to measure (repeatable; default: a few OpenFlights extracts)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    factory = make_connection_factory(**connection_settings_from_env())
+    methods = ["read_sql_query", "numpy"] + (["arrow"] if arrow_pool() else [])
+    for query in args.query or QUERIES:
+        print(query)
+        print(f"  {'method':<16} {'seconds':>8} {'peak MiB':>9} {'df MiB':>8}")
+        for method in methods:
+            seconds, peak, size = measure(factory, query, method, args.repeat)
+            print(f"  {method:<16} {seconds:8.3f} {peak:9.1f} {size:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare page latency of LIMIT ... OFFSET against keyset pagination, by page number.
+
+The OFFSET query has to read and discard every earlier row, so its latency
+grows with the page number; the keyset query seeks to the last key of the
+previous page and stays flat. Connection settings come from the AUTOOPT_DB_*
+environment variables:
+
+    python benchmarks/bench_pagination.py [--table routes] [--page-size 50] [--pages 0 100 1000 4000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mariadb_autoopt.pagination import keyset_key, keyset_rewrite  # noqa: E402
+from mariadb_autoopt.pool import connection_settings_from_env, make_connection_factory  # noqa: E402
+
+
+def timed(conn, sql, params, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params or None)
+            cursor.fetchall()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--table", default="routes")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--pages", type=int, nargs="+", default=[0, 10, 100, 1000, 4000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = make_connection_factory(**connection_settings_from_env())()
+    try:
+        key = keyset_key(conn, f"SELECT * FROM {args.table}")
+        columns = key["columns"]
+        key_list = ", ".join(c for c, _ in columns)
+        order = ", ".join(f"{c} {d}" for c, d in columns)
+        print(f"Key ({order}) via {key['index'] or 'no index (each page sorts)'}")
+        print(f"{'page':>6} {'offset':>10} {'OFFSET (ms)':>12} {'keyset (ms)':>12} {'speedup':>8}")
+
+        for page in args.pages:
+            offset = page * args.page_size
+            offset_sql = f"SELECT * FROM {args.table} ORDER BY {order} LIMIT {args.page_size} OFFSET {offset}"
+            offset_ms = timed(conn, offset_sql, None, args.repeat) * 1000
+
+            # The last key of the previous page is what a client paging forward already holds
+            last = None
+            if offset:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT {key_list} FROM {args.table} ORDER BY {order} LIMIT 1 OFFSET {offset - 1}")
+                    last = cursor.fetchone()
+                if last is None:
+                    print(f"{page:>6} {offset:>10,}  past the end of {args.table}")
+                    break
+            sql, params = keyset_rewrite(f"SELECT * FROM {args.table}", columns, last, limit=args.page_size)
+            keyset_ms = timed(conn, sql, params, args.repeat) * 1000
+            print(f"{page:>6} {offset:>10,} {offset_ms:12.2f} {keyset_ms:12.2f} {offset_ms / keyset_ms:7.1f}x")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure the import time and memory cost of mariadb_autoopt entry points.
+
+Each statement runs in a fresh interpreter so nothing is already cached:
+
+    python benchmarks/import_cost.py [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    "import mariadb_autoopt",
+    "from mariadb_autoopt import suggest_indexes",
+    "from mariadb_autoopt import optimize_once",
+    "from mariadb_autoopt.magic import register_magic",
+    "import pandas",
+]
+
+PROBE = """
+import json, resource, sys, time
+def rss_kb():
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss0 = rss_kb()
+t0 = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "rss_kb": rss_kb() - rss0,
+                  "pandas": "pandas" in sys.modules, "IPython": "IPython" in sys.modules}))
+"""
+
+
+def measure(statement, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE, statement], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout))
+    return {
+        "seconds": statistics.median(r["seconds"] for r in runs),
+        "rss_mb": statistics.median(r["rss_kb"] for r in runs) / 1024,
+        "pandas": runs[0]["pandas"],
+        "IPython": runs[0]["IPython"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'statement':52} {'time (ms)':>10} {'RSS (MB)':>9}  loads")
+    for statement in STATEMENTS:
+        try:
+            r = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{statement:52} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        loaded = ", ".join(name for name in ("pandas", "IPython") if r[name]) or "-"
+        print(f"{statement:52} {r['seconds'] * 1000:10.1f} {r['rss_mb']:9.1f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,58 @@
 MariaDB Auto-Optimizer - Automatic query optimization for MariaDB in Pandas/Jupyter workflows.
 """
 
+import importlib
+import sys
+
 __version__ = "0.1.0"
 __author__ = "Om"
 
-from .core import timed_query, optimize_once
-from .analyzer import run_explain, analyze_explain_df, parse_tables_from_query
-from .optimizer import suggest_indexes, explanation_from_issues
-from .magic import register_magic
+# Public names are resolved on first access so that `import mariadb_autoopt`
+# doesn't pull in pandas, IPython or matplotlib until they are needed.
+_LAZY_ATTRS = {
+    "timed_query": "core",
+    "optimize_once": "core",
+    "optimize_many": "core",
+    "run_explain": "analyzer",
+    "analyze_explain_df": "analyzer",
+    "parse_tables_from_query": "analyzer",
+    "suggest_indexes": "optimizer",
+    "explanation_from_issues": "optimizer",
+    "register_magic": "magic",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
+
+def _running_in_kernel():
+    """True inside a Jupyter/IPython kernel; never imports IPython itself."""
+    ipython_module = sys.modules.get("IPython")
+    if ipython_module is None:
+        return False
+    try:
+        shell = ipython_module.get_ipython()
+    except Exception:
+        return False
+    return shell is not None and getattr(shell, "kernel", None) is not None
+
 
 # Auto-register magic when imported in Jupyter
-try:
-    register_magic()
-except Exception:
-    # This might fail outside Jupyter, which is fine
-    pass
\ No newline at end of file
+if _running_in_kernel():
+    try:
+        from .magic import register_magic
+        register_magic()
+    except Exception:
+        pass
@@ -1,14 +1,24 @@
-import pandas as pd
-import sqlparse
+import hashlib
+import json
+import math
 import re
 import warnings
 
+# pandas and sqlparse are imported inside the functions that use them so that
+# `import mariadb_autoopt` stays cheap for batch workers.
+
+
+def run_explain(conn, query, analyze=True):
+    """Run EXPLAIN (or EXPLAIN ANALYZE if available) and return results as a DataFrame.
+
+    EXPLAIN ANALYZE executes the statement; pass analyze=False to only plan it.
+    """
+    import pandas as pd
 
-def run_explain(conn, query):
-    """Run EXPLAIN (or EXPLAIN ANALYZE if available) and return results as a DataFrame."""
     # Try EXPLAIN ANALYZE then fallback to EXPLAIN
     last_err = None
-    for prefix in ("EXPLAIN ANALYZE ", "EXPLAIN "):
+    prefixes = ("EXPLAIN ANALYZE ", "EXPLAIN ") if analyze else ("EXPLAIN ",)
+    for prefix in prefixes:
         try:
             q = prefix + query
             # Suppress pandas warnings
@@ -21,17 +31,43 @@ def run_explain(conn, query):
     raise last_err
 
 
-# Rest of the file remains the same...
+_LITERAL_OR_COMMENT = re.compile(
+    r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|/\*.*?\*/|--(?=\s|$)[^\n]*|#[^\n]*""",
+    re.DOTALL,
+)
+
+
+def normalize_query(query):
+    """Reduce a query to its shape: literals become ?, IN lists collapse, case and whitespace are folded."""
+    # Strings and comments in one pass, so quotes inside comments (and vice versa) can't confuse it
+    q = _LITERAL_OR_COMMENT.sub(lambda m: '?' if m.group(0)[0] in '\'"' else ' ', query)
+    q = q.strip().rstrip(';')
+    q = re.sub(r'\b0x[0-9a-fA-F]+\b', '?', q)
+    q = re.sub(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b', '?', q)
+    q = re.sub(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', 'IN (?+)', q, flags=re.IGNORECASE)
+    q = re.sub(r'\s*([=<>!,])\s*', r'\1', q)
+    q = re.sub(r'\(\s+', '(', q)
+    q = re.sub(r'\s+\)', ')', q)
+    q = re.sub(r'\s+', ' ', q)
+    return q.strip().lower()
+
+
+def fingerprint_query(query):
+    """Return a stable hash of the query shape, shared by queries that only differ in literals."""
+    return hashlib.md5(normalize_query(query).encode()).hexdigest()
+
+
 def parse_tables_from_query(query):
     """Extract table names from SQL query."""
+    import sqlparse
+
     parsed = sqlparse.parse(query)[0]
     tables = set()
-    for token in parsed.tokens:
-        if token.ttype is None and token.value:
-            txt = token.value.upper()
-            # Look for table names after FROM/JOIN
-            for m in re.finditer(r'\b(FROM|JOIN)\s+([`"\']?)(\w+)\2', txt):
-                tables.add(m.group(3))
+    # Scan the whole statement: FROM/JOIN and the table name are separate top-level tokens
+    txt = str(parsed).upper()
+    # Look for table names after FROM/JOIN
+    for m in re.finditer(r'\b(FROM|JOIN)\s+([`"\']?)(\w+)\2', txt):
+        tables.add(m.group(3))
     return list(tables)
 
 
@@ -68,4 +104,699 @@ def analyze_explain_df(explain_df, explain_kind):
         if 'IMPOSSIBLE WHERE' in extra:
             issues.append("Impossible WHERE condition detected.")
 
-    return list(dict.fromkeys(issues))  # Remove duplicates
\ No newline at end of file
+    return list(dict.fromkeys(issues))  # Remove duplicates
+
+
+def explain_json(conn, query, analyze=False):
+    """Return the parsed EXPLAIN FORMAT=JSON plan (ANALYZE FORMAT=JSON, which executes, if analyze=True)."""
+    prefix = "ANALYZE FORMAT=JSON " if analyze else "EXPLAIN FORMAT=JSON "
+    with conn.cursor() as cursor:
+        cursor.execute(prefix + query)
+        row = cursor.fetchone()
+    return json.loads(row[0])
+
+
+def iter_plan_tables(plan):
+    """Yield every table access node ({"table_name", "access_type", "rows", ...}) in a JSON plan."""
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == "table" and isinstance(value, dict) and "table_name" in value:
+                yield value
+            yield from iter_plan_tables(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from iter_plan_tables(item)
+
+
+def _plan_has(plan, keys):
+    if isinstance(plan, dict):
+        return any(k in keys or _plan_has(v, keys) for k, v in plan.items())
+    if isinstance(plan, list):
+        return any(_plan_has(item, keys) for item in plan)
+    return False
+
+
+def _plan_flag(plan, keys):
+    # Like _plan_has, but MySQL writes explicit "using_filesort": false entries
+    if isinstance(plan, dict):
+        return any((k in keys and v is not False) or _plan_flag(v, keys) for k, v in plan.items())
+    if isinstance(plan, list):
+        return any(_plan_flag(item, keys) for item in plan)
+    return False
+
+
+def plan_sort_flags(plan):
+    """{"filesort", "temporary", "loose_scan"} booleans for a JSON plan.
+
+    loose_scan is a loose index scan for GROUP BY (Extra: "Using index for group-by").
+    """
+    return {
+        "filesort": _plan_flag(plan, {"filesort", "read_sorted_file", "using_filesort"}),
+        "temporary": _plan_flag(plan, {"temporary_table", "using_temporary_table"}),
+        "loose_scan": _plan_flag(plan, {"using_index_for_group_by"}),
+    }
+
+
+def plan_cost(plan):
+    """Optimizer cost of a JSON plan.
+
+    MariaDB 11 reports query_block.cost and MySQL cost_info.query_cost; older
+    MariaDB has neither, so the sum of estimated rows per access stands in.
+    """
+    block = plan.get("query_block", {}) if isinstance(plan, dict) else {}
+    cost = block.get("cost") or block.get("cost_info", {}).get("query_cost")
+    if cost is not None:
+        return float(cost)
+    return float(sum(float(t.get("rows") or 0) for t in iter_plan_tables(plan)))
+
+
+_CONDITION_COLUMN_RE = re.compile(r'`?(\w+)`?\.`?(\w+)`?')
+
+
+def plan_estimates(plan):
+    """Estimated vs actual rows for every table access in an ANALYZE FORMAT=JSON plan.
+
+    The estimate is rows * filtered% and the actual is r_rows * r_filtered%
+    (both per loop). Each entry also carries the columns the optimizer had to
+    estimate for that access (attached condition and used key parts) and ratio,
+    the factor between estimate and actual (>= 1, smoothed by +1). Accesses
+    without r_rows (never executed) are skipped.
+    """
+    nodes = []
+    for t in iter_plan_tables(plan):
+        if t.get("r_rows") is None:
+            continue
+        name = t["table_name"]
+        rows, r_rows = float(t.get("rows") or 0), float(t.get("r_rows") or 0)
+        filtered, r_filtered = float(t.get("filtered", 100) or 0), float(t.get("r_filtered", 100) or 0)
+        estimated, actual = rows * filtered / 100, r_rows * r_filtered / 100
+        columns = [c for tbl, c in _CONDITION_COLUMN_RE.findall(t.get("attached_condition") or "")
+                   if tbl.lower() == name.lower()]
+        columns += [c for c in t.get("used_key_parts") or []]
+        nodes.append({
+            "table": name,
+            "access_type": t.get("access_type"),
+            "rows": rows,
+            "r_rows": r_rows,
+            "filtered": filtered,
+            "r_filtered": r_filtered,
+            "estimated": estimated,
+            "actual": actual,
+            "ratio": max((estimated + 1) / (actual + 1), (actual + 1) / (estimated + 1)),
+            "direction": "over" if estimated > actual else "under",
+            "columns": list(dict.fromkeys(c.lower() for c in columns)),
+        })
+    return nodes
+
+
+def find_misestimates(plan, factor=10.0):
+    """Table accesses whose row estimate is off from the actual by at least factor, worst first."""
+    return sorted((n for n in plan_estimates(plan) if n["ratio"] >= factor),
+                  key=lambda n: n["ratio"], reverse=True)
+
+
+def misestimate_issues(misestimates):
+    """Describe misestimated plan nodes in the same style as analyze_explain_df issues."""
+    return [
+        f"Row estimate on {n['table']} is {n['ratio']:.0f}x {n['direction']} "
+        f"(estimated {n['estimated']:,.0f}, actual {n['actual']:,.0f}). "
+        "Column histograms may fix the plan more cheaply than an index."
+        for n in misestimates
+    ]
+
+
+_COL = r'((?:`?\w+`?\.)?`?\w+`?)'
+_OPS = r'(<=>|!=|<>|<=|>=|=|<|>|not\s+between|between|not\s+in|in|not\s+like|like)'
+_FUNCTION_PREDICATE_RE = re.compile(rf'^\s*(\w+)\s*\(\s*{_COL}\s*((?:,[^()]*)?)\)\s*{_OPS}\s*(.+?)\s*$',
+                                    re.IGNORECASE | re.DOTALL)
+_ARITHMETIC_PREDICATE_RE = re.compile(rf'^\s*{_COL}\s*([-+*/])\s*(\d+(?:\.\d+)?)\s*(<=>|!=|<>|<=|>=|=|<|>)\s*(.+?)\s*$')
+_LIKE_PREDICATE_RE = re.compile(rf"^\s*{_COL}\s+(not\s+)?like\s+('(?:[^'\\]|\\.|'')*')\s*$", re.IGNORECASE)
+_NUMBER_COMPARISON_RE = re.compile(rf'^\s*{_COL}\s*(<=>|!=|<>|<=|>=|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+_STRING_TYPES = {'char', 'varchar', 'text', 'tinytext', 'mediumtext', 'longtext', 'enum', 'set'}
+_NOT_FUNCTIONS = {'and', 'or', 'not', 'in', 'exists', 'select'}
+
+
+def fetch_column_types(conn, tables):
+    """{(table, column): (data_type, column_type)} from information_schema for the current database."""
+    tables = sorted({t.lower() for t in tables if t})
+    if not tables:
+        return {}
+    placeholders = ", ".join(["%s"] * len(tables))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_TYPE FROM information_schema.COLUMNS "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+            tables,
+        )
+        return {(t.lower(), c.lower()): (d.lower(), ct) for t, c, d, ct in cursor.fetchall()}
+
+
+def find_nonsargable_predicates(query, column_types=None):
+    """WHERE conjuncts that keep an index on their column from being used.
+
+    Kinds: "function" (YEAR(col) = 2022, LOWER(col) = 'x'), "arithmetic"
+    (col + 1 = 5), "leading_wildcard" (col LIKE '%x') and, when column_types
+    from fetch_column_types is given, "implicit_cast" (a string column compared
+    to a number). Each entry has kind, predicate, alias, table, column,
+    function, args, op and value.
+    """
+    shape_tables = parse_query_shape(query)["tables"]
+    types = column_types or {}
+    found = []
+    for conjunct in split_top_level_and(split_clauses(query).get("where", "")):
+        entry = None
+        m = _FUNCTION_PREDICATE_RE.match(conjunct)
+        if m and m.group(1).lower() not in _NOT_FUNCTIONS:
+            entry = {"kind": "function", "ref": m.group(2), "function": m.group(1).upper(),
+                     "args": m.group(3).strip(), "op": m.group(4), "value": m.group(5)}
+        elif _ARITHMETIC_PREDICATE_RE.match(conjunct):
+            m = _ARITHMETIC_PREDICATE_RE.match(conjunct)
+            entry = {"kind": "arithmetic", "ref": m.group(1), "function": m.group(2), "args": m.group(3),
+                     "op": m.group(4), "value": m.group(5)}
+        elif _LIKE_PREDICATE_RE.match(conjunct):
+            m = _LIKE_PREDICATE_RE.match(conjunct)
+            if m.group(3)[1:2] in ('%', '_'):
+                entry = {"kind": "leading_wildcard", "ref": m.group(1), "function": None, "args": "",
+                         "op": ("NOT LIKE" if m.group(2) else "LIKE"), "value": m.group(3)}
+        elif _NUMBER_COMPARISON_RE.match(conjunct):
+            m = _NUMBER_COMPARISON_RE.match(conjunct)
+            entry = {"kind": "implicit_cast", "ref": m.group(1), "function": None, "args": "",
+                     "op": m.group(2), "value": m.group(3)}
+        if entry is None:
+            continue
+
+        ref = entry.pop("ref")
+        resolved = _column_ref(ref, shape_tables)
+        if resolved is None:
+            continue
+        table, column = resolved
+        if entry["kind"] == "implicit_cast" and types.get((table, column), ("",))[0] not in _STRING_TYPES:
+            continue
+        qualifier = re.match(r'\s*`?(\w+)`?\.', ref)
+        entry.update({"predicate": conjunct, "alias": qualifier.group(1) if qualifier else None,
+                      "table": table, "column": column, "op": re.sub(r'\s+', ' ', entry["op"]).upper()})
+        found.append(entry)
+    return found
+
+
+def nonsargable_columns(query, column_types=None):
+    """{(table, column)} that the WHERE clause only uses in ways an index on the column can't serve."""
+    flagged = find_nonsargable_predicates(query, column_types)
+    # Function-wrapped columns never show up in the shape's predicates
+    unusable = {(p["table"], p["column"]) for p in flagged if p["kind"] in ("leading_wildcard", "implicit_cast")}
+    sargable = {(t, c) for t, c, _ in parse_query_shape(query)["predicates"]} - unusable
+    return {(p["table"], p["column"]) for p in flagged} - sargable
+
+
+PLAN_FEATURES = (
+    "tables", "full_scans", "index_accesses", "log_rows_sum", "log_rows_max", "log_fanout",
+    "filesort", "temporary", "subqueries", "log_cost", "log_table_rows",
+)
+
+
+def plan_features(plan, table_rows=None):
+    """Numeric features of a JSON plan, keyed by PLAN_FEATURES.
+
+    Estimated rows per access, the join fan-out (product of rows * filtered
+    over the nested loop, in log space), filesort/temporary flags and, when
+    table_rows maps table name -> row count, the size of the tables read.
+    """
+    tables = list(iter_plan_tables(plan))
+    log_rows = [math.log1p(float(t.get("rows") or 0)) for t in tables]
+    log_fanout = sum(
+        math.log1p(float(t.get("rows") or 0) * float(t.get("filtered") or 100) / 100) for t in tables
+    )
+    sizes = table_rows or {}
+    return {
+        "tables": len(tables),
+        "full_scans": sum(1 for t in tables if str(t.get("access_type")).upper() == "ALL"),
+        "index_accesses": sum(
+            1 for t in tables if str(t.get("access_type")).lower() in ("ref", "eq_ref", "range", "index", "const")
+        ),
+        "log_rows_sum": sum(log_rows),
+        "log_rows_max": max(log_rows, default=0.0),
+        "log_fanout": log_fanout,
+        "filesort": float(_plan_has(plan, {"filesort", "read_sorted_file"})),
+        "temporary": float(_plan_has(plan, {"temporary_table"})),
+        "subqueries": float(_plan_has(plan, {"subqueries", "materialized"})),
+        "log_cost": math.log1p(plan_cost(plan)),
+        "log_table_rows": sum(math.log1p(float(sizes.get(t["table_name"], 0) or 0)) for t in tables),
+    }
+
+# ---------------------------------------------------------------------------
+# Query shape parsing (regex based, good enough for single SELECT statements)
+# ---------------------------------------------------------------------------
+
+_CLAUSE_RE = re.compile(r'\b(select|from|where|group\s+by|having|order\s+by|limit)\b')
+_NOT_ALIAS = {
+    'on', 'using', 'where', 'join', 'inner', 'left', 'right', 'outer', 'cross', 'natural',
+    'straight_join', 'group', 'order', 'having', 'limit', 'force', 'ignore', 'use', 'partition',
+}
+_PREDICATE_RE = re.compile(
+    r'(?<![\w.`])(?:`?(\w+)`?\.)?`?(\w+)`?\s*'
+    r'(<=>|!=|<>|<=|>=|=|<|>|\bnot\s+in\b|\bin\b|\bnot\s+like\b|\blike\b|\bbetween\b|\bis\s+not\b|\bis\b)',
+    re.IGNORECASE,
+)
+_AGGREGATE_RE = re.compile(r'\b(count|sum|avg|min|max|group_concat)\s*\(\s*(distinct\s+)?(.*?)\)\s*$',
+                           re.IGNORECASE | re.DOTALL)
+_SUBQUERY_START = re.compile(r'\(\s*select\b', re.IGNORECASE)
+_SQL_WORDS = {'and', 'or', 'not', 'null', 'true', 'false', 'select', 'case', 'when', 'then', 'else', 'end'}
+
+
+def mask_query(query):
+    """Blank out string literals and comments, keeping every other character at its position."""
+    def blank(m):
+        text = m.group(0)
+        if text[0] in '\'"':
+            return text[0] + 'x' * (len(text) - 2) + text[-1]
+        return ' ' * len(text)
+
+    return _LITERAL_OR_COMMENT.sub(blank, query)
+
+
+def _depths(masked):
+    depths = []
+    depth = 0
+    for ch in masked:
+        if ch == '(':
+            depth += 1
+        depths.append(depth)
+        if ch == ')':
+            depth -= 1
+    return depths
+
+
+def subquery_spans(text):
+    """(start, end) of every outermost parenthesized SELECT in text."""
+    masked = mask_query(text)
+    spans = []
+    for m in _SUBQUERY_START.finditer(masked):
+        if spans and m.start() < spans[-1][1]:
+            continue  # nested inside the previous one
+        depth = 0
+        for i in range(m.start(), len(masked)):
+            depth += {'(': 1, ')': -1}.get(masked[i], 0)
+            if depth == 0:
+                spans.append((m.start(), i + 1))
+                break
+    return spans
+
+
+def split_top_level(text, sep=','):
+    """Split on sep outside parentheses and string literals."""
+    masked = mask_query(text)
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(masked):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    tail = text[start:].strip()
+    if tail:
+        parts.append(tail)
+    return parts
+
+
+def split_top_level_and(condition):
+    """Split a boolean condition on top-level AND (BETWEEN ... AND ... stays whole)."""
+    masked = mask_query(condition)
+    depth, parts, start, between = 0, [], 0, False
+    for m in re.finditer(r'\(|\)|\bbetween\b|\band\b', masked, re.IGNORECASE):
+        token = m.group(0).lower()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token == 'between':
+            between = True
+        elif depth == 0 and token == 'and':
+            if between:
+                between = False
+                continue
+            parts.append(condition[start:m.start()].strip())
+            start = m.end()
+    tail = condition[start:].strip()
+    if tail:
+        parts.append(tail)
+    return [p for p in parts if p]
+
+
+def split_clauses(query):
+    """Split the outer SELECT into {'select', 'from', 'where', 'group by', 'having', 'order by', 'limit'} texts.
+
+    Keywords inside parentheses (subqueries, function calls) are ignored.
+    """
+    query = query.strip().rstrip(';')
+    masked = mask_query(query).lower()
+    depths = _depths(masked)
+    found = []
+    for m in _CLAUSE_RE.finditer(masked):
+        name = re.sub(r'\s+', ' ', m.group(1))
+        if depths[m.start()] == 0 and name not in (f[0] for f in found):
+            found.append((name, m.start(), m.end()))
+
+    clauses = {}
+    for i, (name, _start, end) in enumerate(found):
+        stop = found[i + 1][1] if i + 1 < len(found) else len(query)
+        clauses[name] = query[end:stop].strip()
+    return clauses
+
+
+def build_select(clauses, from_text=None, extra_where=(), modifier=None):
+    """Reassemble split_clauses output into a SELECT statement.
+
+    from_text replaces the FROM clause, extra_where conditions are ANDed in
+    front of the WHERE clause and modifier (e.g. STRAIGHT_JOIN) follows
+    SELECT [DISTINCT].
+    """
+    select = clauses["select"]
+    distinct = re.match(r'\s*(distinct|all)\b', select, re.IGNORECASE)
+    head = "SELECT "
+    if distinct:
+        head += distinct.group(1).upper() + " "
+        select = select[distinct.end():].strip()
+    if modifier:
+        head += modifier + " "
+    where = [f"({w})" for w in extra_where]
+    if clauses.get("where"):
+        where.append(f"({clauses['where']})")
+    sql = f"{head}{select} FROM {from_text if from_text is not None else clauses['from']}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    for name in ("group by", "having", "order by", "limit"):
+        if clauses.get(name):
+            sql += f" {name.upper()} {clauses[name]}"
+    return sql
+
+
+def parse_table_aliases(from_clause):
+    """Map every alias (and bare table name) in a FROM clause to its table; derived tables map to None."""
+    aliases = {}
+    masked = mask_query(from_clause)
+    depths = _depths(masked)
+    # The alias can't be a keyword, or "t1 JOIN t2" would read JOIN as t1's alias and lose t2
+    keywords = '|'.join(sorted(_NOT_ALIAS))
+    pattern = re.compile(
+        r'(?:^|,|\bjoin\b|\bstraight_join\b)\s*(\(|`?[\w.]+`?)'
+        rf'(?:\s+(?:as\s+)?(?!(?:{keywords})\b)`?(\w+)`?)?',
+        re.IGNORECASE,
+    )
+    for m in pattern.finditer(masked):
+        if depths[m.start(1)] != 0 and m.group(1) != '(':
+            continue
+        if m.group(1) == '(':
+            if depths[m.start(1)] != 1:
+                continue
+            # Derived table: find its alias after the closing parenthesis
+            depth, i = 0, m.start(1)
+            while i < len(masked):
+                depth += {'(': 1, ')': -1}.get(masked[i], 0)
+                if depth == 0:
+                    break
+                i += 1
+            am = re.match(r'\s*(?:as\s+)?`?(\w+)`?', masked[i + 1:], re.IGNORECASE)
+            if am:
+                aliases[am.group(1).lower()] = None
+            continue
+        table = m.group(1).strip('`').split('.')[-1].lower()
+        if table in _NOT_ALIAS:
+            continue
+        aliases[table] = table
+        alias = (m.group(2) or '').lower()
+        if alias and alias not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+_JOIN_RE = re.compile(
+    r'(,|\b(?:natural\s+)?(?:(?:inner|cross|(?:left|right)(?:\s+outer)?)\s+)?(?:straight_)?join\b)',
+    re.IGNORECASE,
+)
+
+
+def _first_top_level(masked, pattern):
+    depths = _depths(masked)
+    for m in re.finditer(pattern, masked, re.IGNORECASE):
+        if depths[m.start()] == 0:
+            return m
+    return None
+
+
+def split_from_items(from_clause):
+    """Split a FROM clause into [{"join", "ref", "table", "alias", "on", "using"}] in written order.
+
+    join is None for the first item, "," for comma joins, otherwise the join
+    keyword(s) upper-cased ("JOIN", "LEFT JOIN", ...). ref is the table
+    reference text (with its alias and any index hints), table is None for
+    derived tables, and on/using hold the join condition text.
+    """
+    masked = mask_query(from_clause)
+    depths = _depths(masked)
+    cuts = [m for m in _JOIN_RE.finditer(masked) if depths[m.start()] == 0]
+
+    items = []
+    bounds = [(None, 0)] + [(m, m.end()) for m in cuts]
+    for i, (m, start) in enumerate(bounds):
+        stop = cuts[i].start() if i < len(cuts) else len(from_clause)
+        segment = from_clause[start:stop]
+        join = None if m is None else re.sub(r'\s+', ' ', m.group(1)).upper()
+        cond = _first_top_level(mask_query(segment), r'\b(on|using)\b')
+        ref = (segment[:cond.start()] if cond else segment).strip()
+        item = {"join": join, "ref": ref, "table": None, "alias": None, "on": None, "using": None}
+        if cond:
+            item[cond.group(1).lower()] = segment[cond.end():].strip()
+
+        if ref.startswith('('):
+            am = re.search(r'\)\s*(?:as\s+)?`?(\w+)`?\s*$', ref, re.IGNORECASE)
+            item["alias"] = am.group(1) if am else None
+        else:
+            rm = re.match(r'\s*`?([\w.]+)`?(?:\s+(?:as\s+)?`?(\w+)`?)?', ref, re.IGNORECASE)
+            if rm:
+                item["table"] = rm.group(1).split('.')[-1]
+                alias = rm.group(2)
+                if alias and alias.lower() in _NOT_ALIAS:
+                    alias = None
+                item["alias"] = alias or item["table"]
+        items.append(item)
+    return items
+
+
+def build_from(items):
+    """Reassemble split_from_items output into FROM clause text."""
+    parts = []
+    for item in items:
+        if item["join"] is None:
+            parts.append(item["ref"])
+            continue
+        text = f", {item['ref']}" if item["join"] == "," else f" {item['join']} {item['ref']}"
+        if item["on"]:
+            text += f" ON {item['on']}"
+        elif item["using"]:
+            text += f" USING {item['using']}"
+        parts.append(text)
+    return "".join(parts)
+
+
+def _column_ref(item, aliases):
+    """Resolve 'alias.col' / 'col' to (table, column); table is None when it can't be resolved."""
+    m = re.fullmatch(r'\s*(?:`?(\w+)`?\.)?`?(\w+)`?\s*', item)
+    if not m:
+        return None
+    qualifier, column = (m.group(1) or '').lower(), m.group(2).lower()
+    if qualifier:
+        return aliases.get(qualifier, qualifier), column
+    tables = {t for t in aliases.values() if t}
+    return (tables.pop() if len(tables) == 1 else None), column
+
+
+def parse_query_shape(query):
+    """Parse a SELECT into its structural parts.
+
+    Returns a dict with:
+      tables      alias -> table (lower case; derived tables map to None)
+      join_edges  [((table, column), (table, column)), ...] from col = col conditions
+      predicates  [(table, column, operator), ...] for column-vs-value conditions
+      group_by    [(table, column) or (None, expression), ...]
+      order_by    [(table, column, 'ASC'|'DESC'), ...]
+      select      [{'expr', 'alias', 'aggregate', 'distinct', 'argument'}, ...]
+      limit, offset  ints or None
+    """
+    clauses = split_clauses(query)
+    aliases = parse_table_aliases(clauses.get('from', ''))
+    shape = {
+        "tables": aliases,
+        "join_edges": [],
+        "predicates": [],
+        "group_by": [],
+        "order_by": [],
+        "select": [],
+        "limit": None,
+        "offset": None,
+    }
+
+    # Conditions live in WHERE and in the ON clauses of the FROM list
+    conditions = clauses.get('where', '')
+    for on in re.findall(r'\bon\b(.*?)(?=\b(?:(?:inner|left|right|cross|straight)\s+)?join\b|$)',
+                         mask_query(clauses.get('from', '')), re.IGNORECASE | re.DOTALL):
+        conditions += ' AND ' + on
+    masked_conditions = mask_query(conditions)
+    depths = _depths(masked_conditions)
+
+    for m in re.finditer(r'(?<![\w.`])`?(\w+)`?\.`?(\w+)`?\s*=\s*`?(\w+)`?\.`?(\w+)`?', masked_conditions):
+        if depths[m.start()] != 0:
+            continue
+        left = (aliases.get(m.group(1).lower(), m.group(1).lower()), m.group(2).lower())
+        right = (aliases.get(m.group(3).lower(), m.group(3).lower()), m.group(4).lower())
+        shape["join_edges"].append((left, right))
+
+    join_columns = {c for edge in shape["join_edges"] for c in edge}
+    for m in _PREDICATE_RE.finditer(masked_conditions):
+        if depths[m.start()] != 0 or m.group(2).lower() in _SQL_WORDS or m.group(2).isdigit():
+            continue
+        # Skip the right-hand side of a comparison and function calls like YEAR(col)
+        before = masked_conditions[:m.start()].rstrip()
+        if before.endswith(('=', '<', '>', '(')) or re.search(r'\b(?:between|like|in)\s*$', before, re.I):
+            continue
+        ref = _column_ref(f"{m.group(1) + '.' if m.group(1) else ''}{m.group(2)}", aliases)
+        op = re.sub(r'\s+', ' ', m.group(3).upper())
+        if ref and not (op == '=' and ref in join_columns and
+                        re.match(r'\s*`?\w+`?\.`?\w+', masked_conditions[m.end():])):
+            shape["predicates"].append((ref[0], ref[1], op))
+
+    select = re.sub(r'^\s*(?:(?:distinct|all|distinctrow|straight_join|high_priority|sql_\w+)\s+)*', '',
+                    clauses.get('select', ''), flags=re.IGNORECASE)
+    for item in split_top_level(select):
+        m = re.fullmatch(r'(.*?)(?:\s+(?:as\s+)?`?(\w+)`?)?', item.strip(), re.IGNORECASE | re.DOTALL)
+        expr, alias = m.group(1).strip(), m.group(2)
+        if alias and alias.lower() in _SQL_WORDS:
+            expr, alias = item.strip(), None
+        agg = _AGGREGATE_RE.match(expr)
+        shape["select"].append({
+            "expr": expr,
+            "alias": alias,
+            "aggregate": agg.group(1).upper() if agg else None,
+            "distinct": bool(agg and agg.group(2)),
+            "argument": agg.group(3).strip() if agg else None,
+        })
+    select_aliases = {item["alias"].lower() for item in shape["select"] if item["alias"]}
+
+    def grouping_ref(item):
+        # Output aliases (ORDER BY total DESC) are not table columns
+        if item.strip().strip('`').lower() in select_aliases:
+            return None, item.strip().strip('`')
+        return _column_ref(item, aliases) or (None, item.strip())
+
+    for item in split_top_level(clauses.get('group by', '')):
+        shape["group_by"].append(grouping_ref(item))
+
+    for item in split_top_level(clauses.get('order by', '')):
+        m = re.fullmatch(r'(.*?)(?:\s+(asc|desc))?', item.strip(), re.IGNORECASE | re.DOTALL)
+        ref = grouping_ref(m.group(1))
+        shape["order_by"].append((ref[0], ref[1], (m.group(2) or 'ASC').upper()))
+
+    limit = clauses.get('limit', '')
+    m = re.match(r'\s*(\d+)(?:\s*,\s*(\d+)|\s+offset\s+(\d+))?', limit, re.IGNORECASE)
+    if m:
+        if m.group(2):
+            shape["offset"], shape["limit"] = int(m.group(1)), int(m.group(2))
+        else:
+            shape["limit"], shape["offset"] = int(m.group(1)), int(m.group(3)) if m.group(3) else None
+    return shape
+
+
+_IDENTIFIER_RE = re.compile(r'(?<![\w.`@])(?:`?(\w+)`?\s*\.\s*)?`?([a-z_]\w*)`?(?!\w|\s*[(.])', re.IGNORECASE)
+_NOT_COLUMNS = _SQL_WORDS | _NOT_ALIAS | {
+    'from', 'where', 'by', 'is', 'in', 'like', 'between', 'as', 'asc', 'desc', 'distinct', 'all', 'any',
+    'some', 'exists', 'union', 'offset', 'interval', 'div', 'mod', 'xor', 'regexp', 'rlike', 'escape',
+    'over', 'rows', 'range', 'preceding', 'following', 'current', 'row', 'unbounded', 'collate', 'binary',
+    'signed', 'unsigned', 'char', 'decimal', 'date', 'datetime', 'time', 'integer', 'microsecond', 'second',
+    'minute', 'hour', 'day', 'week', 'month', 'quarter', 'year', 'separator', 'with', 'rollup', 'key', 'index',
+}
+
+
+def _table_words(masked):
+    """Table names and aliases after every FROM / JOIN in masked (lower case)."""
+    return {w.lower() for m in re.finditer(r'\b(?:from|join)\s+`?(\w+)`?(?:\s+(?:as\s+)?`?(\w+)`?)?',
+                                           masked, re.IGNORECASE) for w in m.groups() if w}
+
+
+def referenced_columns(query, column_types=None):
+    """Every column the query reads, attributed to its table.
+
+    Returns {"columns": {table: {column}}, "star": {table}, "unresolved": {column}}.
+    star holds tables read with SELECT * / alias.*; unresolved holds unqualified
+    names that can't be pinned to one table (with several tables and no
+    column_types from fetch_column_types to decide). Inside subqueries only
+    columns qualified with an outer alias (correlations) count; unqualified
+    names and references through the subquery's own tables are ignored.
+    """
+    clauses = split_clauses(query)
+    shape = parse_query_shape(query)
+    aliases = {a: t for a, t in shape["tables"].items() if t}
+    tables = set(aliases.values())
+    known = {}
+    for (table, column) in (column_types or {}):
+        known.setdefault(column, set()).add(table)
+    # Table names and aliases anywhere in the query, subqueries included
+    masked = mask_query(query)
+    not_columns = _NOT_COLUMNS | set(shape["tables"]) | (_table_words(masked) - _NOT_COLUMNS) | {
+        item["alias"].lower() for item in shape["select"] if item["alias"]
+    }
+
+    # Aliases each subquery defines itself, which shadow the outer ones inside it
+    subqueries = [(start, end, _table_words(masked[start:end])) for start, end in subquery_spans(query)]
+
+    result = {"columns": {t: set() for t in tables}, "star": set(), "unresolved": set()}
+    for item in split_top_level(clauses.get("select", "")):
+        star = re.fullmatch(r'\s*(?:`?(\w+)`?\.)?\*\s*', item)
+        if star:
+            result["star"] |= {aliases[star.group(1).lower()]} if star.group(1) else tables
+
+    # Blank string literals entirely so their contents can't look like identifiers
+    masked = re.sub(r"'x*'|\"x*\"", lambda m: ' ' * len(m.group(0)), masked)
+    for m in _IDENTIFIER_RE.finditer(masked):
+        qualifier, column = (m.group(1) or '').lower(), m.group(2).lower()
+        inner = next((names for start, end, names in subqueries if start <= m.start() < end), None)
+        if inner is not None and (not qualifier or qualifier in inner):
+            continue
+        if qualifier:
+            if qualifier in aliases:
+                result["columns"][aliases[qualifier]].add(column)
+            continue
+        if column in not_columns or column in tables:
+            continue
+        if column_types is not None:
+            owners = known.get(column, set()) & tables
+            if not owners:
+                continue  # not a column of any table read here (an alias, keyword or subquery column)
+        else:
+            owners = tables
+        if len(owners) == 1:
+            result["columns"][next(iter(owners))].add(column)
+        else:
+            result["unresolved"].add(column)
+    return result
+
+
+# OFFSET at which skipped rows dominate a page's cost
+DEEP_OFFSET_ROWS = 10000
+
+
+def find_deep_offset(query, threshold=DEEP_OFFSET_ROWS):
+    """{"offset", "limit", "order_by"} when the outer SELECT skips at least threshold rows, else None."""
+    shape = parse_query_shape(query)
+    if shape["offset"] is None or shape["offset"] < threshold:
+        return None
+    return {"offset": shape["offset"], "limit": shape["limit"], "order_by": shape["order_by"]}
+
+
+def offset_issues(query, threshold=DEEP_OFFSET_ROWS):
+    """Issue text for deep LIMIT ... OFFSET pagination (empty list if there is none)."""
+    deep = find_deep_offset(query, threshold)
+    if deep is None:
+        return []
+    return [f"Deep pagination: OFFSET {deep['offset']:,} reads and discards {deep['offset']:,} rows "
+            f"per page. Keyset pagination (pagination.keyset_rewrite) seeks straight to the page."]
@@ -0,0 +1,188 @@
+"""
+Contextual bandit for choosing an optimization strategy.
+
+Each strategy is an arm of a linear Thompson-sampling bandit. The context is
+a small vector of plan features and table size; the reward is the measured
+speedup, counted only when it is statistically significant, per unit of index
+build time. The posterior is persisted in the learning store so the choice
+adapts to the hardware and data it has actually seen.
+"""
+
+import itertools
+import math
+import random
+import statistics
+
+STRATEGIES = (
+    "analyze_only",
+    "join_optimize",
+    "aggregation_optimize",
+    "critical_optimize",
+    "selective_optimize",
+)
+
+CONTEXT_FEATURES = (
+    "bias",
+    "log_rows",
+    "log_cost",
+    "is_join",
+    "is_aggregation",
+    "is_filter",
+    "filesort",
+    "temporary",
+    "full_scans",
+)
+
+
+def strategy_context(rows, cost, query, explain_df=None):
+    """Context vector (see CONTEXT_FEATURES) from table size, optimizer cost and the plan."""
+    q = query.lower()
+    filesort = temporary = full_scans = 0.0
+    if explain_df is not None and not explain_df.empty:
+        for _, row in explain_df.iterrows():
+            extra = str(row.get('Extra') or row.get('extra') or '').upper()
+            filesort = max(filesort, float('FILESORT' in extra))
+            temporary = max(temporary, float('USING TEMPORARY' in extra))
+            full_scans += float(str(row.get('type') or '').upper() == 'ALL')
+    return [
+        1.0,
+        math.log10(1 + max(rows or 0, 0)) / 7,
+        math.log10(1 + max(cost or 0, 0)) / 7,
+        float("join" in q),
+        float("group by" in q),
+        float("where" in q),
+        filesort,
+        temporary,
+        min(full_scans, 4.0) / 4,
+    ]
+
+
+def speedup_p_value(before_times, after_times, max_permutations=20000):
+    """One-sided p-value that after_times are faster than before_times.
+
+    Uses an exact permutation test on the difference of means when the sample
+    is small enough to enumerate (e.g. 3 vs 3 runs), otherwise a random
+    permutation sample.
+    """
+    before, after = list(before_times), list(after_times)
+    if not before or not after:
+        return 1.0
+    pooled = before + after
+    n = len(before)
+    observed = statistics.mean(before) - statistics.mean(after)
+    total = sum(pooled)
+
+    def diff(idx):
+        s = sum(pooled[i] for i in idx)
+        return s / n - (total - s) / len(after)
+
+    if math.comb(len(pooled), n) <= max_permutations:
+        splits = list(itertools.combinations(range(len(pooled)), n))
+    else:
+        rng = random.Random(0)
+        splits = [rng.sample(range(len(pooled)), n) for _ in range(max_permutations)]
+    hits = sum(1 for idx in splits if diff(idx) >= observed - 1e-12)
+    return hits / len(splits)
+
+
+def speedup_reward(before_times, after_times, build_seconds=0.0, alpha=0.05):
+    """Reward for one optimization: fraction of time saved per (1 + seconds spent building indexes).
+
+    Speedups (or slowdowns) that aren't statistically significant at alpha
+    count as zero. With the demo's 3 vs 3 runs the smallest exact p-value is
+    1/20, so the default alpha accepts only a complete separation.
+    """
+    if not before_times or not after_times:
+        return 0.0
+    before, after = statistics.median(before_times), statistics.median(after_times)
+    if before <= 0:
+        return 0.0
+    # Either direction counts once it's significant, so slowdowns are penalized
+    faster = speedup_p_value(before_times, after_times) <= alpha
+    slower = speedup_p_value(after_times, before_times) <= alpha
+    saved = (before - after) / before if faster or slower else 0.0
+    return saved / (1.0 + max(build_seconds, 0.0))
+
+
+class StrategyBandit:
+    """Linear Thompson sampling over STRATEGIES with a Gaussian posterior per arm."""
+
+    def __init__(self, arms=STRATEGIES, dim=len(CONTEXT_FEATURES), prior_variance=1.0,
+                 noise_variance=0.05, seed=None):
+        import numpy as np
+
+        self.arms = list(arms)
+        self.dim = dim
+        self.prior_variance = prior_variance
+        self.noise_variance = noise_variance
+        self.precision = {arm: np.eye(dim) / prior_variance for arm in self.arms}
+        self.b = {arm: np.zeros(dim) for arm in self.arms}
+        self.pulls = {arm: 0 for arm in self.arms}
+        self._rng = np.random.default_rng(seed)
+
+    def _posterior(self, arm):
+        import numpy as np
+
+        cov = np.linalg.inv(self.precision[arm])
+        return cov @ self.b[arm], cov
+
+    def choose(self, context):
+        """Sample a reward for every arm and return the best (arm, sampled_rewards)."""
+        import numpy as np
+
+        x = np.asarray(context, dtype=float)
+        samples = {}
+        for arm in self.arms:
+            mean, cov = self._posterior(arm)
+            theta = self._rng.multivariate_normal(mean, self.noise_variance * cov)
+            samples[arm] = float(theta @ x)
+        return max(samples, key=samples.get), samples
+
+    def expected_rewards(self, context):
+        """Posterior mean reward of every arm for this context."""
+        import numpy as np
+
+        x = np.asarray(context, dtype=float)
+        return {arm: float(self._posterior(arm)[0] @ x) for arm in self.arms}
+
+    def update(self, arm, context, reward):
+        import numpy as np
+
+        x = np.asarray(context, dtype=float)
+        self.precision[arm] += np.outer(x, x)
+        self.b[arm] += reward * x
+        self.pulls[arm] += 1
+
+    def to_state(self):
+        return {
+            "arms": self.arms,
+            "dim": self.dim,
+            "prior_variance": self.prior_variance,
+            "noise_variance": self.noise_variance,
+            "precision": {arm: self.precision[arm].tolist() for arm in self.arms},
+            "b": {arm: self.b[arm].tolist() for arm in self.arms},
+            "pulls": self.pulls,
+        }
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        import numpy as np
+
+        bandit = cls(arms=state["arms"], dim=state["dim"], prior_variance=state["prior_variance"],
+                     noise_variance=state["noise_variance"], **kwargs)
+        for arm in bandit.arms:
+            bandit.precision[arm] = np.asarray(state["precision"][arm], dtype=float)
+            bandit.b[arm] = np.asarray(state["b"][arm], dtype=float)
+            bandit.pulls[arm] = state["pulls"].get(arm, 0)
+        return bandit
+
+    @classmethod
+    def load(cls, store, key="strategy_bandit", **kwargs):
+        """Restore from the learning store, or start fresh if nothing compatible is saved."""
+        state = store.get_state(key)
+        if state and state.get("dim") == len(CONTEXT_FEATURES) and state.get("arms") == list(STRATEGIES):
+            return cls.from_state(state, **kwargs)
+        return cls(**kwargs)
+
+    def save(self, store, key="strategy_bandit"):
+        store.put_state(key, self.to_state())
@@ -0,0 +1,287 @@
+"""
+Client-side result cache for repeated analytical queries.
+
+Notebooks re-run the same timed_query()/read_sql calls while the tables
+behind them stay unchanged. ResultCache stores each result as a Parquet file
+keyed by the query text, its parameters and the database, with an SQLite
+index (like LearningStore) that tracks sizes for LRU eviction within a byte
+budget. An entry is only served while every table the query reads is
+unchanged, checked with one information_schema query per lookup:
+
+    UPDATE_TIME   kept in memory for InnoDB (reset by a restart, which is
+                  detected from the server uptime), on disk for Aria/MyISAM
+    CHECKSUM TABLE ... QUICK
+                  live checksums (Aria/MyISAM with CHECKSUM=1), for tables
+                  without a usable UPDATE_TIME such as partitioned ones
+
+Queries reading views or tables that offer neither are never cached.
+
+    cache = ResultCache(max_bytes=256 * 2**20)
+    df, elapsed = timed_query(conn, query, cache=cache)
+    cache.stats()   # hits, hit_rate, bytes_saved, seconds_saved, ...
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .analyzer import mask_query, parse_query_shape
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".mariadb_autoopt", "results")
+VALIDATIONS = ("auto", "update_time", "checksum")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key          TEXT PRIMARY KEY,
+    query        TEXT NOT NULL,
+    tables       TEXT NOT NULL,
+    versions     TEXT NOT NULL,
+    uptime       REAL NOT NULL,
+    bytes        INTEGER NOT NULL,
+    result_bytes INTEGER NOT NULL,
+    rows         INTEGER NOT NULL,
+    elapsed      REAL NOT NULL,
+    hits         INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    last_used    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+"""
+
+_TABLE_RE = re.compile(r'\b(?:from|join)\s+(?:`?\w+`?\s*\.\s*)?`?(\w+)`?', re.IGNORECASE)
+# Slack between the client's clock and the server's uptime when checking for a restart
+_RESTART_SLACK = 60.0
+
+
+def query_tables(query):
+    """Every table a query reads, subqueries included (lower case)."""
+    tables = {t for t in parse_query_shape(query)["tables"].values() if t}
+    masked = mask_query(query)
+    opened, innermost = [], []
+    for i, ch in enumerate(masked):
+        if ch == '(':
+            opened.append(i)
+        innermost.append(opened[-1] if opened else None)
+        if ch == ')' and opened:
+            opened.pop()
+    for m in _TABLE_RE.finditer(masked):
+        start = innermost[m.start()]
+        # FROM inside EXTRACT(... FROM col) or TRIM(... FROM col) names no table
+        if start is None or re.match(r'\(\s*select\b', masked[start:], re.IGNORECASE):
+            tables.add(m.group(1).lower())
+    return sorted(tables - {"dual"})
+
+
+class ResultCache:
+    """Parquet result cache with LRU eviction and table-change invalidation.
+
+    directory defaults to AUTOOPT_CACHE_DIR or ~/.mariadb_autoopt/results.
+    validation is "update_time" (information_schema.TABLES.UPDATE_TIME),
+    "checksum" (CHECKSUM TABLE ... QUICK) or "auto" (UPDATE_TIME, falling back
+    to the checksum where it isn't tracked). Results larger than max_bytes
+    on disk are not cached. Requires pyarrow (or fastparquet).
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 2**20, validation="auto"):
+        if validation not in VALIDATIONS:
+            raise ValueError(f"validation must be one of {VALIDATIONS}")
+        self.directory = directory or os.getenv("AUTOOPT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes)
+        self.validation = validation
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=30,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "uncacheable": 0, "evictions": 0,
+                       "bytes_saved": 0, "seconds_saved": 0.0}
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def table_versions(self, conn, tables):
+        """({table: version or None}, server) for the current database.
+
+        server is {"database", "host", "port", "uptime"}. A version is None when
+        changes to the table can't be detected (views, temporary or missing
+        tables, no UPDATE_TIME and no live checksum) or when the table changed
+        within the last second, too recently for UPDATE_TIME's resolution.
+        """
+        names = ", ".join(["%s"] * len(tables)) or "NULL"
+        # A plain TABLE_NAME IN (...) lets the server open just these tables' metadata; LOWER() reads every table's
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT s.db, s.host, s.port, s.uptime, t.TABLE_NAME, t.TABLE_TYPE, t.ENGINE, t.CREATE_OPTIONS, "
+                "t.UPDATE_TIME, t.UPDATE_TIME >= NOW() - INTERVAL 1 SECOND "
+                "FROM (SELECT DATABASE() AS db, @@hostname AS host, @@port AS port, VARIABLE_VALUE AS uptime "
+                "      FROM information_schema.GLOBAL_STATUS WHERE VARIABLE_NAME = 'UPTIME') s "
+                "LEFT JOIN information_schema.TABLES t "
+                f"ON t.TABLE_SCHEMA = s.db AND t.TABLE_NAME IN ({names})",
+                list(tables))
+            rows = cursor.fetchall()
+        db, host, port, uptime = rows[0][:4]
+        server = {"database": db, "host": host, "port": port, "uptime": float(uptime)}
+
+        versions, unchecked = {t: None for t in tables}, []
+        for *_, name, table_type, engine, options, update_time, recent in rows:
+            if name is None or table_type != "BASE TABLE":
+                continue
+            table = name.lower()
+            # InnoDB leaves UPDATE_TIME NULL until the first change after a restart
+            tracked = self.validation != "checksum" and "partitioned" not in str(options or "").lower() and (
+                update_time is not None or str(engine).lower() == "innodb" or self.validation == "update_time")
+            if tracked:
+                if not recent:
+                    versions[table] = f"u:{update_time}"
+            else:
+                unchecked.append(table)
+        if unchecked and self.validation != "update_time":
+            with conn.cursor() as cursor:
+                cursor.execute("CHECKSUM TABLE " + ", ".join(f"`{t}`" for t in unchecked) + " QUICK")
+                for table, checksum in cursor.fetchall():
+                    if checksum is not None:
+                        versions[table.split(".")[-1].lower()] = f"c:{checksum}"
+        return versions, server
+
+    def key(self, query, params=None, server=None, materialize=None):
+        """Cache key of a query text (whitespace-folded), its parameters, the server/database and materialize mode."""
+        server = server or {}
+        ident = [" ".join(query.split()).rstrip(";"), params, server.get("database"), server.get("host"),
+                 server.get("port"), materialize]
+        return hashlib.md5(json.dumps(ident, default=str).encode()).hexdigest()
+
+    def lookup(self, conn, query, params=None, materialize=None):
+        """Look query up; returns {"key", "query", "tables", "versions", "uptime", "df"} (df None on a miss).
+
+        Pass the result to store() after running the query on a miss: the
+        versions are read before the query runs, so a change that races with it
+        invalidates the entry rather than hiding behind it. materialize is the
+        core.timed_query mode that builds the result; it changes the column
+        dtypes, so each mode is cached separately.
+        """
+        import pandas as pd
+
+        tables = query_tables(query)
+        versions, server = self.table_versions(conn, tables)
+        entry = {"key": self.key(query, params, server, materialize), "query": query, "tables": tables,
+                 "versions": versions, "uptime": server["uptime"], "df": None}
+        if any(v is None for v in versions.values()) or not tables:
+            entry["versions"] = None
+            self._stats["uncacheable"] += 1
+            return entry
+
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM entries WHERE key = ?", (entry["key"],)).fetchone()
+        if row is None:
+            self._stats["misses"] += 1
+            return entry
+        restarted = server["uptime"] < row["uptime"] + (time.time() - row["created_at"]) - _RESTART_SLACK
+        if restarted or json.loads(row["versions"]) != versions:
+            self._stats["invalidations"] += 1
+            self._stats["misses"] += 1
+            self._remove(entry["key"])
+            return entry
+
+        t0 = time.perf_counter()
+        try:
+            df = pd.read_parquet(self._path(entry["key"]))
+        except (OSError, ValueError):
+            self._stats["misses"] += 1
+            self._remove(entry["key"])
+            return entry
+        read_seconds = time.perf_counter() - t0
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET hits = hits + 1, last_used = ? WHERE key = ?",
+                               (time.time(), entry["key"]))
+        self._stats["hits"] += 1
+        self._stats["bytes_saved"] += row["result_bytes"]
+        self._stats["seconds_saved"] += max(row["elapsed"] - read_seconds, 0.0)
+        entry["df"] = df
+        return entry
+
+    def store(self, entry, df, elapsed):
+        """Cache df for a lookup() miss (no-op for uncacheable queries); returns True when stored."""
+        if entry["versions"] is None:
+            return False
+        path = self._path(entry["key"])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Parquet needs string column names
+        df.rename(columns=str).to_parquet(tmp, index=False)
+        size = os.path.getsize(tmp)
+        if size > self.max_bytes:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, query, tables, versions, uptime, bytes, result_bytes, rows, "
+                "elapsed, hits, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (entry["key"], entry["query"], json.dumps(entry["tables"]), json.dumps(entry["versions"]), entry["uptime"],
+                 size, int(df.memory_usage(deep=True).sum()), len(df), float(elapsed), now, now))
+        self._evict()
+        return True
+
+    def _remove(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                for row in self._conn.execute("SELECT key, bytes FROM entries ORDER BY last_used"):
+                    victims.append(row["key"])
+                    total -= row["bytes"]
+                    if total <= self.max_bytes:
+                        break
+        for key in victims:
+            self._remove(key)
+        self._stats["evictions"] += len(victims)
+
+    def invalidate(self, table=None):
+        """Drop the entries reading table (all entries when None); returns how many were dropped."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, tables FROM entries").fetchall()
+        keys = [row["key"] for row in rows if table is None or table.lower() in json.loads(row["tables"])]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        return self.invalidate()
+
+    def stats(self):
+        """Counters of this cache object plus the size of the cache on disk.
+
+        hit_rate is hits / (hits + misses); uncacheable lookups are counted
+        apart. bytes_saved is the in-memory size of the results served from
+        the cache and seconds_saved their original query time minus the read.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return dict(self._stats, hit_rate=self._stats["hits"] / lookups if lookups else None,
+                    entries=entries, bytes=size, max_bytes=self.max_bytes)
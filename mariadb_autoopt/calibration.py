@@ -0,0 +1,213 @@
+"""
+Per-host calibration of optimizer cost units to wall-clock seconds.
+
+The same optimizer cost means very different run times on an NVMe primary and
+an HDD replica. calibrate() runs a fixed micro-benchmark suite (point lookups,
+range scans, full scans and sorts of known size) on a generated table, fits
+seconds as a linear function of optimizer cost and of handler counts, and keeps
+the fit per database host in the learning store.
+"""
+
+import statistics
+import time
+
+from .analyzer import explain_json, plan_cost
+
+CALIBRATION_TABLE = "autoopt_calibration"
+
+HANDLER_COUNTERS = (
+    "Handler_read_key",
+    "Handler_read_next",
+    "Handler_read_prev",
+    "Handler_read_rnd",
+    "Handler_read_rnd_next",
+    "Sort_rows",
+)
+
+
+def server_host(conn):
+    """Identity of the database server conn points at, as hostname:port."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT @@hostname, @@port")
+        hostname, port = cursor.fetchone()
+    return f"{hostname}:{port}"
+
+
+def build_calibration_table(conn, rows=200_000):
+    """(Re)create the generated benchmark table with rows rows, using the SEQUENCE engine."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {CALIBRATION_TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {CALIBRATION_TABLE} (
+                id  INT NOT NULL PRIMARY KEY,
+                k   INT NOT NULL,
+                v   INT NOT NULL,
+                pad CHAR(100) NOT NULL,
+                KEY idx_k (k)
+            ) ENGINE=InnoDB
+        """)
+        # k spreads every 1000th row over the same key, v is a scrambled sort key
+        cursor.execute(f"""
+            INSERT INTO {CALIBRATION_TABLE} (id, k, v, pad)
+            SELECT seq, seq MOD 1000, (seq * 7919) MOD 1000003, REPEAT('x', 100)
+            FROM seq_1_to_{int(rows)}
+        """)
+        cursor.execute(f"ANALYZE TABLE {CALIBRATION_TABLE}")
+        cursor.fetchall()
+    conn.commit()
+
+
+def micro_benchmarks(rows=200_000):
+    """The (name, sql) suite run against the calibration table."""
+    t = CALIBRATION_TABLE
+    suite = [("point_lookup", f"SELECT * FROM {t} WHERE id = {rows // 2}")]
+    for frac in (0.001, 0.01, 0.1):
+        n = max(int(rows * frac), 1)
+        suite.append((f"pk_range_{n}", f"SELECT SUM(v) FROM {t} WHERE id BETWEEN 1 AND {n}"))
+        keys = max(int(1000 * frac), 1)
+        suite.append((f"index_range_{keys}_keys", f"SELECT SUM(v) FROM {t} WHERE k < {keys}"))
+        suite.append((f"sort_{n}", f"SELECT v FROM {t} WHERE id <= {n} ORDER BY v, pad LIMIT 1 OFFSET {n - 1}"))
+    suite += [
+        ("full_scan", f"SELECT SUM(v) FROM {t}"),
+        ("full_scan_filter", f"SELECT COUNT(*) FROM {t} WHERE pad LIKE '%y%'"),
+        ("full_sort_top", f"SELECT id FROM {t} ORDER BY v LIMIT 10"),
+    ]
+    return suite
+
+
+def _session_counters(conn):
+    names = ", ".join(f"'{name}'" for name in HANDLER_COUNTERS)
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW SESSION STATUS WHERE Variable_name IN ({names})")
+        return {name: float(value) for name, value in cursor.fetchall()}
+
+
+def measure(conn, sql, runs=3):
+    """Optimizer cost, per-run handler counts and median run time of one statement."""
+    cost = plan_cost(explain_json(conn, sql))
+
+    # SHOW STATUS itself touches a few handlers; measure that and subtract it
+    c0 = _session_counters(conn)
+    c1 = _session_counters(conn)
+    overhead = {name: c1.get(name, 0) - c0.get(name, 0) for name in HANDLER_COUNTERS}
+
+    before = _session_counters(conn)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            cursor.fetchall()
+        times.append(time.perf_counter() - t0)
+    after = _session_counters(conn)
+
+    handlers = {
+        name: max(after.get(name, 0) - before.get(name, 0) - overhead[name], 0) / runs
+        for name in HANDLER_COUNTERS
+    }
+    return {"cost": cost, "handlers": handlers, "seconds": statistics.median(times), "times": times}
+
+
+def _relative_lstsq(X, y):
+    """Least squares minimising relative error (timings span orders of magnitude); returns coefficients."""
+    import numpy as np
+
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = 1.0 / np.maximum(y, 1e-6)
+    coef, *_ = np.linalg.lstsq(X * weights[:, None], y * weights, rcond=None)
+    # A negative per-unit time is noise, not physics
+    coef[1:] = np.maximum(coef[1:], 0.0)
+    return coef
+
+
+class HostCalibration:
+    """Fitted mapping from optimizer cost (and handler counts) to seconds for one database host."""
+
+    def __init__(self, host, cost_fit, handler_fit, samples=(), created_at=None):
+        self.host = host
+        self.cost_fit = list(cost_fit)            # [seconds intercept, seconds per cost unit]
+        self.handler_fit = dict(handler_fit)      # {"intercept": s, counter: seconds per count}
+        self.samples = list(samples)
+        self.created_at = created_at or time.time()
+
+    @classmethod
+    def fit(cls, host, samples):
+        cost_fit = _relative_lstsq([[1.0, s["cost"]] for s in samples], [s["seconds"] for s in samples])
+        handler_coef = _relative_lstsq(
+            [[1.0] + [s["handlers"].get(name, 0.0) for name in HANDLER_COUNTERS] for s in samples],
+            [s["seconds"] for s in samples],
+        )
+        handler_fit = {"intercept": float(handler_coef[0])}
+        handler_fit.update({name: float(c) for name, c in zip(HANDLER_COUNTERS, handler_coef[1:])})
+        return cls(host, [float(c) for c in cost_fit], handler_fit, samples)
+
+    def cost_to_seconds(self, cost):
+        """Expected wall time on this host for a plan of the given optimizer cost."""
+        return max(self.cost_fit[0] + self.cost_fit[1] * float(cost), 0.0)
+
+    def seconds_to_cost(self, seconds):
+        """Optimizer cost that corresponds to the given wall time on this host (for thresholds)."""
+        if self.cost_fit[1] <= 0:
+            return float("inf")
+        return max((seconds - self.cost_fit[0]) / self.cost_fit[1], 0.0)
+
+    def handlers_to_seconds(self, handlers):
+        """Expected wall time from measured handler counts (e.g. from a past run)."""
+        return max(self.handler_fit["intercept"] + sum(
+            self.handler_fit.get(name, 0.0) * handlers.get(name, 0.0) for name in HANDLER_COUNTERS
+        ), 0.0)
+
+    def relative_error(self):
+        """Median relative error of the cost fit over the calibration samples."""
+        errors = [abs(self.cost_to_seconds(s["cost"]) - s["seconds"]) / max(s["seconds"], 1e-6)
+                  for s in self.samples]
+        return statistics.median(errors) if errors else None
+
+    def to_state(self):
+        return {"host": self.host, "cost_fit": self.cost_fit, "handler_fit": self.handler_fit,
+                "samples": self.samples, "created_at": self.created_at}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["host"], state["cost_fit"], state["handler_fit"], state.get("samples", ()),
+                   state.get("created_at"))
+
+    def save(self, store):
+        store.put_state(f"calibration:{self.host}", self.to_state())
+
+    @classmethod
+    def load(cls, store, host):
+        state = store.get_state(f"calibration:{host}")
+        return cls.from_state(state) if state else None
+
+
+def calibrate(conn, store=None, rows=200_000, runs=3, keep_table=False, verbose=False):
+    """Run the micro-benchmark suite on conn's server and return (and store) its HostCalibration."""
+    host = server_host(conn)
+    build_calibration_table(conn, rows)
+    samples = []
+    try:
+        for name, sql in micro_benchmarks(rows):
+            sample = measure(conn, sql, runs=runs)
+            sample["name"] = name
+            samples.append(sample)
+            if verbose:
+                print(f"  {name:<20} cost {sample['cost']:>12.1f}  {sample['seconds'] * 1000:>9.2f} ms")
+    finally:
+        if not keep_table:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {CALIBRATION_TABLE}")
+
+    calibration = HostCalibration.fit(host, samples)
+    if store is not None:
+        calibration.save(store)
+    return calibration
+
+
+def load_or_calibrate(conn, store, max_age_days=30, **kwargs):
+    """Stored calibration for conn's server, re-running calibrate() when missing or stale."""
+    calibration = HostCalibration.load(store, server_host(conn))
+    if calibration is None or time.time() - calibration.created_at > max_age_days * 86400:
+        calibration = calibrate(conn, store, **kwargs)
+    return calibration
@@ -0,0 +1,176 @@
+"""
+Command line interface: batch-analyze queries from a file, stdin or a slow query log.
+
+    python -m mariadb_autoopt queries.sql -o results.jsonl --workers 8
+    python -m mariadb_autoopt --slow-log /var/log/mysql/slow.log -o results.parquet
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="mariadb-autoopt",
+        description="Analyze SQL queries in bulk with EXPLAIN and suggest indexes.",
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="File with ;-separated queries, or - for stdin (default)")
+    parser.add_argument("--slow-log", action="store_true",
+                        help="Treat the input as a MariaDB/MySQL slow query log")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Output path, or - for stdout (default)")
+    parser.add_argument("--format", choices=("jsonl", "parquet"),
+                        help="Output format (default: inferred from the output path, else jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Number of concurrent connections (default: 4)")
+    parser.add_argument("--execute", action="store_true",
+                        help="Also run and time each SELECT/WITH query (default: EXPLAIN only)")
+
+    db = parser.add_argument_group("connection (defaults from AUTOOPT_DB_* environment variables)")
+    db.add_argument("--host")
+    db.add_argument("--port", type=int)
+    db.add_argument("--user")
+    db.add_argument("--password")
+    db.add_argument("--database")
+    return parser
+
+
+def read_queries(source, slow_log=False):
+    """Read queries from a path (or - for stdin); returns strings or (query, query_time) pairs."""
+    from .workload import split_statements, iter_slow_log
+
+    fh = sys.stdin if source == "-" else open(source, encoding="utf-8", errors="replace")
+    try:
+        if slow_log:
+            return list(iter_slow_log(fh))
+        return split_statements(fh.read())
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+
+def _json_default(value):
+    # numpy scalars and anything else pandas hands back
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _explain_records(explain_df):
+    # NaN/NaT would be written as bare NaN, which isn't valid JSON
+    return explain_df.astype(object).where(explain_df.notna(), None).to_dict(orient="records")
+
+
+def to_record(entry, result):
+    """Flatten an analysis result into a JSON-serializable record."""
+    explain_df = result["explain_df"]
+    return {
+        "fingerprint": result["fingerprint"],
+        "query": result["query"],
+        "count": entry["count"],
+        "total_time": entry["total_time"],
+        "rows": result["rows"],
+        "elapsed": result["elapsed"],
+        "explain_mode": result["explain_mode"],
+        "explain": _explain_records(explain_df) if explain_df is not None else None,
+        "issues": result["issues"],
+        "suggestions": result["suggestions"],
+        "error": result["error"],
+    }
+
+
+def write_parquet(records, path):
+    """Write records to a Parquet file (requires pyarrow or fastparquet)."""
+    import pandas as pd
+
+    rows = []
+    for rec in records:
+        rec = dict(rec)
+        rec["explain"] = json.dumps(rec["explain"], default=_json_default)
+        rows.append(rec)
+    pd.DataFrame(rows).to_parquet(path, index=False)
+
+
+def run_batch(pool, unique, execute=False, workers=4):
+    """Analyze each unique query on the pool; yields records as they complete."""
+    from .core import analyze_query
+
+    def task(entry):
+        with pool.acquire() as conn:
+            return analyze_query(conn, entry["query"], execute=execute)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(task, entry): entry for entry in unique.values()}
+        for future in as_completed(futures):
+            yield to_record(futures[future], future.result())
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from .pool import ConnectionPool, connection_settings_from_env, make_connection_factory
+    from .workload import dedupe_queries
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "parquet" if args.output.endswith(".parquet") else "jsonl"
+    if fmt == "parquet" and args.output == "-":
+        print("error: parquet output needs a file path (-o results.parquet)", file=sys.stderr)
+        return 2
+    if args.workers < 1:
+        print("error: --workers must be at least 1", file=sys.stderr)
+        return 2
+
+    try:
+        queries = read_queries(args.input, slow_log=args.slow_log)
+    except OSError as e:
+        print(f"error: could not read {args.input}: {e}", file=sys.stderr)
+        return 2
+
+    unique = dedupe_queries(queries)
+    print(f"{len(queries):,} statements, {len(unique):,} unique fingerprints", file=sys.stderr)
+    if not unique:
+        return 0
+
+    settings = connection_settings_from_env(
+        host=args.host, port=args.port, user=args.user,
+        password=args.password, database=args.database,
+    )
+    workers = min(args.workers, len(unique))
+    pool = ConnectionPool(make_connection_factory(**settings), size=workers)
+
+    t0 = time.time()
+    failed = 0
+    records = []
+    out = None
+    try:
+        if fmt == "jsonl":
+            out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+        for i, rec in enumerate(run_batch(pool, unique, execute=args.execute, workers=workers), 1):
+            if rec["error"]:
+                failed += 1
+            if out is not None:
+                out.write(json.dumps(rec, default=_json_default) + "\n")
+            else:
+                records.append(rec)
+            if i % 100 == 0:
+                print(f"  {i:,}/{len(unique):,} analyzed...", file=sys.stderr)
+
+        if fmt == "parquet":
+            write_parquet(records, args.output)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+        pool.close()
+
+    print(f"Analyzed {len(unique):,} queries in {time.time() - t0:.1f}s ({failed:,} failed)",
+          file=sys.stderr)
+    return 1 if failed == len(unique) else 0
@@ -1,44 +1,468 @@
 import time
-import pandas as pd
+import statistics
 import warnings
-from .analyzer import run_explain, analyze_explain_df, parse_tables_from_query
-from .optimizer import suggest_indexes, explanation_from_issues
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .analyzer import (run_explain, analyze_explain_df, parse_tables_from_query, fingerprint_query, explain_json,
+                       find_misestimates, misestimate_issues, plan_estimates, parse_query_shape, fetch_column_types,
+                       find_nonsargable_predicates, iter_plan_tables, plan_sort_flags, offset_issues, mask_query)
+from .optimizer import (suggest_indexes, explanation_from_issues, merge_index_suggestions, parse_index_statement,
+                        suggest_histograms, sargable_fix, rewrite_predicates, suggest_covering_indexes,
+                        suggest_order_indexes)
+from .pool import ConnectionPool
 
 
-def timed_query(conn, query, params=None):
-    """Run a query using a DB-API connection and return (df, elapsed_seconds)."""
+def timed_query(conn, query, params=None, cache=None, materialize=None):
+    """Run a query using a DB-API connection and return (df, elapsed_seconds).
+
+    With cache (a cache.ResultCache), an unchanged result is read from the
+    cache instead; elapsed is then the lookup time. materialize ("auto",
+    "numpy" or "arrow") decodes the rows into typed, dictionary-encoded
+    columns with materialize.read_typed() instead of pd.read_sql_query.
+    """
+    import pandas as pd
+
     t0 = time.time()
+    entry = None
+    if cache is not None:
+        entry = cache.lookup(conn, query, params, materialize)
+        if entry["df"] is not None:
+            return entry["df"], time.time() - t0
+        t0 = time.time()
 
-    # Suppress pandas warnings for DB-API connections
-    with warnings.catch_warnings():
-        warnings.filterwarnings('ignore', message='.*pandas only supports SQLAlchemy connectable.*')
-        df = pd.read_sql_query(query, conn, params=params)
+    if materialize:
+        from .materialize import read_typed
+        df = read_typed(conn, query, params, engine=materialize)
+    else:
+        # Suppress pandas warnings for DB-API connections
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='.*pandas only supports SQLAlchemy connectable.*')
+            df = pd.read_sql_query(query, conn, params=params)
 
     elapsed = time.time() - t0
+    if entry is not None:
+        cache.store(entry, df, elapsed)
     return df, elapsed
 
 
-def optimize_once(conn, query, auto_apply=False, verbose=True):
-    """Run query, analyze, show suggestions, optionally apply indexes and re-run."""
-    # 1. baseline run
+def benchmark_query(conn, query, runs=3):
+    """Run a query several times and return timing statistics (times, median, mean, min, max, rows)."""
+    times = []
+    rows = 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            rows = len(cursor.fetchall())
+        times.append(time.perf_counter() - t0)
+
+    return {
+        'times': times,
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'min': min(times),
+        'max': max(times),
+        'rows': rows,
+    }
+
+
+def is_select(query):
+    """True for a SELECT or WITH ... SELECT statement (leading comments and parentheses ignored)."""
+    return mask_query(query).lstrip(" \t\r\n(").lower().split(None, 1)[:1] in (["select"], ["with"])
+
+
+def analyze_query(conn, query, execute=False):
+    """EXPLAIN a query and collect issues and index suggestions without changing anything.
+
+    The query itself is only run (and timed) when execute=True, and only if it
+    is a SELECT or WITH statement. Never raises: failures are reported in
+    result["error"].
+    """
+    result = {
+        "fingerprint": fingerprint_query(query),
+        "query": query,
+        "rows": None,
+        "elapsed": None,
+        "explain_mode": None,
+        "explain_df": None,
+        "issues": [],
+        "suggestions": [],
+        "error": None,
+    }
+
+    try:
+        result["suggestions"] = suggest_indexes(query)
+        if execute and is_select(query):
+            df, elapsed = timed_query(conn, query)
+            result["rows"] = len(df)
+            result["elapsed"] = elapsed
+        explain_df, explain_mode = run_explain(conn, query, analyze=False)
+        result["explain_df"] = explain_df
+        result["explain_mode"] = explain_mode
+        result["issues"] = analyze_explain_df(explain_df, explain_mode) + offset_issues(query)
+        if execute and not is_select(query):
+            result["issues"].append("Not executed: only SELECT and WITH statements are run")
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+
+def fix_misestimates(conn, query, factor=10.0, apply=False, verbose=True):
+    """Find plan nodes with bad row estimates and propose (or collect) column histograms.
+
+    Runs ANALYZE FORMAT=JSON (which executes the query) and flags table
+    accesses whose estimated rows * filtered is off from the actual by at least
+    factor. With apply=True the proposed ANALYZE TABLE ... PERSISTENT FOR
+    COLUMNS statements are run and the query is analyzed again to verify that
+    the estimates improved (histograms are used with the default
+    use_stat_tables=PREFERABLY_FOR_QUERIES and optimizer_use_condition_selectivity=4).
+    """
+    aliases = parse_query_shape(query)["tables"]
+    misestimates = find_misestimates(explain_json(conn, query, analyze=True), factor)
+    result = {
+        "misestimates": misestimates,
+        "statements": suggest_histograms(misestimates, aliases),
+        "applied": [],
+        "verification": [],
+        "improved": None,
+    }
     if verbose:
-        print("Running baseline query...")
+        for n in misestimates:
+            print(f"⚠ {n['table']}: estimated {n['estimated']:,.0f} rows, actual {n['actual']:,.0f} "
+                  f"({n['ratio']:.0f}x {n['direction']})")
+        for statement in result["statements"]:
+            print(f"💡 {statement}")
+
+    if not (apply and result["statements"]):
+        return result
+
+    with conn.cursor() as cursor:
+        for statement in result["statements"]:
+            cursor.execute(statement)
+            cursor.fetchall()
+            result["applied"].append(statement)
+
+    after = {n["table"]: n for n in plan_estimates(explain_json(conn, query, analyze=True))}
+    for n in misestimates:
+        new_ratio = after[n["table"]]["ratio"] if n["table"] in after else None
+        result["verification"].append((n["table"], n["ratio"], new_ratio))
+        if verbose and new_ratio is not None:
+            print(f"{'✓' if new_ratio < n['ratio'] else '✗'} {n['table']}: "
+                  f"estimate off {n['ratio']:.0f}x -> {new_ratio:.1f}x")
+    result["improved"] = all(new is not None and new < old for _, old, new in result["verification"])
+    return result
+
+
+def fix_nonsargable(conn, query, apply=False, keep=False, verbose=True):
+    """Find WHERE predicates that can't use an index and propose sargable rewrites.
+
+    Each fix (see optimizer.sargable_fix) comes with the rewritten query. With
+    apply=True its DDL is run (a CREATE INDEX is skipped when an index already
+    starts with the column) and the rewritten query is EXPLAINed to check that
+    the table now reads through the expected index. Indexes and virtual columns
+    created here are dropped again unless keep=True and the plan used them.
+    """
+    from .explore import table_indexes
+
+    tables = parse_query_shape(query)["tables"]
+    try:
+        column_types = fetch_column_types(conn, tables.values())
+    except Exception:
+        column_types = {}
+    fixes = [sargable_fix(p, column_types) for p in find_nonsargable_predicates(query, column_types)]
+    for fix in fixes:
+        fix["rewritten_query"] = rewrite_predicates(query, {fix["predicate"]: fix["rewrite"]}) \
+            if fix["rewrite"] else None
+        fix["applied"], fix["verified"], fix["kept"] = [], None, False
+    result = {
+        "fixes": fixes,
+        "rewritten": rewrite_predicates(query, {f["predicate"]: f["rewrite"] for f in fixes if f["rewrite"]})
+        if any(f["rewrite"] for f in fixes) else None,
+    }
+    if verbose:
+        for fix in fixes:
+            print(f"⚠ Not sargable: {fix['predicate']}")
+            if fix["rewrite"]:
+                print(f"   💡 {fix['rewrite']}")
+            for statement in fix["statements"]:
+                print(f"   💡 {statement}")
+            if fix["note"]:
+                print(f"   ℹ {fix['note']}")
+
+    if not apply:
+        return result
+
+    preds = {p["predicate"]: p for p in find_nonsargable_predicates(query, column_types)}
+    for fix in fixes:
+        if not fix["rewrite"]:
+            continue
+        pred = preds[fix["predicate"]]
+        expected = fix["index"]
+        undo = []
+        try:
+            with conn.cursor() as cursor:
+                for statement in fix["statements"]:
+                    if fix["virtual_column"] is None:
+                        existing = [name for name, cols in table_indexes(conn, pred["table"]).items()
+                                    if cols[0].lower() == pred["column"]]
+                        if existing:
+                            expected = existing[0]
+                            continue
+                    cursor.execute(statement)
+                    fix["applied"].append(statement)
+                    undo.append(f"DROP INDEX {fix['index']} ON {pred['table']}" if fix["virtual_column"] is None
+                                else f"ALTER TABLE {pred['table']} DROP INDEX {fix['index']}, "
+                                     f"DROP COLUMN {fix['virtual_column']}")
+
+            names = {(pred["alias"] or pred["table"]).lower(), pred["table"].lower()}
+            plan = explain_json(conn, fix["rewritten_query"])
+            fix["verified"] = any(t["table_name"].lower() in names and t.get("key") == expected
+                                  for t in iter_plan_tables(plan))
+        except Exception as e:
+            fix["verified"] = False
+            fix["note"] = f"{fix['note'] + ' ' if fix['note'] else ''}Apply failed: {e}"
+        if verbose:
+            print(f"{'✓' if fix['verified'] else '✗'} {fix['rewrite']} "
+                  f"{'uses' if fix['verified'] else 'does not use'} {expected}")
+
+        if keep and fix["verified"]:
+            fix["kept"] = True
+            continue
+        with conn.cursor() as cursor:
+            for statement in reversed(undo):
+                try:
+                    cursor.execute(statement)
+                except Exception as e:
+                    if verbose:
+                        print(f"⚠ Rollback failed: {statement}: {e}")
+    return result
+
+
+def create_covering_indexes(conn, query, max_columns=5, keep=True, verbose=True):
+    """Create covering index candidates for query and keep those the plan reads index-only.
+
+    Candidates come from optimizer.suggest_covering_indexes. A table is
+    skipped when one of its existing indexes already holds every needed
+    column. After each CREATE INDEX the query is EXPLAINed; the index is
+    verified when its table is read through it with using_index (Extra:
+    "Using index") or a loose index scan. Unverified indexes are dropped, and
+    so are verified ones when keep=False. Returns the candidates with
+    "status" ("exists", "verified", "not_covering" or "error: ...") and "kept".
+    """
+    from .explore import table_indexes
+
+    tables = parse_query_shape(query)["tables"]
+    try:
+        column_types = fetch_column_types(conn, tables.values())
+    except Exception:
+        column_types = None
+    candidates = suggest_covering_indexes(query, max_columns, column_types)
+
+    for candidate in candidates:
+        candidate["status"], candidate["kept"] = None, False
+        table = candidate["table"]
+        try:
+            existing = table_indexes(conn, table)
+        except Exception:
+            existing = {}
+        if any(set(candidate["columns"]) <= {c.lower() for c in cols} for cols in existing.values()):
+            candidate["status"] = "exists"
+            continue
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(candidate["statement"])
+        except Exception as e:
+            candidate["status"] = f"error: {e}"
+            continue
+
+        names = {alias for alias, t in tables.items() if t == table}
+        try:
+            plan = explain_json(conn, query)
+            covered = any(t["table_name"].lower() in names and t.get("key") == candidate["index"]
+                          and (t.get("using_index") or t.get("using_index_for_group_by"))
+                          for t in iter_plan_tables(plan))
+            candidate["status"] = "verified" if covered else "not_covering"
+        except Exception as e:
+            candidate["status"] = f"error: {e}"
+        if verbose:
+            mark = '✓' if candidate["status"] == "verified" else '✗'
+            print(f"{mark} {candidate['index']} ({', '.join(candidate['columns'])}): {candidate['status']}")
+
+        if keep and candidate["status"] == "verified":
+            candidate["kept"] = True
+            continue
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP INDEX {candidate['index']} ON {table}")
+        except Exception as e:
+            if verbose:
+                print(f"⚠ Could not drop {candidate['index']}: {e}")
+    return candidates
+
+
+def create_order_indexes(conn, query, keep=True, verbose=True):
+    """Create the top-N / GROUP BY indexes from optimizer.suggest_order_indexes and check the plan.
+
+    A candidate is verified when EXPLAIN FORMAT=JSON shows the flags it
+    expects afterwards (no filesort, no temporary table, a loose index scan
+    for MIN/MAX). It isn't built when the plan already shows them or an index
+    with the same leading columns exists. Unverified indexes are dropped, and
+    so are verified ones when keep=False. Returns the candidates with "status"
+    ("advice", "not_needed", "exists", "verified", "still_sorting" or
+    "error: ...") and "kept".
+    """
+    from .explore import table_indexes
+
+    candidates = suggest_order_indexes(query)
+    for candidate in candidates:
+        candidate["status"], candidate["kept"] = None, False
+        if candidate["statement"] is None:
+            candidate["status"] = "advice"
+            if verbose:
+                print(f"ℹ {candidate['note']}")
+            continue
+
+        def matches():
+            flags = plan_sort_flags(explain_json(conn, query))
+            return all(flags[k] == v for k, v in candidate["expect"].items())
+
+        columns = [c for c, _ in candidate["columns"]]
+        try:
+            if matches():
+                candidate["status"] = "not_needed"
+                continue
+            if all(d == "ASC" for _, d in candidate["columns"]) and any(
+                    [c.lower() for c in cols[:len(columns)]] == columns
+                    for cols in table_indexes(conn, candidate["table"]).values()):
+                candidate["status"] = "exists"
+                continue
+            with conn.cursor() as cursor:
+                cursor.execute(candidate["statement"])
+        except Exception as e:
+            candidate["status"] = f"error: {e}"
+            continue
+
+        try:
+            candidate["status"] = "verified" if matches() else "still_sorting"
+        except Exception as e:
+            candidate["status"] = f"error: {e}"
+        if verbose:
+            mark = '✓' if candidate["status"] == "verified" else '✗'
+            print(f"{mark} {candidate['shape']}: {candidate['statement']} {candidate['status']}")
+
+        if keep and candidate["status"] == "verified":
+            candidate["kept"] = True
+            continue
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP INDEX {candidate['index']} ON {candidate['table']}")
+        except Exception as e:
+            if verbose:
+                print(f"⚠ Could not drop {candidate['index']}: {e}")
+    return candidates
 
-    df_before, t_before = timed_query(conn, query)
 
-    # 2. EXPLAIN
+class OptimizationCancelled(Exception):
+    """Raised by optimize_once when its cancel_event is set."""
+
+
+def kill_query(conn, connect=None):
+    """Abort the statement running on conn with KILL QUERY, sent over a second connection.
+
+    connect is an optional zero-argument callable returning that second
+    connection; by default one is opened with conn's own pymysql settings.
+    """
+    thread_id = conn.thread_id()
+    if connect is None:
+        import pymysql
+
+        def connect():
+            return pymysql.connect(
+                host=conn.host, port=conn.port, user=conn.user, password=conn.password,
+                ssl=conn.ctx if getattr(conn, 'ssl', False) else None,
+                connect_timeout=10, autocommit=True,
+            )
+
+    killer = connect()
     try:
-        explain_df, explain_mode = run_explain(conn, query)
+        with killer.cursor() as cursor:
+            cursor.execute(f"KILL QUERY {int(thread_id)}")
+    finally:
+        killer.close()
+    return thread_id
+
+
+def optimize_once(conn, query, auto_apply=False, verbose=True, progress=None, cancel_event=None,
+                  predictor=None, rank_indexes=False):
+    """Run query, analyze, show suggestions, optionally apply indexes and re-run.
+
+    progress, if given, is called as progress(phase, state) with phase one of
+    "baseline", "explain", "apply", "rerun" and state "start" or "done" (plus
+    "index" after each statement during "apply"). cancel_event is a
+    threading.Event checked before each step; once it is set
+    OptimizationCancelled is raised (use kill_query to stop a running statement).
+
+    Outside predict-only mode the issues also flag table accesses whose row
+    estimate is off by 10x or more (analyzer.misestimate_issues); use
+    fix_misestimates to collect histograms for them.
+
+    predictor, a trained predictor.LatencyModel, switches to predict-only mode:
+    the query is never run and before/after times are predictions from its
+    plan. With rank_indexes=True the suggestions are also ranked by predicted
+    gain (result["index_ranking"]) and auto_apply only applies those predicted
+    to help; ranking creates and drops every candidate index on the live
+    table, so it is opt-in.
+    """
+    def step(phase, state):
+        if state != "done" and cancel_event is not None and cancel_event.is_set():
+            raise OptimizationCancelled(f"Cancelled during {phase}")
+        if progress is not None:
+            progress(phase, state)
+
+    # 1. baseline run (or prediction)
+    step("baseline", "start")
+    if predictor is not None:
+        if verbose:
+            print("Predicting baseline time from the plan...")
+        before_rows, t_before = None, predictor.predict(conn, query)
+    else:
+        if verbose:
+            print("Running baseline query...")
+        df_before, t_before = timed_query(conn, query)
+        before_rows = len(df_before)
+    step("baseline", "done")
+
+    # 2. EXPLAIN (EXPLAIN ANALYZE would run the query, so not in predict-only mode)
+    step("explain", "start")
+    try:
+        explain_df, explain_mode = run_explain(conn, query, analyze=predictor is None)
         issues = analyze_explain_df(explain_df, explain_mode)
     except Exception as e:
         explain_df, explain_mode = None, None
         issues = [f"EXPLAIN failed: {str(e)}"]
+    if predictor is None:
+        # Row estimates far from the actual rows (ANALYZE FORMAT=JSON runs the query once more)
+        try:
+            issues += misestimate_issues(find_misestimates(explain_json(conn, query, analyze=True)))
+        except Exception:
+            pass  # ANALYZE FORMAT=JSON needs MariaDB 10.1+; the plain EXPLAIN issues still stand
+    issues += offset_issues(query)
 
     suggestions = suggest_indexes(query)
+    index_ranking = None
+    if predictor is not None and rank_indexes and suggestions:
+        index_ranking, _ = predictor.rank_indexes(conn, query, suggestions)
+        if verbose:
+            for statement, predicted, gain in index_ranking:
+                print(f"  {gain:+.0f}% predicted ({predicted:.3f}s): {statement}")
+        suggestions = [statement for statement, _, gain in index_ranking if gain > 0]
     expl_text = explanation_from_issues(issues, suggestions)
+    step("explain", "done")
 
     result = {
-        "before_rows": len(df_before),
+        "predicted": predictor is not None,
+        "index_ranking": index_ranking,
+        "before_rows": before_rows,
         "before_time": t_before,
         "explain_mode": explain_mode,
         "explain_df": explain_df,
@@ -55,29 +479,145 @@ def optimize_once(conn, query, auto_apply=False, verbose=True):
         if verbose:
             print("Applying suggested indexes...")
 
+        step("apply", "start")
         applied = []
         cursor = conn.cursor()
-        for s in suggestions:
-            if s.strip().upper().startswith("CREATE INDEX"):
+        try:
+            for s in suggestions:
+                if s.strip().upper().startswith("CREATE INDEX"):
+                    try:
+                        cursor.execute(s)
+                        applied.append(s)
+                        if verbose:
+                            print(f"✓ Applied: {s}")
+                    except Exception as e:
+                        error_msg = f"Failed: {s} ({e})"
+                        applied.append(error_msg)
+                        if verbose:
+                            print(f"✗ {error_msg}")
+                    step("apply", "index")
+        finally:
+            cursor.close()
+            conn.commit()
+            result['applied_indexes'] = applied
+        step("apply", "done")
+
+        # re-run query to measure improvement
+        step("rerun", "start")
+        if predictor is not None:
+            result['after_time'] = predictor.predict(conn, query)
+        else:
+            if verbose:
+                print("Running optimized query...")
+            df_after, t_after = timed_query(conn, query)
+            result['after_rows'] = len(df_after)
+            result['after_time'] = t_after
+        step("rerun", "done")
+
+    return result
+
+
+def optimize_many(conn_or_pool, queries, auto_apply=False, runs=3, verbose=False):
+    """Optimize a batch of queries together; returns a lazy iterator of per-query results.
+
+    Queries are deduplicated by fingerprint and EXPLAINed concurrently when a
+    ConnectionPool is passed (a plain connection is used serially). With
+    auto_apply=True every query is benchmarked first, the index suggestions of
+    all queries are merged and applied once, and each query touching an indexed
+    table is benchmarked again. Only SELECT and WITH statements are
+    benchmarked; others get a "Not executed" issue. Benchmarks run one query
+    at a time on a single connection in both phases, so the before and after
+    timings see the same (absent) concurrent load. Results are yielded as soon
+    as they are ready.
+    """
+    from .workload import dedupe_queries
+
+    unique = dedupe_queries(queries)
+    if isinstance(conn_or_pool, ConnectionPool):
+        pool = conn_or_pool
+    else:
+        # One connection can't be shared between threads, so run serially
+        pool = ConnectionPool(lambda: conn_or_pool, size=1)
+
+    def analyze(fp, entry):
+        with pool.acquire() as conn:
+            result = analyze_query(conn, entry["query"])
+        result.update({
+            "count": entry["count"],
+            "before_time": None,
+            "before_times": None,
+            "after_time": None,
+            "after_times": None,
+            "improvement": None,
+            "applied_indexes": [],
+        })
+        return result
+
+    def benchmark(conn, result, phase):
+        try:
+            stats = benchmark_query(conn, result["query"], runs=runs)
+        except Exception as e:
+            result["error"] = str(e)
+            return
+        result[f"{phase}_time"] = stats['median']
+        result[f"{phase}_times"] = stats['times']
+        if phase == "before":
+            result["rows"] = stats['rows']
+        elif result["before_time"]:
+            result["improvement"] = (result["before_time"] - stats['median']) / result["before_time"] * 100
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(analyze, fp, entry) for fp, entry in unique.items()]
+
+        if not auto_apply:
+            for future in as_completed(futures):
+                yield future.result()
+            return
+
+        # Indexes can only be merged once every query has been analyzed
+        results = [f.result() for f in futures]
+
+    # Only SELECT/WITH statements are run, as in analyze_query; DML is never executed
+    with pool.acquire() as conn:
+        for result in results:
+            if result["error"] is not None:
+                continue
+            if is_select(result["query"]):
+                benchmark(conn, result, "before")
+            else:
+                result["issues"].append("Not executed: only SELECT and WITH statements are run")
+
+    all_suggestions = [s for r in results if r["error"] is None for s in r["suggestions"]]
+    statements, mapping = merge_index_suggestions(all_suggestions)
+
+    applied = {}
+    with pool.acquire() as conn:
+        with conn.cursor() as cursor:
+            for statement in statements:
                 try:
-                    cursor.execute(s)
-                    applied.append(s)
+                    cursor.execute(statement)
+                    applied[statement] = True
                     if verbose:
-                        print(f"✓ Applied: {s}")
+                        print(f"✓ Applied: {statement}")
                 except Exception as e:
-                    error_msg = f"Failed: {s} ({e})"
-                    applied.append(error_msg)
+                    applied[statement] = False
                     if verbose:
-                        print(f"✗ {error_msg}")
-        cursor.close()
+                        print(f"✗ Failed: {statement} ({e})")
         conn.commit()
-        result['applied_indexes'] = applied
 
-        # re-run query to measure improvement
-        if verbose:
-            print("Running optimized query...")
-        df_after, t_after = timed_query(conn, query)
-        result['after_rows'] = len(df_after)
-        result['after_time'] = t_after
+    indexed_tables = {parse_index_statement(s)[1] for s, ok in applied.items() if ok}
+    pending = []
+    for result in results:
+        result["applied_indexes"] = list(dict.fromkeys(
+            mapping[s] for s in result["suggestions"] if mapping.get(s) and applied.get(mapping[s])
+        ))
+        query_tables = {t.lower() for t in parse_tables_from_query(result["query"])}
+        if result["error"] is None and result["before_times"] and query_tables & indexed_tables:
+            pending.append(result)
+        else:
+            yield result
 
-    return result
\ No newline at end of file
+    with pool.acquire() as conn:
+        for result in pending:
+            benchmark(conn, result, "after")
+            yield result
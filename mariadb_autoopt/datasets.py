@@ -0,0 +1,129 @@
+"""
+Parsed OpenFlights datasets, cached in memory-mappable form.
+
+The .dat files in data/ are the source of truth. load_dataset() parses a
+file once with pd.read_csv (\\N and empty fields as missing, as the loader
+treats them) and writes the columns to a bundle of .npy files named by the
+SHA-256 of the file's contents:
+
+    ~/.mariadb_autoopt/datasets/routes-<sha256 prefix>/
+        meta.json                columns, kinds and row count
+        <i>.npy                  numeric columns (float64 where values are missing)
+        <i>.codes.npy            string columns: int32 dictionary codes (-1 for missing)
+        <i>.categories.npy       and their distinct values
+
+Later runs hash the file, find the bundle and memory-map it: numeric
+columns are used in place without a copy, string columns become
+categoricals over the mapped codes. Editing a .dat file changes its hash,
+so the next load parses it again and replaces the old bundle.
+
+    routes = load_dataset("routes")
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from .loader import OPENFLIGHTS_TABLES
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_DATASET_DIR = os.path.join(os.path.expanduser("~"), ".mariadb_autoopt", "datasets")
+# Bumped when the bundle layout or the parsing changes, so old bundles aren't reused
+_FORMAT_VERSION = 1
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents (with the bundle format version)."""
+    digest = hashlib.sha256(f"v{_FORMAT_VERSION}".encode())
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_dataset(name, data_dir=None):
+    """Parse data_dir/<name>.dat into a DataFrame with the OPENFLIGHTS_TABLES column names."""
+    import pandas as pd
+
+    spec = OPENFLIGHTS_TABLES[name]
+    return pd.read_csv(os.path.join(data_dir or DEFAULT_DATA_DIR, spec["file"]), header=None,
+                       names=spec["columns"], na_values=["\\N"], keep_default_na=False)
+
+
+def write_bundle(df, path):
+    """Write df's columns as .npy files plus meta.json into directory path (atomically replaced)."""
+    import numpy as np
+    import pandas as pd
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    kinds = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            np.save(os.path.join(tmp, f"{i}.npy"), values.to_numpy())
+            kinds.append("numeric")
+        else:
+            # Empty strings are missing, as in the database
+            codes, categories = pd.factorize(values.replace("", None))
+            np.save(os.path.join(tmp, f"{i}.codes.npy"), codes.astype(np.int32))
+            np.save(os.path.join(tmp, f"{i}.categories.npy"), np.asarray(categories, dtype=str))
+            kinds.append("string")
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump({"columns": list(df.columns), "kinds": kinds, "rows": len(df)}, fh)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def read_bundle(path):
+    """DataFrame over a bundle written by write_bundle(), with the .npy files memory-mapped."""
+    import numpy as np
+    import pandas as pd
+
+    with open(os.path.join(path, "meta.json")) as fh:
+        meta = json.load(fh)
+    columns = {}
+    for i, kind in enumerate(meta["kinds"]):
+        if kind == "numeric":
+            columns[i] = np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r")
+        else:
+            codes = np.load(os.path.join(path, f"{i}.codes.npy"), mmap_mode="r")
+            categories = np.load(os.path.join(path, f"{i}.categories.npy"), mmap_mode="r")
+            columns[i] = pd.Categorical.from_codes(codes, categories=categories.astype(object))
+    df = pd.DataFrame(columns, copy=False)
+    df.columns = meta["columns"]
+    return df
+
+
+def load_dataset(name, data_dir=None, cache_dir=None, verbose=False):
+    """The parsed OpenFlights dataset name ("airports", "airlines" or "routes") as a DataFrame.
+
+    data_dir defaults to the repository's data/ directory and cache_dir to
+    AUTOOPT_DATASET_DIR or ~/.mariadb_autoopt/datasets. The bundle is
+    memory-mapped read-only; copy the DataFrame before modifying it.
+    """
+    data_dir = data_dir or DEFAULT_DATA_DIR
+    cache_dir = cache_dir or os.getenv("AUTOOPT_DATASET_DIR", DEFAULT_DATASET_DIR)
+    source = os.path.join(data_dir, OPENFLIGHTS_TABLES[name]["file"])
+    path = os.path.join(cache_dir, f"{name}-{file_hash(source)[:16]}")
+    if os.path.exists(os.path.join(path, "meta.json")):
+        if verbose:
+            print(f"✓ {name}: memory-mapped from {path}")
+        return read_bundle(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    write_bundle(parse_dataset(name, data_dir), path)
+    # Bundles of earlier versions of the file
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f"{name}-") and os.path.join(cache_dir, entry) != path and not entry.endswith(".tmp"):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    if verbose:
+        print(f"✓ {name}: parsed {source} and cached it in {path}")
+    return read_bundle(path)
+
+
+def load_openflights_datasets(data_dir=None, cache_dir=None, verbose=False):
+    """{name: load_dataset(name)} for airports, airlines and routes."""
+    return {name: load_dataset(name, data_dir, cache_dir, verbose) for name in OPENFLIGHTS_TABLES}
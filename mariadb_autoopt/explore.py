@@ -0,0 +1,255 @@
+"""
+Exploration of session settings, join orders and index hints for one query.
+
+Some slow joins are fixed by optimizer_switch flags, join buffering or a
+different join order rather than by a new index. explore_variants() re-plans
+the query under a bounded set of such variants and skips those that cannot
+win: variants whose plan matches one already measured, and variants whose
+optimizer cost is far above the baseline. It benchmarks the rest under
+max_statement_time and reports the best, with the hint that locks it in.
+"""
+
+import itertools
+import json
+import re
+import statistics
+import time
+
+from .analyzer import (build_from, build_select, iter_plan_tables, mask_query, plan_cost, split_clauses,
+                       split_from_items, split_top_level_and)
+
+# (name, {variable: value}, when) tried with SET STATEMENT ... FOR; when limits each to queries it can affect
+SESSION_VARIANTS = (
+    ("mrr", {"optimizer_switch": "'mrr=on,mrr_sort_keys=on,mrr_cost_based=off'"}, None),
+    ("bka_join", {"join_cache_level": 6, "optimizer_switch": "'mrr=on,mrr_sort_keys=on'"}, "join"),
+    ("hash_join", {"join_cache_level": 4}, "join"),
+    ("no_join_buffer", {"join_cache_level": 0}, "join"),
+    ("join_cache_level_8", {"join_cache_level": 8, "optimizer_switch": "'mrr=on'"}, "join"),
+    ("no_index_merge", {"optimizer_switch": "'index_merge=off'"}, "or"),
+    ("no_derived_merge", {"optimizer_switch": "'derived_merge=off'"}, "derived"),
+    ("no_derived_keys", {"optimizer_switch": "'derived_with_keys=off'"}, "derived"),
+    ("no_semijoin", {"optimizer_switch": "'semijoin=off'"}, "subquery"),
+)
+
+
+def with_settings(settings, sql):
+    """Prefix sql with SET STATEMENT for the given {variable: value} (unchanged when empty)."""
+    if not settings:
+        return sql
+    assignments = ", ".join(f"{name}={value}" for name, value in settings.items())
+    return f"SET STATEMENT {assignments} FOR {sql}"
+
+
+def _query_traits(query):
+    masked = mask_query(query).lower()
+    return {
+        None: True,
+        "join": bool(re.search(r'\bjoin\b', masked)) or ',' in split_clauses(query).get('from', ''),
+        "or": bool(re.search(r'\bor\b', masked)),
+        "derived": bool(re.search(r'\bfrom\s*\(', masked) or re.search(r'\bjoin\s*\(', masked)),
+        "subquery": bool(re.search(r'\bin\s*\(\s*select\b', masked) or re.search(r'\bexists\s*\(', masked)),
+    }
+
+
+def join_order_variants(query, estimated_rows=None, max_orderings=12):
+    """STRAIGHT_JOIN rewrites of query for different orders of its FROM tables.
+
+    Only inner (comma / [INNER|CROSS] JOIN ... ON) joins can be reordered;
+    their ON conditions move to WHERE. Orders starting from the tables with the
+    fewest estimated rows (a dict alias -> rows) are tried first.
+    """
+    clauses = split_clauses(query)
+    if "from" not in clauses or "select" not in clauses:
+        return []
+    items = split_from_items(clauses["from"])
+    if len(items) < 2 or any(it["join"] not in (None, ",", "JOIN", "INNER JOIN", "CROSS JOIN", "STRAIGHT_JOIN")
+                             or it["using"] for it in items):
+        return []
+
+    conditions = [it["on"] for it in items if it["on"]]
+    # Which aliases each join condition (ON or WHERE) connects
+    links = [
+        {a.lower() for a in re.findall(r'`?(\w+)`?\s*\.', mask_query(c))}
+        for c in conditions + split_top_level_and(clauses.get("where", ""))
+    ]
+
+    def connected(order):
+        # Every table after the first must join to one already read, or it's a cross product
+        seen = {(order[0]["alias"] or "").lower()}
+        for it in order[1:]:
+            alias = (it["alias"] or "").lower()
+            if not any(alias in link and link & seen for link in links):
+                return False
+            seen.add(alias)
+        return True
+
+    rows = estimated_rows or {}
+    items = sorted(items, key=lambda it: rows.get((it["alias"] or "").lower(), float("inf")))
+    orders = (order for order in itertools.permutations(items) if connected(order))
+    variants = []
+    for order in itertools.islice(orders, max_orderings):
+        from_text = ", ".join(it["ref"] for it in order)
+        name = "join_order:" + ",".join(it["alias"] or "?" for it in order)
+        variants.append((name, build_select(clauses, from_text, conditions, modifier="STRAIGHT_JOIN")))
+    return variants
+
+
+def table_indexes(conn, table):
+    """{index_name: [columns]} for a table, from SHOW INDEX."""
+    indexes = {}
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW INDEX FROM `{table}`")
+        names = [d[0] for d in cursor.description]
+        for row in cursor.fetchall():
+            rec = dict(zip(names, row))
+            indexes.setdefault(rec["Key_name"], []).append(rec["Column_name"])
+    return indexes
+
+
+def index_hint_variants(conn, query, plan, max_hints=6):
+    """FORCE INDEX / IGNORE INDEX rewrites for the tables of query, given its baseline JSON plan.
+
+    For each table the index the optimizer chose is ignored, and each other
+    index whose leading column appears in the query is forced.
+    """
+    clauses = split_clauses(query)
+    if "from" not in clauses:
+        return []
+    items = split_from_items(clauses["from"])
+    chosen = {t["table_name"].lower(): t.get("key") for t in iter_plan_tables(plan)}
+    masked = mask_query(query).lower()
+
+    variants = []
+    for i, item in enumerate(items):
+        if not item["table"] or re.search(r'\b(force|ignore|use)\s+(index|key)\b', item["ref"], re.IGNORECASE):
+            continue
+        try:
+            indexes = table_indexes(conn, item["table"])
+        except Exception:
+            continue
+        used = chosen.get((item["alias"] or "").lower())
+        hints = []
+        if used:
+            hints.append(("ignore", used, f"IGNORE INDEX (`{used}`)"))
+        for name, columns in indexes.items():
+            if name != used and re.search(rf'\b{re.escape(columns[0].lower())}\b', masked):
+                hints.append(("force", name, f"FORCE INDEX (`{name}`)"))
+        for kind, name, hint in hints:
+            hinted = [dict(it) for it in items]
+            hinted[i]["ref"] = f"{item['ref']} {hint}"
+            variants.append((f"{kind}_index:{item['alias']}.{name}", build_select(clauses, build_from(hinted))))
+    return variants[:max_hints]
+
+
+def _explain_with(conn, settings, sql):
+    with conn.cursor() as cursor:
+        cursor.execute(with_settings(settings, "EXPLAIN FORMAT=JSON " + sql))
+        return json.loads(cursor.fetchone()[0])
+
+
+# Plan properties beyond access paths that session settings change (join buffering, MRR)
+_EXECUTION_MARKERS = ("join_type", "buffer_type", "mrr_type", "materialized", "rowid_filter")
+
+
+def _markers(plan):
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key in _EXECUTION_MARKERS:
+                yield key, value if isinstance(value, (str, int, float, bool)) else True
+            yield from _markers(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _markers(item)
+
+
+def plan_signature(plan):
+    """Join order, access type and key per table plus join-buffer/MRR markers: equal signatures run alike."""
+    tables = tuple((t["table_name"], t.get("access_type"), t.get("key")) for t in iter_plan_tables(plan))
+    return tables, tuple(_markers(plan))
+
+
+def _timed_runs(conn, sql, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            cursor.fetchall()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def explore_variants(conn, query, runs=3, max_orderings=12, max_hints=6, prune_factor=3.0,
+                     timeout_factor=1.5, min_speedup=5.0, verbose=True):
+    """Benchmark the query under session-setting, join-order and index-hint variants.
+
+    Variants with the same plan as one already measured, or with an optimizer
+    cost above prune_factor x the baseline cost, are skipped without running.
+    The rest run under max_statement_time = timeout_factor x the baseline
+    median, so a losing variant is cut short. Returns {"baseline", "variants",
+    "best"}. best is the fastest variant at least min_speedup percent faster
+    than the baseline, or None; its "hint" is the statement to use instead of
+    the query.
+    """
+    baseline_plan = _explain_with(conn, {}, query)
+    baseline_cost = plan_cost(baseline_plan)
+    baseline_times = _timed_runs(conn, query, runs)
+    baseline = {
+        "name": "baseline", "kind": "baseline", "settings": {}, "query": query, "hint": query,
+        "cost": baseline_cost, "signature": plan_signature(baseline_plan), "status": "ok",
+        "times": baseline_times, "median": statistics.median(baseline_times), "speedup_pct": 0.0,
+    }
+    if verbose:
+        print(f"Baseline: {baseline['median']:.3f}s (cost {baseline_cost:.1f})")
+
+    traits = _query_traits(query)
+    estimated_rows = {t["table_name"].lower(): float(t.get("rows") or 0) for t in iter_plan_tables(baseline_plan)}
+    candidates = [("session", name, settings, query)
+                  for name, settings, when in SESSION_VARIANTS if traits[when]]
+    candidates += [("join_order", name, {}, sql)
+                   for name, sql in join_order_variants(query, estimated_rows, max_orderings)]
+    candidates += [("index_hint", name, {}, sql)
+                   for name, sql in index_hint_variants(conn, query, baseline_plan, max_hints)]
+
+    timeout = max(round(baseline["median"] * timeout_factor, 3), 0.001)
+    seen = {baseline["signature"]}
+    variants = []
+    for kind, name, settings, sql in candidates:
+        variant = {"name": name, "kind": kind, "settings": settings, "query": sql,
+                   "hint": with_settings(settings, sql), "cost": None, "signature": None,
+                   "status": None, "times": None, "median": None, "speedup_pct": None}
+        variants.append(variant)
+        try:
+            plan = _explain_with(conn, settings, sql)
+        except Exception as e:
+            variant["status"] = f"error: {e}"
+            continue
+        variant["cost"] = plan_cost(plan)
+        variant["signature"] = plan_signature(plan)
+        if variant["signature"] in seen:
+            variant["status"] = "pruned: same plan"
+            continue
+        if baseline_cost and variant["cost"] > baseline_cost * prune_factor:
+            variant["status"] = "pruned: cost"
+            continue
+        seen.add(variant["signature"])
+
+        try:
+            times = _timed_runs(conn, with_settings({"max_statement_time": timeout, **settings}, sql), runs)
+        except Exception as e:
+            # Error 1969: max_statement_time exceeded, i.e. slower than the baseline
+            variant["status"] = "timeout" if "1969" in str(e) or "max_statement_time" in str(e) else f"error: {e}"
+            continue
+        variant.update(status="ok", times=times, median=statistics.median(times))
+        variant["speedup_pct"] = (baseline["median"] - variant["median"]) / baseline["median"] * 100
+        if verbose:
+            print(f"  {name:<40} {variant['median']:.3f}s ({variant['speedup_pct']:+.1f}%)")
+
+    measured = sorted((v for v in variants if v["status"] == "ok"), key=lambda v: v["median"])
+    best = measured[0] if measured and measured[0]["speedup_pct"] >= min_speedup else None
+    if verbose:
+        pruned = sum(1 for v in variants if (v["status"] or "").startswith("pruned"))
+        print(f"Explored {len(variants)} variants ({pruned} pruned without running)")
+        if best:
+            print(f"Best: {best['name']} ({best['speedup_pct']:.1f}% faster)\n  {best['hint']}")
+    return {"baseline": baseline, "variants": variants, "best": best}
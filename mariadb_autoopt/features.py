@@ -0,0 +1,130 @@
+"""
+Sparse feature vectors for queries and cosine nearest-neighbour search over them.
+
+A query is described by named binary features (tables, join edges, predicate
+columns and operators, GROUP BY / ORDER BY columns, aggregates and the EXPLAIN
+access type per table), so two queries are similar when they touch the same
+tables in the same way, whatever their literals or aliases.
+"""
+
+from .analyzer import parse_query_shape
+
+
+def _col(table, column):
+    return f"{table or '?'}.{column}"
+
+
+def query_features(query, explain_df=None):
+    """Return the sparse feature dict {name: weight} describing a query (and optionally its plan)."""
+    shape = parse_query_shape(query)
+    features = {}
+
+    for table in set(t for t in shape["tables"].values() if t):
+        features[f"table:{table}"] = 1.0
+
+    for left, right in shape["join_edges"]:
+        edge = sorted([_col(*left), _col(*right)])
+        features[f"join:{edge[0]}={edge[1]}"] = 1.0
+
+    for table, column, op in shape["predicates"]:
+        features[f"pred:{_col(table, column)}"] = 1.0
+        features[f"pred_op:{_col(table, column)}:{op}"] = 1.0
+
+    for table, column in shape["group_by"]:
+        if table:
+            features[f"group:{_col(table, column)}"] = 1.0
+    if shape["group_by"]:
+        features["has:group_by"] = 1.0
+
+    for table, column, direction in shape["order_by"]:
+        if table:
+            features[f"order:{_col(table, column)}:{direction}"] = 1.0
+    if shape["order_by"]:
+        features["has:order_by"] = 1.0
+    if shape["limit"] is not None:
+        features["has:limit"] = 1.0
+
+    for item in shape["select"]:
+        if item["aggregate"]:
+            features[f"agg:{item['aggregate']}{'_distinct' if item['distinct'] else ''}"] = 1.0
+        if item["expr"].lstrip().startswith("(") and "select" in item["expr"].lower():
+            features["has:scalar_subquery"] = 1.0
+
+    if explain_df is not None and not explain_df.empty:
+        for _, row in explain_df.iterrows():
+            ref = str(row.get('table') or '').lower()
+            table = shape["tables"].get(ref, ref) or ref
+            access = str(row.get('type') or '').upper()
+            if table and access:
+                features[f"access:{table}:{access}"] = 1.0
+            extra = str(row.get('Extra') or row.get('extra') or '').upper()
+            if 'FILESORT' in extra:
+                features["plan:filesort"] = 1.0
+            if 'USING TEMPORARY' in extra:
+                features["plan:temporary"] = 1.0
+
+    return features
+
+
+class FeatureIndex:
+    """Array-backed matrix of feature vectors with vectorized cosine similarity search.
+
+    Vectors are added as sparse dicts; the vocabulary grows as new feature
+    names appear and the L2-normalized dense matrix is rebuilt lazily.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.keys = []
+        self._rows = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, features):
+        for name in features:
+            if name not in self.vocabulary:
+                self.vocabulary[name] = len(self.vocabulary)
+        self.keys.append(key)
+        self._rows.append(features)
+        self._matrix = None
+
+    def _vector(self, features):
+        import numpy as np
+
+        vec = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for name, weight in features.items():
+            col = self.vocabulary.get(name)
+            if col is not None:
+                vec[col] = weight
+        return vec
+
+    def matrix(self):
+        import numpy as np
+
+        if self._matrix is None:
+            matrix = np.zeros((len(self._rows), len(self.vocabulary)), dtype=np.float32)
+            for i, features in enumerate(self._rows):
+                cols = [self.vocabulary[name] for name in features]
+                matrix[i, cols] = list(features.values())
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = matrix / norms
+        return self._matrix
+
+    def nearest(self, features, k=5, min_similarity=0.0):
+        """Return [(key, cosine_similarity), ...] for the k most similar vectors."""
+        import numpy as np
+
+        if not self.keys:
+            return []
+        vec = self._vector(features)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return []
+        sims = self.matrix() @ (vec / norm)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(self.keys[i], float(sims[i])) for i in top if sims[i] >= min_similarity]
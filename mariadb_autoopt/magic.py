@@ -1,21 +1,388 @@
-from IPython.core.magic import register_cell_magic
-from IPython.display import display
-import matplotlib.pyplot as plt
+import io
+import random
 import shlex
+import threading
+import time
 
+# IPython and matplotlib are only imported once a magic actually runs, so
+# importing this module stays cheap outside Jupyter.
 
-def register_magic():
+PHASES = ("baseline", "explain", "apply", "rerun")
+PHASE_LABELS = {
+    "baseline": "Running baseline query",
+    "explain": "Analyzing EXPLAIN plan",
+    "apply": "Creating indexes",
+    "rerun": "Re-running optimized query",
+}
+
+
+def _is_true(value):
+    return str(value).lower() in ('true', '1', 'yes', 'y')
+
+
+def format_result(result):
+    """Return the text report for an optimize_once result, split around the EXPLAIN table."""
+    head = [
+        "=" * 60,
+        "📊 MARIA DB AUTO-OPTIMIZER RESULTS",
+        "=" * 60,
+        "",
+        "⏱️  BASELINE PERFORMANCE",
+    ]
+    # Predict-only results (optimize_once(predictor=...)) never ran the query
+    time_label = "Predicted time" if result.get('predicted') else "Execution time"
+    if result['before_rows'] is not None:
+        head.append(f"   Rows returned: {result['before_rows']:,}")
+    head.append(f"   {time_label}: {result['before_time']:.3f} seconds")
+    if result['explain_mode']:
+        head += ["", f"🔍 EXPLAIN ANALYSIS ({result['explain_mode']})"]
+
+    tail = ["", "📝 ANALYSIS SUMMARY", result['explanation']]
+
+    if result['applied_indexes']:
+        tail += ["", "🔧 APPLIED CHANGES"]
+        tail += [f"   • {idx}" for idx in result['applied_indexes']]
+
+    if result['after_time'] is not None:
+        improvement = ((result['before_time'] - result['after_time']) / result['before_time']) * 100
+        tail += [
+            "",
+            "🚀 OPTIMIZATION RESULTS",
+        ]
+        if result['after_rows'] is not None:
+            tail.append(f"   Rows returned: {result['after_rows']:,}")
+        tail += [
+            f"   {time_label}: {result['after_time']:.3f} seconds",
+            f"   Performance improvement: {improvement:.1f}%",
+        ]
+
+    return "\n".join(head) + "\n", "\n".join(tail) + "\n"
+
+
+def comparison_chart_png(result):
+    """Render the before/after bar chart to PNG bytes (thread-safe, no pyplot state)."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 4))
+    ax = fig.add_subplot()
+    times = [result['before_time'], result['after_time']]
+    labels = ['Before', 'After']
+    colors = ['#ff6b6b', '#51cf66']
+
+    bars = ax.bar(labels, times, color=colors, alpha=0.8)
+    ax.set_ylabel('Execution Time (seconds)')
+    ax.set_title('Query Performance: Before vs After Optimization')
+
+    # Add value labels on bars
+    for bar, time_val in zip(bars, times):
+        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.01,
+                f'{time_val:.3f}s', ha='center', va='bottom')
+
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+class OptimizationPanel:
+    """Runs optimize_once on a background thread and reports into an ipywidgets panel.
+
+    The kernel stays responsive while the query runs. The Cancel button stops
+    the pipeline between phases and sends KILL QUERY for the statement that is
+    currently executing. The connection is busy until the panel shows it is
+    finished, so don't use it from other cells in the meantime.
+    """
+
+    def __init__(self, conn, query, auto_apply=False, on_done=None):
+        import ipywidgets as widgets
+
+        self.conn = conn
+        self.query = query
+        self.auto_apply = auto_apply
+        self.on_done = on_done
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+        phases = PHASES if auto_apply else PHASES[:2]
+        self._steps = {phase: i for i, phase in enumerate(phases)}
+        self.status = widgets.HTML("⏳ Starting...")
+        self.bar = widgets.IntProgress(value=0, min=0, max=len(phases), description="Progress")
+        self.cancel_button = widgets.Button(description="Cancel", button_style="danger", icon="stop")
+        self.cancel_button.on_click(self._on_cancel)
+        self.output = widgets.Output()
+        self.widget = widgets.VBox([
+            widgets.HBox([self.bar, self.cancel_button]),
+            self.status,
+            self.output,
+        ])
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        from IPython.display import display
+
+        display(self.widget)
+        self.thread.start()
+        return self
+
+    def _progress(self, phase, state):
+        if state == "start":
+            self.status.value = f"⏳ {PHASE_LABELS[phase]}..."
+        elif state == "done":
+            self.bar.value = self._steps[phase] + 1
+
+    def _on_cancel(self, _button):
+        if self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.cancel_button.disabled = True
+        self.status.value = "🛑 Cancelling..."
+        threading.Thread(target=self._kill, daemon=True).start()
+
+    def _kill(self):
+        from mariadb_autoopt.core import kill_query
+
+        try:
+            thread_id = kill_query(self.conn)
+            self.status.value = f"🛑 Sent KILL QUERY to server thread {thread_id}, waiting for it to stop..."
+        except Exception as e:
+            self.status.value = f"🛑 Cancelling after the current step (KILL QUERY failed: {e})"
+
+    def _run(self):
+        from IPython.display import Image
+        from mariadb_autoopt.core import optimize_once, OptimizationCancelled
+
+        try:
+            self.result = optimize_once(self.conn, self.query, auto_apply=self.auto_apply,
+                                        verbose=False, progress=self._progress,
+                                        cancel_event=self.cancel_event)
+        except OptimizationCancelled as e:
+            self.status.value = f"🛑 {e}"
+        except Exception as e:
+            self.error = e
+            if self.cancel_event.is_set():
+                self.status.value = f"🛑 Cancelled ({e})"
+            else:
+                self.status.value = f"❌ Error: {e}"
+        else:
+            self.bar.value = self.bar.max
+            self.status.value = "✅ Done"
+            head, tail = format_result(self.result)
+            self.output.append_stdout(head)
+            if self.result['explain_df'] is not None:
+                self.output.append_display_data(self.result['explain_df'])
+            self.output.append_stdout(tail)
+            if self.result['after_time'] is not None:
+                self.output.append_display_data(Image(data=comparison_chart_png(self.result)))
+        finally:
+            self.cancel_button.disabled = True
+            if self.on_done is not None:
+                self.on_done(self)
+
+
+class ReadSqlMonitor:
+    """Opt-in workload capture for pandas.read_sql / read_sql_query on one connection.
+
+    Every call on the monitored connection is timed; a sampled subset is also
+    fingerprinted so slow query shapes can be grouped. Bookkeeping time is kept
+    within overhead_budget (a fraction of the observed query time) by lowering
+    the sample rate, and every report_every calls the slowest shapes are
+    printed with their EXPLAIN findings. Analysts' code doesn't change: the
+    pandas functions are wrapped in place until uninstall().
+    """
+
+    _PATCHED = ("read_sql", "read_sql_query")
+
+    def __init__(self, conn, overhead_budget=0.01, sample_rate=1.0, report_every=100,
+                 top=5, explain=True):
+        self.conn = conn
+        self.overhead_budget = overhead_budget
+        self.max_sample_rate = sample_rate
+        self.sample_rate = sample_rate
+        self.report_every = report_every
+        self.top = top
+        self.explain = explain
+        self.calls = 0
+        self.sampled = 0
+        self.query_time = 0.0
+        self.overhead = 0.0
+        self.shapes = {}
+        self.findings = {}
+        self._originals = {}
+        self._lock = threading.Lock()
+        self._internal = threading.local()
+
+    def install(self):
+        import pandas as pd
+        from .analyzer import fingerprint_query
+
+        if self._originals:
+            return self
+        # Warm up imports and regexes so the first sampled call isn't billed for them
+        fingerprint_query("SELECT 1")
+        for name in self._PATCHED:
+            original = getattr(pd, name)
+            self._originals[name] = original
+            setattr(pd, name, self._wrap(original))
+        return self
+
+    def uninstall(self):
+        import pandas as pd
+
+        for name, original in self._originals.items():
+            setattr(pd, name, original)
+        self._originals = {}
+
+    def _wrap(self, original):
+        monitor = self
+
+        def wrapper(sql, con, *args, **kwargs):
+            if (con is not monitor.conn or not isinstance(sql, str)
+                    or getattr(monitor._internal, "active", False)):
+                return original(sql, con, *args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return original(sql, con, *args, **kwargs)
+            finally:
+                monitor.record(sql, time.perf_counter() - t0)
+
+        wrapper.__wrapped__ = original
+        wrapper.__doc__ = original.__doc__
+        return wrapper
+
+    def record(self, sql, elapsed):
+        """Account one intercepted call (public so other entry points can feed the monitor)."""
+        from .analyzer import fingerprint_query
+
+        t0 = time.perf_counter()
+        report_due = False
+        with self._lock:
+            self.calls += 1
+            self.query_time += elapsed
+            if random.random() < self.sample_rate:
+                self.sampled += 1
+                fp = fingerprint_query(sql)
+                shape = self.shapes.get(fp)
+                if shape is None:
+                    shape = self.shapes[fp] = {"query": sql, "calls": 0, "total_time": 0.0, "max_time": 0.0}
+                shape["calls"] += 1
+                shape["total_time"] += elapsed
+                if elapsed > shape["max_time"]:
+                    shape["max_time"] = elapsed
+                    shape["query"] = sql
+            report_due = self.report_every and self.calls % self.report_every == 0
+            self.overhead += time.perf_counter() - t0
+            self._adapt()
+
+        if report_due:
+            self.report()
+
+    def _adapt(self):
+        """Halve the sample rate while over budget; recover slowly once well under it."""
+        budget = self.overhead_budget * self.query_time
+        if self.overhead > budget:
+            self.sample_rate = max(self.sample_rate / 2, 0.01)
+        elif self.overhead < budget / 2 and self.sample_rate < self.max_sample_rate:
+            self.sample_rate = min(self.sample_rate * 1.25, self.max_sample_rate)
+
+    def slowest(self, top=None):
+        """Return the slowest shapes by mean time as a list of dicts."""
+        with self._lock:
+            rows = [
+                dict(shape, fingerprint=fp, mean_time=shape["total_time"] / shape["calls"])
+                for fp, shape in self.shapes.items()
+            ]
+        rows.sort(key=lambda r: r["mean_time"], reverse=True)
+        return rows[:top or self.top]
+
+    def _findings_for(self, fp, query):
+        from .analyzer import run_explain, analyze_explain_df
+        from .optimizer import suggest_indexes
+
+        if fp in self.findings:
+            return self.findings[fp]
+        # EXPLAIN is bookkeeping too: skip it while over budget and retry next report
+        if self.overhead > self.overhead_budget * self.query_time:
+            return None
+
+        t0 = time.perf_counter()
+        # run_explain goes through the wrapped pandas functions; don't count it as workload
+        self._internal.active = True
+        try:
+            explain_df, mode = run_explain(self.conn, query, analyze=False)
+            issues = analyze_explain_df(explain_df, mode)
+        except Exception as e:
+            issues = [f"EXPLAIN failed: {e}"]
+        finally:
+            self._internal.active = False
+        found = {"issues": issues, "suggestions": suggest_indexes(query)}
+        self.findings[fp] = found
+        self.overhead += time.perf_counter() - t0
+        return found
+
+    def report(self, top=None):
+        """Print the slowest query shapes seen so far, with analyzer findings."""
+        rows = self.slowest(top)
+        overhead_pct = self.overhead / self.query_time * 100 if self.query_time else 0.0
+        print("=" * 60)
+        print(f"🔎 READ_SQL MONITOR: {self.calls:,} calls, {len(self.shapes):,} shapes, "
+              f"sample rate {self.sample_rate:.0%}, overhead {overhead_pct:.2f}%")
+        print("=" * 60)
+        for i, row in enumerate(rows, 1):
+            print(f"{i}. {row['mean_time']:.3f}s avg / {row['max_time']:.3f}s max over "
+                  f"{row['calls']:,} sampled calls")
+            print(f"   {' '.join(row['query'].split())[:120]}")
+            found = self._findings_for(row["fingerprint"], row["query"]) if self.explain else None
+            if found:
+                for issue in found["issues"]:
+                    print(f"   ⚠️ {issue}")
+                for suggestion in found["suggestions"][:3]:
+                    print(f"   💡 {suggestion}")
+        return rows
+
+
+_active_monitor = None
+
+
+def enable_monitor(conn, **kwargs):
+    """Start intercepting pandas.read_sql/read_sql_query calls made on conn."""
+    global _active_monitor
+    disable_monitor()
+    _active_monitor = ReadSqlMonitor(conn, **kwargs).install()
+    return _active_monitor
+
+
+def disable_monitor():
+    """Stop the active monitor (if any) and restore pandas; returns it for a final report."""
+    global _active_monitor
+    monitor, _active_monitor = _active_monitor, None
+    if monitor is not None:
+        monitor.uninstall()
+    return monitor
+
+
+def register_magic(ipython=None):
     """Register the Jupyter cell magic."""
+    if ipython is None:
+        from IPython import get_ipython
+        ipython = get_ipython()
+    if ipython is None:
+        raise RuntimeError("register_magic() needs a running IPython shell")
 
-    @register_cell_magic
     def mariadb_opt(line, cell):
         """
         MariaDB Auto-Optimizer Cell Magic
 
         Usage:
-        %%mariadb_opt conn=conn auto_apply=False
+        %%mariadb_opt conn=conn auto_apply=False background=True result=_opt
         SELECT * FROM table WHERE condition;
+
+        By default the pipeline runs in the background with a live progress
+        panel and a Cancel button; background=False blocks the cell as before.
+        The result dict is stored in the variable named by result= when done.
         """
+        from IPython.display import display, Image
+
         try:
             # Parse arguments
             args = {}
@@ -36,61 +403,42 @@ def register_magic():
                 return
 
             # Get auto_apply flag
-            auto_apply = args.get('auto_apply', 'false').lower() in ('true', '1', 'yes', 'y')
+            auto_apply = _is_true(args.get('auto_apply', 'false'))
+            background = _is_true(args.get('background', 'true'))
+            result_var = args.get('result', '_mariadb_opt_result')
+
+            if background:
+                try:
+                    import ipywidgets  # noqa: F401
+                except ImportError:
+                    print("⚠️ ipywidgets is not installed - running in the foreground")
+                    background = False
+
+            if background:
+                def store(panel):
+                    if panel.result is not None:
+                        ipython.user_ns[result_var] = panel.result
+
+                OptimizationPanel(conn, cell.strip(), auto_apply=auto_apply, on_done=store).start()
+                return
 
             # Import here to avoid circular imports
             from mariadb_autoopt.core import optimize_once
 
             # Run optimization
             result = optimize_once(conn, cell.strip(), auto_apply=auto_apply)
+            ipython.user_ns[result_var] = result
 
             # Display results
-            print("=" * 60)
-            print("📊 MARIA DB AUTO-OPTIMIZER RESULTS")
-            print("=" * 60)
-
-            print(f"\n⏱️  BASELINE PERFORMANCE")
-            print(f"   Rows returned: {result['before_rows']:,}")
-            print(f"   Execution time: {result['before_time']:.3f} seconds")
-
-            if result['explain_mode']:
-                print(f"\n🔍 EXPLAIN ANALYSIS ({result['explain_mode']})")
-                if result['explain_df'] is not None:
-                    display(result['explain_df'])
-
-            print(f"\n📝 ANALYSIS SUMMARY")
-            print(result['explanation'])
-
-            if result['applied_indexes']:
-                print(f"\n🔧 APPLIED CHANGES")
-                for idx in result['applied_indexes']:
-                    print(f"   • {idx}")
+            head, tail = format_result(result)
+            print(head, end="")
+            if result['explain_mode'] and result['explain_df'] is not None:
+                display(result['explain_df'])
+            print(tail, end="")
 
             if result['after_time'] is not None:
-                print(f"\n🚀 OPTIMIZATION RESULTS")
-                print(f"   Rows returned: {result['after_rows']:,}")
-                print(f"   Execution time: {result['after_time']:.3f} seconds")
-
-                improvement = ((result['before_time'] - result['after_time']) / result['before_time']) * 100
-                print(f"   Performance improvement: {improvement:.1f}%")
-
                 # Create visualization
-                plt.figure(figsize=(8, 4))
-                times = [result['before_time'], result['after_time']]
-                labels = ['Before', 'After']
-                colors = ['#ff6b6b', '#51cf66']
-
-                bars = plt.bar(labels, times, color=colors, alpha=0.8)
-                plt.ylabel('Execution Time (seconds)')
-                plt.title('Query Performance: Before vs After Optimization')
-
-                # Add value labels on bars
-                for bar, time_val in zip(bars, times):
-                    plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.01,
-                             f'{time_val:.3f}s', ha='center', va='bottom')
-
-                plt.tight_layout()
-                plt.show()
+                display(Image(data=comparison_chart_png(result)))
 
         except Exception as e:
             print(f"❌ Error: {str(e)}")
@@ -99,6 +447,53 @@ def register_magic():
             print("   - The query is valid SQL")
             print("   - You have necessary permissions")
 
+    def mariadb_monitor(line):
+        """
+        Capture slow pandas.read_sql calls without changing notebook code.
+
+        Usage:
+        %mariadb_monitor on conn=conn overhead_budget=0.01 report_every=100
+        %mariadb_monitor report
+        %mariadb_monitor off
+        """
+        tokens = shlex.split(line)
+        action = tokens[0] if tokens and '=' not in tokens[0] else 'report'
+        args = dict(token.split('=', 1) for token in tokens if '=' in token)
+
+        if action == 'on':
+            conn_var = args.get('conn', 'conn')
+            conn = ipython.user_ns.get(conn_var)
+            if conn is None:
+                print(f"❌ Error: Connection variable '{conn_var}' not found in namespace")
+                return
+            monitor = enable_monitor(
+                conn,
+                overhead_budget=float(args.get('overhead_budget', 0.01)),
+                sample_rate=float(args.get('sample_rate', 1.0)),
+                report_every=int(args.get('report_every', 100)),
+                top=int(args.get('top', 5)),
+                explain=_is_true(args.get('explain', 'true')),
+            )
+            print(f"🔎 Monitoring pandas.read_sql on '{conn_var}' "
+                  f"(overhead budget {monitor.overhead_budget:.1%})")
+        elif action == 'off':
+            monitor = disable_monitor()
+            if monitor is not None:
+                monitor.report()
+            print("🔎 Monitoring stopped")
+        elif _active_monitor is not None:
+            _active_monitor.report()
+        else:
+            print("🔎 No monitor running - start one with %mariadb_monitor on conn=conn")
+
+    ipython.register_magic_function(mariadb_opt, magic_kind='cell', magic_name='mariadb_opt')
+    ipython.register_magic_function(mariadb_monitor, magic_kind='line', magic_name='mariadb_monitor')
+
+
+def load_ipython_extension(ipython):
+    """Support `%load_ext mariadb_autoopt.magic`."""
+    register_magic(ipython)
+
 
 # Alternative function-based approach
 def optimize_and_show(conn, query, auto_apply=False):
@@ -115,4 +510,4 @@ def optimize_and_show(conn, query, auto_apply=False):
         print(f"Improvement: {improvement:.1f}%")
 
     print(f"\n{result['explanation']}")
-    return result
\ No newline at end of file
+    return result
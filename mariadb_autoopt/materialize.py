@@ -0,0 +1,235 @@
+"""
+Typed materialization of query results.
+
+pd.read_sql_query builds a DataFrame from the driver's row tuples, so every
+value of the result exists as a Python object at once, and string columns
+stay object arrays holding one str per row. materialize() reads the cursor
+in batches and decodes each batch straight into typed columns chosen from
+cursor.description:
+
+    TINYINT ... BIGINT, YEAR        int64 (nullable Int64 when NULLs occur)
+    FLOAT, DOUBLE, DECIMAL          float64 (DECIMAL coerced like read_sql_query does)
+    DATETIME, TIMESTAMP, DATE       datetime64
+    TIME                            timedelta64
+    CHAR, VARCHAR, TEXT, ENUM, ...  categorical when at most `dictionary` of the
+                                    rows are distinct, str otherwise
+
+so only one batch of Python objects is alive at a time. engine="arrow"
+(pyarrow required) builds Arrow arrays instead and returns Arrow-backed
+columns. Values a column type can't hold (zero dates, BIGINT UNSIGNED
+overflowing int64) turn that column into plain objects.
+
+    df = read_typed(conn, "SELECT * FROM airports")
+"""
+
+ENGINES = ("auto", "numpy", "arrow")
+
+# MySQL protocol field type codes (pymysql.constants.FIELD_TYPE, mysql.connector.FieldType)
+_FIELD_KINDS = {
+    0: "decimal", 246: "decimal",
+    1: "int", 2: "int", 3: "int", 8: "int", 9: "int", 13: "int",
+    4: "float", 5: "float",
+    7: "datetime", 12: "datetime",
+    10: "date", 14: "date",
+    11: "time",
+    15: "string", 245: "string", 247: "string", 248: "string", 249: "string", 250: "string", 251: "string",
+    252: "string", 253: "string", 254: "string",
+}
+_NUMPY_DTYPES = {"int": "int64", "float": "float64", "decimal": "float64", "datetime": "datetime64[us]",
+                 "date": "datetime64[s]", "time": "timedelta64[us]"}
+
+
+def column_kinds(description):
+    """[(name, kind, nullable)] for a DB-API cursor.description; kind is "object" for unknown types."""
+    return [(d[0], _FIELD_KINDS.get(d[1], "object"), d[6] is not False) for d in description]
+
+
+def _objects(values):
+    import numpy as np
+
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _arrow_type(kind):
+    import pyarrow as pa
+
+    return {"int": pa.int64(), "float": pa.float64(), "decimal": pa.float64(), "datetime": pa.timestamp("us"),
+            "date": pa.date32(), "time": pa.duration("us"), "string": pa.string()}[kind]
+
+
+def _arrow_dtype(arrow_type):
+    """to_pandas() types_mapper: str for strings, categorical for dictionaries, ArrowDtype otherwise."""
+    import pandas as pd
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    if pa.types.is_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return pd.ArrowDtype(arrow_type)
+
+
+class _Column:
+    """Accumulates the batches of one result column as typed chunks."""
+
+    def __init__(self, kind, nullable, engine, dictionary):
+        self.kind = kind
+        self.nullable = nullable
+        self.engine = engine
+        self.dictionary = dictionary
+        self.rows = 0
+        self.chunks = []
+        # Incremental dictionary encoding (numpy engine): value -> code, in order of appearance
+        self.lookup = {} if kind == "string" and dictionary and engine == "numpy" else None
+
+    def add(self, values):
+        self.rows += len(values)
+        if self.lookup is not None:
+            self.chunks.append(self._encode(values))
+            if len(self.lookup) > self.dictionary * self.rows:
+                self._to_objects()
+            return
+        if self.kind != "object":
+            try:
+                self.chunks.append(self._convert(values))
+                return
+            except (TypeError, ValueError, OverflowError):
+                self._to_objects()
+        self.chunks.append(_objects(values))
+
+    def _convert(self, values):
+        import numpy as np
+
+        if self.engine == "arrow":
+            import pyarrow as pa
+
+            if self.kind == "decimal":
+                values = [None if v is None else float(v) for v in values]
+            return pa.array(values, type=_arrow_type(self.kind))
+        if self.kind == "string":
+            return _objects(values)
+        if self.kind == "int":
+            if self.nullable and None in values:
+                mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+                return np.array([0 if v is None else v for v in values], dtype=np.int64), mask
+            return np.array(values, dtype=np.int64), None
+        return np.array(values, dtype=_NUMPY_DTYPES[self.kind])
+
+    def _encode(self, values):
+        """Dictionary codes of a batch of strings (-1 for NULL), extending the lookup."""
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(_objects(values))
+        lookup = self.lookup
+        # Batch codes -> column codes, with -1 (NULL) mapped by the appended entry
+        mapping = np.array([lookup.setdefault(u, len(lookup)) for u in uniques] + [-1], dtype=np.int32)
+        return mapping[codes]
+
+    def _to_objects(self):
+        """Turn the chunks so far into object arrays; later batches are kept as objects too."""
+        import numpy as np
+
+        converted = []
+        for chunk in self.chunks:
+            if self.engine == "arrow":
+                chunk = _objects(chunk.to_pylist())
+            elif self.kind == "int":
+                data, mask = chunk
+                chunk = data.astype(object)
+                if mask is not None:
+                    chunk[mask] = None
+            elif self.lookup is not None:
+                categories = _objects(list(self.lookup) + [None])
+                chunk = categories[chunk]
+            else:
+                chunk = np.asarray(chunk).astype(object)
+            converted.append(chunk)
+        self.chunks = converted
+        self.kind = "object"
+        self.lookup = None
+
+    def finish(self):
+        """The column as an array for the DataFrame constructor."""
+        import numpy as np
+        import pandas as pd
+
+        if self.engine == "arrow" and self.kind != "object":
+            import pyarrow as pa
+            import pyarrow.compute as pc
+
+            chunked = pa.chunked_array(self.chunks, type=_arrow_type(self.kind))
+            if self.kind == "string" and self.dictionary and self.rows and \
+                    pc.count_distinct(chunked).as_py() <= self.dictionary * self.rows:
+                chunked = chunked.dictionary_encode()
+            return pa.table([chunked], names=["column"]).to_pandas(types_mapper=_arrow_dtype)["column"].array
+        if not self.chunks:
+            return np.empty(0, dtype=_NUMPY_DTYPES.get(self.kind, object))
+        if self.kind == "int":
+            data = np.concatenate([d for d, _ in self.chunks])
+            if all(m is None for _, m in self.chunks):
+                return data
+            mask = np.concatenate([np.zeros(len(d), dtype=bool) if m is None else m for d, m in self.chunks])
+            return pd.arrays.IntegerArray(data, mask)
+        if self.lookup is not None:
+            return pd.Categorical.from_codes(np.concatenate(self.chunks), categories=list(self.lookup))
+        return np.concatenate(self.chunks)
+
+
+def resolve_engine(engine="auto"):
+    """"arrow" when pyarrow is installed (for "auto"), else "numpy"."""
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}")
+    if engine != "auto":
+        return engine
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "numpy"
+    return "arrow"
+
+
+def materialize(cursor, engine="auto", dictionary=0.5, batch_size=10_000):
+    """DataFrame of the rows left on an executed cursor, decoded batch by batch into typed columns.
+
+    dictionary is the largest distinct/rows ratio of a string column that is
+    still dictionary encoded (a categorical); None or 0 keeps every string
+    column as str.
+    """
+    import pandas as pd
+
+    engine = resolve_engine(engine)
+    kinds = column_kinds(cursor.description)
+    columns = [_Column(kind, nullable, engine, dictionary) for _, kind, nullable in kinds]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for column, values in zip(columns, zip(*rows)):
+            column.add(values)
+        del rows
+
+    # Positional keys keep duplicate column names apart
+    df = pd.DataFrame({i: column.finish() for i, column in enumerate(columns)}, copy=False)
+    df.columns = [name for name, _, _ in kinds]
+    return df.infer_objects()
+
+
+def _streaming_cursor(conn):
+    """An unbuffered cursor where the driver needs asking for one (pymysql's SSCursor)."""
+    try:
+        from pymysql.connections import Connection
+        from pymysql.cursors import SSCursor
+    except ImportError:
+        return conn.cursor()
+    return conn.cursor(SSCursor) if isinstance(conn, Connection) else conn.cursor()
+
+
+def read_typed(conn, query, params=None, engine="auto", dictionary=0.5, batch_size=10_000):
+    """Run query and materialize() its result, streaming rows from the server where the driver can."""
+    cursor = _streaming_cursor(conn)
+    try:
+        cursor.execute(query, params or None)
+        return materialize(cursor, engine, dictionary, batch_size)
+    finally:
+        cursor.close()
@@ -1,5 +1,9 @@
+import hashlib
 import re
 
+from .analyzer import (build_select, nonsargable_columns, parse_query_shape, referenced_columns, split_clauses,
+                       split_top_level_and)
+
 
 def suggest_indexes(query):
     """Produce simple index suggestions by looking for WHERE/ON/ORDER BY columns."""
@@ -46,21 +50,42 @@ def suggest_indexes(query):
         group_cols = re.findall(r'([\w`".]+)(?:\s*,|$)', group_clause)
         group_columns.update([col.strip(' `"') for col in group_cols])
 
+    # ORDER BY / GROUP BY shapes suggest_order_indexes classifies get its candidates instead of one index
+    # per column (which would also index output aliases such as ORDER BY total_routes)
+    order_candidates = suggest_order_indexes(query)
+    if order_candidates:
+        order_columns, group_columns = set(), set()
+
     # Generate suggestions
     all_columns = where_columns | join_columns | order_columns | group_columns
+    # An index can't serve a column the WHERE clause only uses inside a function, LIKE '%...' etc.
+    unusable = {column for _, column in nonsargable_columns(query)}
+    all_columns = {col for col in all_columns if col.split('.')[-1] not in unusable}
+
+    # Qualifiers are aliases as often as table names; index the table they stand for
+    shape = parse_query_shape(query)
+    select_aliases = {item["alias"].lower() for item in shape["select"] if item["alias"]}
+    default_table = shape["tables"].get(tables[0]) if tables else None
+
+    def resolve(col):
+        """(table, column) for a referenced column, or None when it isn't a column of a known table."""
+        qualifier, _, colname = col.rpartition('.')
+        table = shape["tables"].get(qualifier) if qualifier else default_table
+        if not table or (not qualifier and colname in select_aliases):
+            return None
+        return table, colname
 
     for col in all_columns:
-        if '.' in col:
-            table, colname = col.split('.', 1)
-        else:
-            table = tables[0] if tables else '<table>'
-            colname = col
+        resolved = resolve(col)
+        if resolved is None:
+            continue
+        table, colname = resolved
 
         # Skip if it's clearly not a column (e.g., number, function)
         if colname.isdigit() or '(' in colname or colname in ['null', 'true', 'false']:
             continue
 
-        suggestion = f"CREATE INDEX idx_{table}_{colname.replace('.', '_')} ON {table} ({colname});"
+        suggestion = f"CREATE INDEX idx_{table}_{colname} ON {table} ({colname});"
         suggestions.append(suggestion)
 
     # Suggest composite indexes for WHERE + ORDER BY
@@ -68,14 +93,378 @@ def suggest_indexes(query):
         where_cols_list = list(where_columns)[:2]  # Take up to 2 columns
         order_cols_list = list(order_columns)[:1]  # Take first ORDER BY column
 
-        composite_cols = where_cols_list + order_cols_list
-        if len(composite_cols) > 1:
-            table = tables[0] if tables else '<table>'
-            cols_str = ', '.join(composite_cols)
+        composite = [resolve(col) for col in where_cols_list + order_cols_list]
+        composite_tables = {c[0] for c in composite if c}
+        # Only when every column resolves to the same table
+        if len(composite) > 1 and None not in composite and len(composite_tables) == 1:
+            table = composite_tables.pop()
+            cols_str = ', '.join(c for _, c in composite)
             suggestion = f"CREATE INDEX idx_{table}_composite ON {table} ({cols_str});"
             suggestions.append(suggestion)
 
-    return suggestions[:5]  # Limit to 5 suggestions
+    # Covering and ordering indexes first: they also save the row lookup, the sort or the temporary table
+    preferred = [c["statement"] for c in suggest_covering_indexes(query)]
+    preferred += [c["statement"] for c in order_candidates if c["statement"]]
+    # One statement per index: same columns under another name, or a leading prefix of a wider one
+    _, mapping = merge_index_suggestions(preferred + suggestions)
+    merged = []
+    for s in preferred + suggestions:
+        s = mapping[s] or s
+        if s not in merged:
+            merged.append(s)
+
+    return merged[:5]  # Limit to 5 suggestions
+
+
+# InnoDB's key length limit with the DYNAMIC row format
+MAX_KEY_BYTES = 3072
+_UNINDEXABLE_TYPES = {'tinytext', 'text', 'mediumtext', 'longtext', 'tinyblob', 'blob', 'mediumblob', 'longblob',
+                      'json', 'geometry'}
+_FIXED_BYTES = {'tinyint': 1, 'smallint': 2, 'mediumint': 3, 'int': 4, 'integer': 4, 'bigint': 8, 'float': 4,
+                'double': 8, 'date': 3, 'time': 3, 'year': 1, 'datetime': 5, 'timestamp': 4, 'enum': 2, 'bit': 8}
+
+
+def column_key_bytes(column_type):
+    """Rough bytes a column takes in an index key, from its COLUMN_TYPE (utf8mb4 for strings)."""
+    m = re.match(r'\s*(\w+)(?:\((\d+)(?:\s*,\s*(\d+))?\))?', column_type.lower())
+    base, length = m.group(1), int(m.group(2) or 0)
+    if base in ('char', 'varchar'):
+        return length * 4 + 2
+    if base in ('binary', 'varbinary'):
+        return length + 2
+    if base in ('decimal', 'numeric'):
+        return (length or 10) // 2 + 1
+    return _FIXED_BYTES.get(base, 8)
+
+
+def index_name(table, columns, kind="cov"):
+    """idx_<table>_<kind>_<columns>, shortened with a hash to MariaDB's 64-character limit."""
+    name = f"idx_{table}_{kind}_{'_'.join(columns)}"
+    if len(name) > 64:
+        name = f"{name[:55]}_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+    return name
+
+
+def suggest_covering_indexes(query, max_columns=5, column_types=None, max_key_bytes=MAX_KEY_BYTES):
+    """Covering index candidates: indexes holding every column the query reads from a table.
+
+    Key order is equality filters and join columns, then GROUP BY / ORDER BY
+    columns, then range filters, then the remaining projected and aggregated
+    columns. A table gets no candidate when it is read with *, when an
+    unqualified column can't be attributed, or when the index would exceed
+    max_columns or (with column_types from analyzer.fetch_column_types)
+    max_key_bytes or include TEXT/BLOB columns. Returns [{"table", "columns",
+    "index", "statement"}].
+    """
+    refs = referenced_columns(query, column_types)
+    if refs["unresolved"]:
+        return []
+    shape = parse_query_shape(query)
+    types = column_types or {}
+
+    def ordered(table):
+        equality = [c for t, c, op in shape["predicates"] if t == table and op in ("=", "<=>", "IS")]
+        joins = [c for edge in shape["join_edges"] for t, c in edge if t == table]
+        sort = [c for t, c, *_ in shape["group_by"] + shape["order_by"] if t == table]
+        ranges = [c for t, c, op in shape["predicates"] if t == table and op not in ("=", "<=>", "IS")]
+        rest = sorted(refs["columns"][table])
+        return list(dict.fromkeys(equality + joins + sort + ranges + rest))
+
+    candidates = []
+    for table, needed in refs["columns"].items():
+        if table in refs["star"] or len(needed) < 2:
+            continue
+        columns = [c for c in ordered(table) if c in needed]
+        if len(columns) > max_columns:
+            continue
+        if types:
+            column_types_ = [types.get((table, c), (None, None)) for c in columns]
+            if any(data_type in _UNINDEXABLE_TYPES for data_type, _ in column_types_):
+                continue
+            if sum(column_key_bytes(ct) for _, ct in column_types_ if ct) > max_key_bytes:
+                continue
+        name = index_name(table, columns)
+        candidates.append({
+            "table": table,
+            "columns": columns,
+            "index": name,
+            "statement": f"CREATE INDEX {name} ON {table} ({', '.join(columns)});",
+        })
+    return candidates
+
+
+def _index_columns(columns):
+    """Render [(column, 'ASC'|'DESC')] for CREATE INDEX, flipped so the first column is ascending.
+
+    An index can be read backwards, so (a DESC, b ASC) serves the same orders as
+    (a ASC, b DESC); only columns against the first one's direction need DESC.
+    """
+    first = columns[0][1]
+    return ", ".join(f"{c} DESC" if d != first else c for c, d in columns)
+
+
+def suggest_order_indexes(query):
+    """Indexes that let ORDER BY ... LIMIT stop early and GROUP BY skip its temporary table.
+
+    Recognized shapes:
+      group_min_max  single-table GROUP BY with only MIN()/MAX() of one column:
+                     (group columns, equality columns, min/max column) allows a
+                     loose index scan ("Using index for group-by")
+      group_by       other GROUP BY on one table: (equality columns, group columns)
+      top_n          ORDER BY columns of one table with a LIMIT: (equality
+                     columns, order columns) with their directions, DESC where
+                     the directions are mixed (MariaDB 10.8+)
+      aggregate_order  ORDER BY an aggregate or output alias: no index avoids
+                     that sort, so statement is None and note says why
+    Returns [{"shape", "table", "columns": [(column, direction)], "index",
+    "statement", "expect", "note"}]; expect holds the plan_sort_flags values
+    the plan should show once the index exists.
+    """
+    shape = parse_query_shape(query)
+    tables = {t for t in shape["tables"].values()}
+    single_table = len(tables) == 1 and None not in tables
+    equality = {}
+    for t, c, op in shape["predicates"]:
+        if op in ("=", "<=>", "IS"):
+            equality.setdefault(t, []).append(c)
+
+    def candidate(kind, table, columns, expect, note=None):
+        columns = list(dict((c, d) for c, d in columns).items())
+        name = index_name(table, [c for c, _ in columns], kind={"group_min_max": "gmm", "group_by": "grp",
+                                                                 "top_n": "ord"}[kind])
+        return {"shape": kind, "table": table, "columns": columns, "index": name,
+                "statement": f"CREATE INDEX {name} ON {table} ({_index_columns(columns)});",
+                "expect": expect, "note": note}
+
+    candidates = []
+    group_tables = {t for t, _ in shape["group_by"]}
+    if shape["group_by"] and len(group_tables) == 1 and None not in group_tables:
+        table = group_tables.pop()
+        group_cols = [c for _, c in shape["group_by"]]
+        aggregates = [item for item in shape["select"] if item["aggregate"]]
+        min_max = {(item["argument"] or "").split(".")[-1].strip("`").lower() for item in aggregates}
+        ordered_like_group = [(t, c) for t, c, _ in shape["order_by"]] in ([], list(shape["group_by"]))
+        if (single_table and aggregates and len(min_max) == 1
+                and all(item["aggregate"] in ("MIN", "MAX") and not item["distinct"]
+                        and re.fullmatch(r'(?:`?\w+`?\.)?`?\w+`?', item["argument"] or "") for item in aggregates)):
+            columns = [(c, "ASC") for c in group_cols + equality.get(table, []) + sorted(min_max)]
+            candidates.append(candidate("group_min_max", table, columns,
+                                        {"temporary": False, "loose_scan": True,
+                                         **({"filesort": False} if ordered_like_group else {})}))
+        else:
+            columns = [(c, "ASC") for c in equality.get(table, []) + group_cols]
+            candidates.append(candidate("group_by", table, columns,
+                                        {"temporary": False, **({"filesort": False} if ordered_like_group else {})},
+                                        None if single_table else f"Only helps when {table} is read first."))
+        if ordered_like_group:
+            return candidates
+
+    if not shape["order_by"] or shape["limit"] is None:
+        return candidates
+    order_tables = {t for t, _, _ in shape["order_by"]}
+    if None in order_tables or shape["group_by"] or any(item["aggregate"] for item in shape["select"]):
+        candidates.append({"shape": "aggregate_order", "table": None, "columns": [], "index": None,
+                           "statement": None, "expect": {},
+                           "note": "ORDER BY sorts aggregated rows or output aliases; no index can avoid "
+                                   "that sort, but LIMIT keeps it to a top-N priority queue."})
+        return candidates
+    if len(order_tables) == 1:
+        table = order_tables.pop()
+        order_cols = [c for _, c, _ in shape["order_by"]]
+        # Constant prefix columns don't affect the order; match the first sort direction
+        first = shape["order_by"][0][2]
+        columns = [(c, first) for c in equality.get(table, []) if c not in order_cols]
+        columns += [(c, d) for _, c, d in shape["order_by"]]
+        candidates.append(candidate("top_n", table, columns, {"filesort": False, "temporary": False},
+                                    None if single_table else f"Only helps when {table} is read first."))
+    return candidates
+
+
+def parse_index_statement(statement):
+    """Split a CREATE INDEX statement into (index_name, table, [columns]); None if it isn't one."""
+    m = re.match(r'\s*create\s+(?:unique\s+)?index\s+`?(\w+)`?\s+on\s+`?(\w+)`?\s*\((.+)\)\s*;?\s*$',
+                 statement, re.IGNORECASE | re.DOTALL)
+    if not m:
+        return None
+    columns = [c.strip(' `"').lower() for c in m.group(3).split(',') if c.strip()]
+    return m.group(1), m.group(2).lower(), columns
+
+
+def merge_index_suggestions(suggestions):
+    """Merge CREATE INDEX suggestions from several queries into one set to apply.
+
+    Duplicates are dropped, and an index whose columns are a leading prefix of
+    another suggested index on the same table is folded into the wider one.
+    Returns (statements, mapping) where mapping takes every input statement to
+    the statement that replaces it (None for anything that isn't CREATE INDEX).
+    """
+    parsed = {}
+    for s in suggestions:
+        p = parse_index_statement(s)
+        if p:
+            parsed[s] = (p[1], tuple(p[2]))
+
+    # Widest first, so prefixes find their covering index already kept
+    keys = sorted(set(parsed.values()), key=lambda k: (k[0], -len(k[1]), k[1]))
+    kept = []
+    covered_by = {}
+    for table, cols in keys:
+        for k_table, k_cols in kept:
+            if k_table == table and k_cols[:len(cols)] == cols:
+                covered_by[(table, cols)] = (k_table, k_cols)
+                break
+        else:
+            kept.append((table, cols))
+            covered_by[(table, cols)] = (table, cols)
+
+    statement_for = {}
+    for s, key in parsed.items():
+        statement_for.setdefault(key, s)
+
+    mapping = {s: None for s in suggestions}
+    for s, key in parsed.items():
+        mapping[s] = statement_for[covered_by[key]]
+    statements = [statement_for[k] for k in kept]
+    return statements, mapping
+
+
+def suggest_histograms(misestimates, aliases=None):
+    """ANALYZE TABLE ... PERSISTENT FOR COLUMNS statements for misestimated plan nodes.
+
+    misestimates come from analyzer.find_misestimates; aliases maps the names
+    used in the plan to real tables (parse_query_shape(query)["tables"]).
+    """
+    aliases = aliases or {}
+    columns_by_table = {}
+    for node in misestimates:
+        table = aliases.get(node["table"].lower()) or node["table"]
+        columns = columns_by_table.setdefault(table, [])
+        columns.extend(c for c in node["columns"] if c not in columns)
+
+    statements = []
+    for table, columns in columns_by_table.items():
+        # Without known columns, refresh the index statistics instead
+        cols = ", ".join(f"`{c}`" for c in columns)
+        indexes = "()" if columns else "ALL"
+        statements.append(f"ANALYZE TABLE `{table}` PERSISTENT FOR COLUMNS ({cols}) INDEXES {indexes};")
+    return statements
+
+
+_RANGE_OPS = {"=", "<", "<=", ">", ">=", "BETWEEN"}
+# Return type of the virtual column for functions that don't keep the column's own type
+_FUNCTION_TYPES = {"YEAR": "SMALLINT", "MONTH": "TINYINT", "DAY": "TINYINT", "DAYOFWEEK": "TINYINT",
+                   "DATE": "DATE", "LENGTH": "INT", "CHAR_LENGTH": "INT"}
+
+
+def _date_range(function, op, value):
+    """Rewrite YEAR(col)/DATE(col) compared to a constant as a range on col: [(op, bound)] or None."""
+    if function == "YEAR":
+        years = re.findall(r"^'?(\d{4})'?$", value.strip()) if op != "BETWEEN" else \
+            re.findall(r"^'?(\d{4})'?\s+and\s+'?(\d{4})'?$", value.strip(), re.IGNORECASE)
+        if not years:
+            return None
+        lo, hi = (years[0], years[0]) if op != "BETWEEN" else years[0]
+        start, end = f"'{lo}-01-01'", f"'{int(hi) + 1}-01-01'"
+    elif function == "DATE":
+        dates = re.findall(r"^('\d{4}-\d{2}-\d{2}')$", value.strip()) if op != "BETWEEN" else \
+            re.findall(r"^('\d{4}-\d{2}-\d{2}')\s+and\s+('\d{4}-\d{2}-\d{2}')$", value.strip(), re.IGNORECASE)
+        if not dates:
+            return None
+        lo, hi = (dates[0], dates[0]) if op != "BETWEEN" else dates[0]
+        start, end = lo, f"{hi} + INTERVAL 1 DAY"
+    else:
+        return None
+    return {
+        "=": [(">=", start), ("<", end)],
+        "BETWEEN": [(">=", start), ("<", end)],
+        ">": [(">=", end)],
+        ">=": [(">=", start)],
+        "<": [("<", start)],
+        "<=": [("<", end)],
+    }[op]
+
+
+def sargable_fix(pred, column_types=None):
+    """Fix for one predicate from analyzer.find_nonsargable_predicates.
+
+    Returns {"predicate", "kind", "rewrite", "statements", "index",
+    "virtual_column", "note"}. rewrite is the sargable predicate to use instead
+    (None when there isn't one); statements are the DDL it needs. YEAR/DATE
+    comparisons become date ranges, LEFT(col, n) = 'x' a prefix LIKE, col + k
+    a comparison against a constant, and a string column compared to a number
+    a string comparison. Anything else gets an indexed PERSISTENT virtual
+    column on the expression (on REVERSE(col) for a leading wildcard).
+    """
+    table, column, alias = pred["table"], pred["column"], pred["alias"]
+    col = f"{alias}.{column}" if alias else column
+    function, op, value = pred["function"], pred["op"], pred["value"]
+    fix = {"predicate": pred["predicate"], "kind": pred["kind"], "rewrite": None, "statements": [],
+           "index": None, "virtual_column": None, "note": None}
+
+    def index_on(name):
+        fix["index"] = f"idx_{table}_{name}"
+        return f"CREATE INDEX {fix['index']} ON {table} ({name});"
+
+    def virtual(name, expression, sql_type):
+        fix["virtual_column"] = name
+        fix["index"] = f"idx_{table}_{name}"
+        fix["statements"].append(
+            f"ALTER TABLE {table} ADD COLUMN {name} {sql_type} AS ({expression}) PERSISTENT, "
+            f"ADD INDEX {fix['index']} ({name});"
+        )
+        return f"{alias}.{name}" if alias else name
+
+    if pred["kind"] == "function" and function in ("YEAR", "DATE") and op in _RANGE_OPS:
+        bounds = _date_range(function, op, value)
+        if bounds:
+            fix["rewrite"] = " AND ".join(f"{col} {o} {b}" for o, b in bounds)
+            fix["statements"].append(index_on(column))
+            return fix
+    if pred["kind"] == "function" and op == "=" and re.fullmatch(r"'[^'%_\\]*'", value.strip()):
+        length = re.fullmatch(r",\s*(\d+)", pred["args"]) if function == "LEFT" else \
+            re.fullmatch(r",\s*1\s*,\s*(\d+)", pred["args"]) if function in ("SUBSTRING", "SUBSTR") else None
+        if length and int(length.group(1)) == len(value.strip()) - 2:
+            fix["rewrite"] = f"{col} LIKE '{value.strip()[1:-1]}%'"
+            fix["statements"].append(index_on(column))
+            return fix
+    if pred["kind"] == "arithmetic" and pred["function"] in "+-" and op != "<=>":
+        inverse = "-" if pred["function"] == "+" else "+"
+        fix["rewrite"] = f"{col} {op} ({value} {inverse} {pred['args']})"
+        fix["statements"].append(index_on(column))
+        return fix
+    if pred["kind"] == "implicit_cast":
+        fix["rewrite"] = f"{col} {op} '{value}'"
+        fix["statements"].append(index_on(column))
+        fix["note"] = ("Compared as a string now: values with leading zeros or spaces "
+                       "that used to equal the number no longer match.")
+        return fix
+    if pred["kind"] == "leading_wildcard":
+        # col LIKE p  <=>  REVERSE(col) LIKE REVERSE(p), a prefix search unless p also ends in a wildcard
+        reversed_pattern = value.strip()[1:-1][::-1]
+        if reversed_pattern[:1] in ("%", "_") or "\\" in reversed_pattern:
+            fix["note"] = "Wildcards at both ends: only a FULLTEXT index (MATCH ... AGAINST) can help."
+            return fix
+        sql_type = (column_types or {}).get((table, column), (None, "VARCHAR(255)"))[1]
+        name = virtual(f"{column}_rev", f"REVERSE({column})", sql_type)
+        fix["rewrite"] = f"{name} {op} '{reversed_pattern}'"
+        return fix
+    if pred["kind"] == "function":
+        sql_type = _FUNCTION_TYPES.get(function) or \
+            (column_types or {}).get((table, column), (None, "VARCHAR(255)"))[1]
+        args = f"{column}{', ' + pred['args'].lstrip(', ') if pred['args'] else ''}"
+        name = virtual(f"{column}_{function.lower()}", f"{function}({args})", sql_type)
+        fix["rewrite"] = f"{name} {op} {value}"
+        return fix
+    fix["note"] = "No sargable rewrite known for this predicate."
+    return fix
+
+
+def rewrite_predicates(query, replacements):
+    """Replace WHERE conjuncts of query ({old_predicate: new_predicate}) and return the new SQL."""
+    clauses = split_clauses(query)
+    conjuncts = [replacements.get(c, c) for c in split_top_level_and(clauses.get("where", ""))]
+    clauses["where"] = " AND ".join(conjuncts)
+    return build_select(clauses)
 
 
 def explanation_from_issues(issues, suggestions):
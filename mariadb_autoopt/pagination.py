@@ -0,0 +1,212 @@
+"""
+Keyset (seek method) pagination for queries that page with LIMIT ... OFFSET.
+
+OFFSET n makes the server read and throw away n rows for every page, so page
+4,000 of a 50-row listing reads 200,000 rows. Keyset pagination remembers the
+sort key of the last row shown and asks for the rows after it instead:
+
+    SELECT * FROM routes WHERE (route_id > %s) ORDER BY route_id ASC LIMIT 50
+
+With an index in key order every page costs about the same. The key is the
+ORDER BY columns plus a non-null unique index (the primary key if possible)
+to break ties, so no row is skipped or repeated between pages.
+"""
+
+from .analyzer import DEEP_OFFSET_ROWS, build_select, find_deep_offset, parse_query_shape, split_clauses
+
+
+def unique_indexes(conn, table):
+    """{index_name: [columns]} of the PRIMARY and UNIQUE indexes of table without nullable columns.
+
+    PRIMARY comes first, then the narrower indexes.
+    """
+    indexes, nullable = {}, set()
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW INDEX FROM `{table}`")
+        names = [d[0] for d in cursor.description]
+        for row in cursor.fetchall():
+            rec = dict(zip(names, row))
+            if int(rec["Non_unique"]):
+                continue
+            indexes.setdefault(rec["Key_name"], []).append(rec["Column_name"].lower())
+            if rec.get("Null") == "YES":
+                nullable.add(rec["Key_name"])
+    # A UNIQUE index allows any number of NULLs, so it can't break ties there
+    order = sorted((name for name in indexes if name not in nullable),
+                   key=lambda name: (name != "PRIMARY", len(indexes[name])))
+    return {name: indexes[name] for name in order}
+
+
+def nullable_columns(conn, table):
+    """Lower-case names of the columns of table that allow NULL."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND IS_NULLABLE = 'YES'", (table,))
+        return {name.lower() for (name,) in cursor.fetchall()}
+
+
+def keyset_key(conn, query):
+    """Choose the seek key for a single-table query.
+
+    Returns {"table", "qualifier", "columns": [(column, 'ASC'|'DESC')],
+    "unique_index", "index", "note"}. index is an existing index whose leading
+    columns are the key (secondary indexes count their implicit primary-key
+    suffix); it is None when each page would need a sort. Raises ValueError
+    for queries that can't be keyset-paginated, including ORDER BY on a
+    nullable column: a seek never reaches rows with NULL keys.
+    """
+    from .explore import table_indexes
+
+    shape = parse_query_shape(query)
+    tables = set(shape["tables"].values())
+    if len(tables) != 1 or None in tables:
+        raise ValueError("Keyset pagination needs a query on a single table")
+    if shape["group_by"] or any(item["aggregate"] for item in shape["select"]):
+        raise ValueError("Keyset pagination of grouped results isn't supported")
+    if split_clauses(query)["select"].lower().lstrip().startswith("distinct"):
+        raise ValueError("Keyset pagination of SELECT DISTINCT isn't supported")
+    if any(t is None for t, _, _ in shape["order_by"]):
+        raise ValueError("ORDER BY must name table columns, not expressions or output aliases")
+
+    table = tables.pop()
+    qualifier = next((a for a, t in shape["tables"].items() if a != table), table)
+    order = [(c, d) for _, c, d in shape["order_by"]]
+    order_cols = [c for c, _ in order]
+    nulls = nullable_columns(conn, table) if order_cols else set()
+    nullable = [c for c in order_cols if c in nulls]
+    if nullable:
+        raise ValueError(f"ORDER BY columns must be NOT NULL for keyset pagination: {', '.join(nullable)}")
+    uniques = unique_indexes(conn, table)
+    if not uniques:
+        raise ValueError(f"{table} has no unique index without NULLs to break ties")
+
+    for name, cols in uniques.items():
+        if set(cols) <= set(order_cols):
+            unique_index, key = name, order  # the ORDER BY is unique already
+            break
+    else:
+        unique_index, cols = next(iter(uniques.items()))
+        direction = order[-1][1] if order else "ASC"
+        key = order + [(c, direction) for c in cols if c not in order_cols]
+
+    key_cols = [c for c, _ in key]
+    primary = uniques.get("PRIMARY", [])
+    index = None
+    for name, cols in table_indexes(conn, table).items():
+        cols = [c.lower() for c in cols]
+        # InnoDB secondary indexes end with the primary key columns
+        full = cols if name == "PRIMARY" else cols + [c for c in primary if c not in cols]
+        if full[:len(key_cols)] == key_cols:
+            index = name
+            break
+
+    note = None
+    if index is None:
+        note = f"No index in key order; CREATE INDEX on {table} ({', '.join(key_cols)}) to make every page a seek."
+    elif len({d for _, d in key}) > 1:
+        note = "Mixed ASC/DESC key: the index needs matching DESC columns (MariaDB 10.8+) to avoid a sort."
+    return {"table": table, "qualifier": qualifier, "columns": key, "unique_index": unique_index,
+            "index": index, "note": note}
+
+
+def seek_predicate(key, qualifier=None):
+    """WHERE condition for the rows after a key value, with one %s per compared value.
+
+    Written as (a > %s) OR (a = %s AND b > %s) ..., which the range optimizer
+    handles for any direction mix, rather than as a row comparison.
+    Use seek_params(key, last_values) for the matching parameters.
+    """
+    prefix = f"{qualifier}." if qualifier else ""
+    terms = []
+    for i, (column, direction) in enumerate(key):
+        equal = [f"{prefix}{c} = %s" for c, _ in key[:i]]
+        terms.append("(" + " AND ".join(equal + [f"{prefix}{column} {'>' if direction == 'ASC' else '<'} %s"]) + ")")
+    return " OR ".join(terms)
+
+
+def seek_params(key, last_values):
+    """Parameters for seek_predicate(key) after the row whose key values are last_values."""
+    return [v for i in range(len(key)) for v in list(last_values[:i]) + [last_values[i]]]
+
+
+def keyset_rewrite(query, key, last_values=None, limit=None, qualifier=None):
+    """Rewrite query to return the page after last_values (the first page when None).
+
+    The original LIMIT/OFFSET is replaced by ORDER BY key LIMIT limit (default:
+    the original LIMIT). Returns (sql, params); when params are given, literal
+    % signs in the query are doubled for the driver's %s formatting.
+    """
+    clauses = split_clauses(query)
+    page = limit or parse_query_shape(query)["limit"]
+    clauses.pop("limit", None)
+    prefix = f"{qualifier}." if qualifier else ""
+    clauses["order by"] = ", ".join(f"{prefix}{c} {d}" for c, d in key)
+    if page:
+        clauses["limit"] = str(page)
+    if last_values is None:
+        return build_select(clauses), []
+
+    clauses = {name: text.replace("%", "%%") for name, text in clauses.items()}
+    return build_select(clauses, extra_where=[seek_predicate(key, qualifier)]), seek_params(key, last_values)
+
+
+def pagination_advice(conn, query, threshold=DEEP_OFFSET_ROWS, verbose=True):
+    """Flag deep OFFSET pagination and propose the keyset rewrite.
+
+    Returns None when the query doesn't page past threshold rows, else
+    {"offset", "limit", "key", "rewrite", "error"}; rewrite is the next-page
+    query with %s placeholders for the last row's key values.
+    """
+    deep = find_deep_offset(query, threshold)
+    if deep is None:
+        return None
+    advice = {"offset": deep["offset"], "limit": deep["limit"], "key": None, "rewrite": None, "error": None}
+    try:
+        key = keyset_key(conn, query)
+    except ValueError as e:
+        advice["error"] = str(e)
+        if verbose:
+            print(f"⚠ OFFSET {deep['offset']:,}: keyset pagination not possible ({e})")
+        return advice
+    advice["key"] = key
+    advice["rewrite"], _ = keyset_rewrite(query, key["columns"], last_values=[None] * len(key["columns"]),
+                                          qualifier=key["qualifier"])
+    if verbose:
+        columns = ", ".join(f"{c} {d}" for c, d in key["columns"])
+        print(f"⚠ OFFSET {deep['offset']:,} reads and discards {deep['offset']:,} rows per page")
+        print(f"💡 Seek on ({columns}) via {key['index'] or 'a new index'}:\n   {advice['rewrite']}")
+        if key["note"]:
+            print(f"   ℹ {key['note']}")
+    return advice
+
+
+def iter_keyset_pages(conn, query, page_size=1000, key=None):
+    """Iterate over all rows of query as DataFrames of up to page_size rows, fetched by keyset seeks.
+
+    The query's own LIMIT/OFFSET is ignored. key defaults to keyset_key(conn, query).
+    Key columns are selected under private aliases and dropped from the
+    frames, so they needn't be in the SELECT list.
+    """
+    import pandas as pd
+
+    key = key or keyset_key(conn, query)
+    columns, qualifier = key["columns"], key["qualifier"]
+    clauses = split_clauses(query)
+    clauses["select"] += ", " + ", ".join(f"{qualifier}.{c} AS _seek_{i}" for i, (c, _) in enumerate(columns))
+    clauses.pop("limit", None)
+    keyed = build_select(clauses)
+
+    n = len(columns)
+    last = None
+    while True:
+        sql, params = keyset_rewrite(keyed, columns, last, limit=page_size, qualifier=qualifier)
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params or None)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        last = list(rows[-1][-n:])
+        yield pd.DataFrame.from_records([row[:-n] for row in rows], columns=names[:-n])
+        if len(rows) < page_size:
+            return
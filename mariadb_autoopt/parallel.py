@@ -0,0 +1,213 @@
+"""
+Parallel reads of large single-table extracts.
+
+pd.read_sql_query pulls an extract over one connection, so one core decoding
+rows and one TCP stream are the bottleneck. parallel_read() splits the SELECT
+into disjoint ranges of the table's primary key:
+
+    SELECT ... FROM routes WHERE (route_id >= %s AND route_id < %s) AND (<original WHERE>)
+
+fetches them concurrently over a ConnectionPool and assembles the result
+into one DataFrame, copying each column once into a pre-allocated array.
+The ranges run in separate transactions, so rows changed during the read may
+be seen by one range and not another.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .analyzer import build_select, fetch_column_types, parse_query_shape, split_clauses
+from .pool import ConnectionPool
+
+_INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint"}
+
+
+def split_key(conn, query):
+    """{"table", "qualifier", "column", "data_type"} to split a single-table query on.
+
+    The column is the leading column of the primary key (or of another
+    unique index without NULLs), so every range is an index range scan.
+    Raises ValueError for queries whose result can't be assembled from
+    independent ranges (joins, grouping, DISTINCT, LIMIT, ORDER BY on other
+    columns).
+    """
+    from .pagination import unique_indexes
+
+    shape = parse_query_shape(query)
+    clauses = split_clauses(query)
+    tables = set(shape["tables"].values())
+    if len(tables) != 1 or None in tables:
+        raise ValueError("Parallel reads need a query on a single table")
+    if shape["group_by"] or any(item["aggregate"] for item in shape["select"]):
+        raise ValueError("Grouped or aggregated queries can't be split into ranges")
+    if clauses["select"].lower().lstrip().startswith("distinct"):
+        raise ValueError("SELECT DISTINCT can't be split into ranges")
+    if clauses.get("limit"):
+        raise ValueError("LIMIT can't be split into ranges")
+
+    table = tables.pop()
+    uniques = unique_indexes(conn, table)
+    if not uniques:
+        raise ValueError(f"{table} has no primary key or unique index without NULLs to split on")
+    column = next(iter(uniques.values()))[0]
+    if any((t, c) != (table, column) for t, c, _ in shape["order_by"]) or len(shape["order_by"]) > 1:
+        raise ValueError(f"ORDER BY other than {column} isn't supported; sort the DataFrame instead")
+    data_type = fetch_column_types(conn, [table]).get((table, column), ("", ""))[0]
+    qualifier = next((a for a, t in shape["tables"].items() if a != table), table)
+    return {"table": table, "qualifier": qualifier, "column": column, "data_type": data_type}
+
+
+def key_boundaries(conn, key, parts, method="auto", where=None):
+    """parts - 1 increasing split points of key["column"] (fewer when the table is small).
+
+    method "minmax" divides [MIN, MAX] evenly (integer keys only; evenly
+    sized when ids have few gaps), "sample" walks the index taking every
+    rows/parts-th key, with one seek per boundary, "auto" uses minmax for
+    integers and sample otherwise. where (the query's WHERE clause) narrows
+    MIN/MAX.
+    """
+    table, column = key["table"], key["column"]
+    if method == "auto":
+        method = "minmax" if key["data_type"] in _INTEGER_TYPES else "sample"
+    if method == "minmax":
+        if key["data_type"] not in _INTEGER_TYPES:
+            raise ValueError("minmax splitting needs an integer key")
+        condition = f" WHERE {where}" if where else ""
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(`{column}`), MAX(`{column}`) FROM `{table}` {key['qualifier']}{condition}")
+            low, high = cursor.fetchone()
+        if low is None:
+            return []
+        low, high = int(low), int(high)
+        step = (high - low + 1) / parts
+        return sorted({low + int(step * i) for i in range(1, parts)} - {low})
+    if method != "sample":
+        raise ValueError("method must be 'auto', 'minmax' or 'sample'")
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+        row = cursor.fetchone()
+    step = int(row[0] or 0) // parts if row else 0
+    boundaries = []
+    if step < 1:
+        return boundaries
+    with conn.cursor() as cursor:
+        for _ in range(parts - 1):
+            after = f"WHERE `{column}` > %s " if boundaries else ""
+            cursor.execute(f"SELECT `{column}` FROM `{table}` {after}ORDER BY `{column}` LIMIT 1 OFFSET {step - 1}",
+                           boundaries[-1:] or None)
+            found = cursor.fetchone()
+            if found is None:
+                break
+            boundaries.append(found[0])
+    return boundaries
+
+
+def range_queries(query, key, boundaries, params=None):
+    """[(sql, params)] covering the key ranges between boundaries, in key order.
+
+    The first range is open below and the last open above, so together they
+    cover every row exactly once. Literal % signs are doubled for the range
+    parameters unless the query already has params (and so is escaped); a
+    range without parameters (no boundaries) keeps the query as it is, with
+    None for params.
+    """
+    clauses = split_clauses(query)
+    escaped = clauses if params is not None else {name: text.replace("%", "%%") for name, text in clauses.items()}
+    ref = f"{key['qualifier']}.`{key['column']}`"
+    edges = [None] + list(boundaries) + [None]
+    queries = []
+    for low, high in zip(edges, edges[1:]):
+        conditions, values = [], []
+        if low is not None:
+            conditions.append(f"{ref} >= %s")
+            values.append(low)
+        if high is not None:
+            conditions.append(f"{ref} < %s")
+            values.append(high)
+        if not conditions and params is None:
+            queries.append((build_select(clauses), None))
+            continue
+        sql = build_select(escaped, extra_where=[" AND ".join(conditions)] if conditions else ())
+        queries.append((sql, values + list(params or ())))
+    return queries
+
+
+def _fetch(pool, sql, params):
+    """(column names, [column values per column], row count) of one range."""
+    with pool.acquire() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+    return names, list(zip(*rows)) if rows else [() for _ in names], len(rows)
+
+
+def assemble(parts):
+    """One DataFrame from _fetch results, each column copied once into a pre-allocated array.
+
+    A column gets the numpy dtype of its parts when they are all numeric
+    (int64 and float64 parts give float64) and object otherwise, e.g. for
+    strings or integers with NULLs; object columns of dates are then
+    converted like pd.read_sql_query does.
+    """
+    import numpy as np
+    import pandas as pd
+
+    names = parts[0][0]
+    filled = [columns for _, columns, n in parts if n]
+    total = sum(n for _, _, n in parts)
+    arrays = []
+    for i in range(len(names)):
+        chunks = [columns[i] for columns in filled]
+        if chunks and set().union(*(map(type, c) for c in chunks)) <= {int, float}:
+            chunks = [np.asarray(c) for c in chunks]
+            dtype = np.result_type(*chunks)
+        else:
+            dtype = object
+        array = np.empty(total, dtype=dtype)
+        offset = 0
+        for chunk in chunks:
+            array[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        arrays.append(array)
+    # Positional keys keep duplicate column names apart
+    df = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+    df.columns = names
+    return df.infer_objects()
+
+
+def parallel_read(pool, query, params=None, parts=None, method="auto", key=None, verbose=False):
+    """Read a single-table SELECT as one DataFrame over several connections at once.
+
+    pool is a ConnectionPool or a connection factory (a pool of 4 is made
+    and closed). parts defaults to 4 ranges per connection so a slow range
+    doesn't hold up the others. key defaults to split_key() on a pooled
+    connection. Rows come back in key order (descending for ORDER BY key
+    DESC), otherwise in the order the ranges cover the key.
+    """
+    if not isinstance(pool, ConnectionPool):
+        if not callable(pool):
+            raise TypeError("parallel_read needs a ConnectionPool or a connection factory")
+        with ConnectionPool(pool, size=4) as owned:
+            return parallel_read(owned, query, params, parts, method, key, verbose)
+
+    t0 = time.perf_counter()
+    parts = parts or pool.size * 4
+    with pool.acquire() as conn:
+        key = key or split_key(conn, query)
+        where = split_clauses(query).get("where") if params is None else None
+        boundaries = key_boundaries(conn, key, parts, method, where)
+    queries = range_queries(query, key, boundaries, params)
+    if any(d == "DESC" for _, _, d in parse_query_shape(query)["order_by"]):
+        queries.reverse()
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        results = list(executor.map(lambda q: _fetch(pool, *q), queries))
+    df = assemble(results)
+    if verbose:
+        elapsed = time.perf_counter() - t0
+        print(f"✓ {len(df):,} rows in {len(queries)} ranges of {key['column']} over {pool.size} connections "
+              f"({elapsed:.2f}s)")
+    return df
@@ -0,0 +1,432 @@
+"""
+Partitioning advisor for fact tables filtered by date ranges or categories.
+
+An index narrows the rows a query reads; partition pruning narrows the data
+it can touch at all, and keeps working for scans, aggregates over the
+remaining partitions and retention (DROP PARTITION instead of DELETE).
+
+suggest_partitioning() reads how a workload filters a table (the predicate
+history), profiles the candidate columns and scores RANGE COLUMNS
+partitioning by month or year on date columns (RANGE on UNIX_TIMESTAMP() for
+TIMESTAMP, which RANGE COLUMNS doesn't accept) and LIST COLUMNS partitioning
+on low-cardinality columns by the rows the historical queries would still
+have to scan. validate_partitioning() applies the best scheme to a shadow
+copy of the table and checks the pruning with EXPLAIN PARTITIONS.
+"""
+
+import re
+from datetime import date
+
+from .analyzer import (build_from, build_select, fetch_column_types, parse_query_shape, split_clauses,
+                       split_from_items, split_top_level, split_top_level_and)
+
+DATE_TYPES = {"date", "datetime", "timestamp"}
+# LIST COLUMNS values of these types are written as unquoted numbers
+INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint"}
+SHADOW_PREFIX = "_autoopt_shadow_"
+
+_REF = r'(?:`?(\w+)`?\.)?`?(\w+)`?'
+_LITERAL = r"'((?:[^'\\]|\\.|'')*)'|(-?\d+(?:\.\d+)?)"
+_BETWEEN_RE = re.compile(rf'^\s*{_REF}\s+between\s+(?:{_LITERAL})\s+and\s+(?:{_LITERAL})\s*$', re.IGNORECASE)
+_COMPARE_RE = re.compile(rf'^\s*{_REF}\s*(>=|<=|=|>|<)\s*(?:{_LITERAL})\s*$')
+_IN_RE = re.compile(rf'^\s*{_REF}\s+in\s*\((.*)\)\s*$', re.IGNORECASE | re.DOTALL)
+_YEAR_RE = re.compile(rf'^\s*year\s*\(\s*{_REF}\s*\)\s*(?:=\s*(\d{{4}})|between\s+(\d{{4}})\s+and\s+(\d{{4}}))\s*$',
+                      re.IGNORECASE)
+
+
+def _literal(quoted, number):
+    return quoted if quoted is not None else number
+
+
+def _query_filters(query, table):
+    """{column: ("range", low, high) | ("in", {values}) | ("function", None, None)} for table's WHERE conjuncts.
+
+    None when the query doesn't read table.
+    """
+    shape = parse_query_shape(query)
+    aliases = {a for a, t in shape["tables"].items() if t == table}
+    if not aliases:
+        return None
+    single = len({t for t in shape["tables"].values()}) == 1
+
+    def column(qualifier, name):
+        if (qualifier and qualifier.lower() in aliases) or (not qualifier and single):
+            return name.lower()
+        return None
+
+    filters = {}
+
+    def narrow(col, low, high):
+        kind, old_low, old_high = filters.get(col, ("range", None, None))
+        if kind == "function":
+            kind, old_low, old_high = "range", None, None
+        if kind != "range":
+            return
+        low = max(x for x in (low, old_low) if x is not None) if low is not None or old_low is not None else None
+        high = min(x for x in (high, old_high) if x is not None) if high is not None or old_high is not None else None
+        filters[col] = ("range", low, high)
+
+    for conjunct in split_top_level_and(split_clauses(query).get("where", "")):
+        m = _BETWEEN_RE.match(conjunct)
+        if m and column(m.group(1), m.group(2)):
+            narrow(column(m.group(1), m.group(2)), _literal(m.group(3), m.group(4)), _literal(m.group(5), m.group(6)))
+            continue
+        m = _YEAR_RE.match(conjunct)
+        if m and column(m.group(1), m.group(2)):
+            # Counts as interest in the column, but RANGE COLUMNS can't prune through YEAR()
+            filters.setdefault(column(m.group(1), m.group(2)), ("function", None, None))
+            continue
+        m = _COMPARE_RE.match(conjunct)
+        if m and column(m.group(1), m.group(2)):
+            col, op, value = column(m.group(1), m.group(2)), m.group(3), _literal(m.group(4), m.group(5))
+            if op == "=":
+                filters[col] = ("in", {value})
+            elif op in (">", ">="):
+                narrow(col, value, None)
+            else:
+                narrow(col, None, value)
+            continue
+        m = _IN_RE.match(conjunct)
+        if m and column(m.group(1), m.group(2)):
+            values = set()
+            for item in split_top_level(m.group(3)):
+                lit = re.fullmatch(_LITERAL, item.strip())
+                if not lit:
+                    break
+                values.add(_literal(lit.group(1), lit.group(2)))
+            else:
+                filters[column(m.group(1), m.group(2))] = ("in", values)
+    return filters
+
+
+def predicate_history(queries, table):
+    """How a workload filters table.
+
+    queries are query strings or (query, weight) pairs (weight: count or total
+    time; None counts as 1). Returns {"queries": [(weight, filters)],
+    "columns": {column: {"weight", "range", "equality", ["function"]}}} where
+    filters maps column -> ("range", low, high) or ("in", {values}) with
+    literal bounds, or ("function", None, None) for YEAR(column) filters.
+    """
+    table = table.lower()
+    history = {"queries": [], "columns": {}}
+    for item in queries:
+        query, weight = item if isinstance(item, tuple) else (item, None)
+        weight = 1.0 if weight is None else float(weight)
+        filters = _query_filters(query, table)
+        if filters is None:
+            continue
+        history["queries"].append((weight, filters))
+        for col, (kind, *_) in filters.items():
+            stats = history["columns"].setdefault(col, {"weight": 0.0, "range": 0.0, "equality": 0.0})
+            stats["weight"] += weight
+            stats["equality" if kind == "in" else "range"] += weight
+            if kind == "function":
+                stats["function"] = stats.get("function", 0.0) + weight
+    return history
+
+
+def table_size(conn, table):
+    """(rows, bytes) of table from information_schema (estimates for InnoDB)."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+        row = cursor.fetchone()
+    return (int(row[0] or 0), int(row[1] or 0)) if row else (0, 0)
+
+
+def _next_period(start, granularity):
+    d = date.fromisoformat(start)
+    if granularity == "year":
+        return date(d.year + 1, 1, 1).isoformat()
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1).isoformat()
+
+
+def _range_partitions(conn, table, column, granularity):
+    """[(name, low, high, rows)] with one partition per non-empty month/year, contiguous up to MAXVALUE."""
+    fmt = "%Y-%m-01" if granularity == "month" else "%Y-01-01"
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT DATE_FORMAT(`{column}`, '{fmt}') AS b, COUNT(*) FROM `{table}` GROUP BY b ORDER BY b")
+        buckets = cursor.fetchall()
+    nulls = sum(int(n) for b, n in buckets if b is None)
+    partitions, low = [], None
+    for start, rows in ((b, int(n)) for b, n in buckets if b is not None):
+        high = _next_period(start, granularity)
+        name = "p" + start[:7].replace("-", "") if granularity == "month" else "p" + start[:4]
+        # NULL sorts below every value, so it lands in the first partition
+        partitions.append([name, low, high, rows + (nulls if not partitions else 0)])
+        low = high
+    partitions.append(["pmax", low, None, 0])
+    return [tuple(p) for p in partitions]
+
+
+def _list_partitions(conn, table, column, max_partitions):
+    """[(name, values, rows)] for each value of column, plus a DEFAULT partition; None if too many values."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(DISTINCT `{column}`) FROM `{table}`")
+        if int(cursor.fetchone()[0]) >= max_partitions:
+            return None
+        cursor.execute(f"SELECT `{column}`, COUNT(*) FROM `{table}` GROUP BY `{column}`")
+        values = cursor.fetchall()
+    partitions, used = [], set()
+    for value, rows in values:
+        if value is None:
+            continue
+        name = "p_" + (re.sub(r'\W+', '_', str(value)).strip('_').lower() or "empty")[:50]
+        while name in used:
+            name += "_"
+        used.add(name)
+        partitions.append((name, {str(value)}, int(rows)))
+    partitions.append(("pdefault", None, sum(int(n) for v, n in values if v is None)))
+    return partitions
+
+
+def _scan_fraction(candidate, filters, total_rows):
+    """Share of the table's rows a query with these filters reads once partitions are pruned."""
+    if not total_rows:
+        return 1.0
+    condition = filters.get(candidate["column"])
+    if condition is not None and condition[0] == "function":
+        return 1.0
+    if candidate["method"] == "RANGE":
+        if condition is None:
+            return 1.0
+        if condition[0] == "in":
+            values = sorted(condition[1])
+            condition = ("range", values[0], values[-1])
+        _, low, high = condition
+        rows = sum(p["rows"] for p in candidate["partitions"]
+                   if (low is None or p["high"] is None or str(low) < p["high"])
+                   and (high is None or p["low"] is None or str(high) >= p["low"]))
+        return rows / total_rows
+    if condition is None or condition[0] != "in":
+        return 1.0
+    listed = {v for p in candidate["partitions"] if p["values"] for v in p["values"]}
+    rows = sum(p["rows"] for p in candidate["partitions"]
+               if (p["values"] and p["values"] & condition[1]) or (p["values"] is None and condition[1] - listed))
+    return rows / total_rows
+
+
+def _unique_key_changes(conn, table, column):
+    """ALTER TABLE specs that add column to every unique key, as partitioning requires."""
+    keys = {}
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW INDEX FROM `{table}`")
+        names = [d[0] for d in cursor.description]
+        for row in cursor.fetchall():
+            rec = dict(zip(names, row))
+            if not int(rec["Non_unique"]):
+                keys.setdefault(rec["Key_name"], []).append(rec["Column_name"].lower())
+    changes = []
+    for name, columns in keys.items():
+        if column in columns:
+            continue
+        cols = ", ".join(f"`{c}`" for c in columns + [column])
+        if name == "PRIMARY":
+            changes.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({cols})")
+        else:
+            changes.append(f"DROP INDEX `{name}`, ADD UNIQUE `{name}` ({cols})")
+    return changes
+
+
+def _partition_clause(candidate):
+    def quote(value):
+        return "'" + str(value).replace("'", "''") + "'"
+
+    col = f"`{candidate['column']}`"
+    data_type = candidate.get("data_type", "")
+    if candidate["method"] == "RANGE":
+        # RANGE COLUMNS takes DATE and DATETIME only; TIMESTAMP partitions on its epoch seconds
+        timestamp = data_type == "timestamp"
+        parts = []
+        for p in candidate["partitions"]:
+            bound = quote(p["high"]) if p["high"] else "MAXVALUE"
+            if timestamp and p["high"]:
+                bound = f"UNIX_TIMESTAMP({bound})"
+            parts.append(f"PARTITION {p['name']} VALUES LESS THAN ({bound})")
+        method = f"RANGE (UNIX_TIMESTAMP({col}))" if timestamp else f"RANGE COLUMNS({col})"
+        return f"PARTITION BY {method} (\n  " + ",\n  ".join(parts) + "\n)"
+    numeric = data_type in INTEGER_TYPES
+    parts = []
+    for p in candidate["partitions"]:
+        if p["values"] is None:
+            parts.append(f"PARTITION {p['name']} DEFAULT")
+        elif numeric:
+            values = ", ".join(str(v) for v in sorted(p["values"], key=int))
+            parts.append(f"PARTITION {p['name']} VALUES IN ({values})")
+        else:
+            values = ", ".join(quote(v) for v in sorted(p["values"]))
+            parts.append(f"PARTITION {p['name']} VALUES IN ({values})")
+    return f"PARTITION BY LIST COLUMNS({col}) (\n  " + ",\n  ".join(parts) + "\n)"
+
+
+def partition_statements(target, advice):
+    """ALTER TABLE statements that apply advice to target (the table itself or a shadow copy)."""
+    statements = [f"ALTER TABLE `{target}` {change}" for change in advice["key_changes"]]
+    statements.append(f"ALTER TABLE `{target}` {advice['clause']}")
+    return statements
+
+
+def suggest_partitioning(conn, table, queries, max_partitions=64, min_share=0.2, verbose=True):
+    """Propose RANGE (month/year) or LIST partitioning of table for a workload.
+
+    queries are strings or (query, weight) pairs, e.g. LearningStore.query_history(table)
+    or slow-log entries. Columns filtered by at least min_share of the
+    (weighted) queries are candidates: date columns with range filters for
+    RANGE COLUMNS by month or year, columns with fewer than max_partitions
+    values for LIST COLUMNS. Each scheme is scored by the expected scan
+    reduction, 1 - the weighted mean share of rows the historical queries
+    still read; the best one is returned (the fewest partitions among those
+    within 2 points of it) as {"table", "method", "column", "data_type", "granularity",
+    "partitions": [{"name", "low", "high", "values", "rows", "bytes"}],
+    "scan_reduction", "key_changes", "clause", "statements", "notes",
+    "candidates"}, or None when nothing qualifies.
+    """
+    table = table.lower()
+    history = predicate_history(queries, table)
+    total_weight = sum(w for w, _ in history["queries"])
+    if not total_weight:
+        return None
+    types = fetch_column_types(conn, [table])
+    rows, size = table_size(conn, table)
+
+    candidates = []
+    for col, stats in sorted(history["columns"].items(), key=lambda kv: -kv[1]["weight"]):
+        if stats["weight"] / total_weight < min_share:
+            continue
+        data_type = types.get((table, col), ("", ""))[0]
+        schemes = []
+        if data_type in DATE_TYPES and stats["range"]:
+            for granularity in ("month", "year"):
+                parts = _range_partitions(conn, table, col, granularity)
+                if len(parts) <= max_partitions:
+                    schemes.append(("RANGE", granularity, [
+                        {"name": n, "low": lo, "high": hi, "values": None, "rows": r} for n, lo, hi, r in parts]))
+        if stats["equality"]:
+            parts = _list_partitions(conn, table, col, max_partitions)
+            if parts:
+                schemes.append(("LIST", None, [
+                    {"name": n, "low": None, "high": None, "values": v, "rows": r} for n, v, r in parts]))
+        for method, granularity, parts in schemes:
+            candidates.append({"method": method, "column": col, "data_type": data_type, "granularity": granularity,
+                               "partitions": parts})
+
+    if not candidates:
+        return None
+    for candidate in candidates:
+        counted = sum(p["rows"] for p in candidate["partitions"]) or rows
+        bytes_per_row = size / max(rows, counted, 1)
+        for p in candidate["partitions"]:
+            p["bytes"] = int(p["rows"] * bytes_per_row)
+        fraction = sum(w * _scan_fraction(candidate, f, counted) for w, f in history["queries"]) / total_weight
+        candidate["scan_reduction"] = 1.0 - fraction
+
+    best = max(c["scan_reduction"] for c in candidates)
+    advice = min((c for c in candidates if c["scan_reduction"] >= best - 0.02), key=lambda c: len(c["partitions"]))
+    advice = dict(advice, table=table, candidates=candidates)
+    advice["key_changes"] = _unique_key_changes(conn, table, advice["column"])
+    advice["clause"] = _partition_clause(advice)
+    advice["statements"] = partition_statements(table, advice)
+
+    advice["notes"] = []
+    if advice["key_changes"]:
+        advice["notes"].append(f"Every unique key must include {advice['column']}: keys are widened, "
+                               "so uniqueness is only enforced per partition value.")
+    wrapped = history["columns"][advice["column"]].get("function")
+    if wrapped:
+        advice["notes"].append(f"{wrapped / total_weight:.0%} of the workload filters YEAR({advice['column']}), "
+                               "which can't prune; rewrite those as ranges (core.fix_nonsargable).")
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                       "WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+                       (table, table))
+        if int(cursor.fetchone()[0]):
+            advice["notes"].append("InnoDB can't partition tables with foreign keys; they must be dropped first.")
+
+    if verbose:
+        for c in sorted(candidates, key=lambda c: -c["scan_reduction"]):
+            label = f"{c['method']} {c['column']}" + (f" by {c['granularity']}" if c["granularity"] else "")
+            print(f"  {label:<36} {len(c['partitions']):>4} partitions  {c['scan_reduction']:6.1%} less scanned")
+        print(f"💡 {advice['method']} partitioning on {advice['column']}: "
+              f"{advice['scan_reduction']:.1%} expected scan reduction")
+        for statement in advice["statements"]:
+            print(statement + ";")
+        for note in advice["notes"]:
+            print(f"ℹ {note}")
+    return advice
+
+
+def _on_shadow(query, table, shadow):
+    """query with the outer FROM clause reading shadow in place of table (aliases kept)."""
+    clauses = split_clauses(query)
+    items = split_from_items(clauses["from"])
+    for item in items:
+        if (item["table"] or "").lower() == table:
+            item["ref"] = f"`{shadow}` {item['alias'] or table}"
+    return build_select(clauses, build_from(items))
+
+
+def validate_partitioning(conn, advice, queries, copy_rows=True, keep=False, verbose=True):
+    """Apply advice to a shadow copy of the table and check partition pruning with EXPLAIN PARTITIONS.
+
+    copy_rows=True copies the whole table, an int copies that many rows and
+    False none (pruning shows without data, row estimates don't). The shadow
+    table is dropped afterwards unless keep=True. Returns {"shadow",
+    "queries": [{"query", "partitions", "scanned", "total", "row_fraction"}],
+    "scan_reduction"}; scan_reduction is weighted like suggest_partitioning's
+    estimate, using the partitions EXPLAIN reports.
+    """
+    table = advice["table"]
+    shadow = (SHADOW_PREFIX + table)[:64]
+    rows_by_partition = {p["name"]: p["rows"] for p in advice["partitions"]}
+    total_rows = sum(rows_by_partition.values())
+    report = {"shadow": shadow, "queries": [], "scan_reduction": None}
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+        cursor.execute(f"CREATE TABLE `{shadow}` LIKE `{table}`")
+    try:
+        with conn.cursor() as cursor:
+            for statement in partition_statements(shadow, advice):
+                cursor.execute(statement)
+            if copy_rows is not False:
+                limit = "" if copy_rows is True else f" LIMIT {int(copy_rows)}"
+                cursor.execute(f"INSERT INTO `{shadow}` SELECT * FROM `{table}`{limit}")
+
+        weighted, total_weight = 0.0, 0.0
+        for item in queries:
+            query, weight = item if isinstance(item, tuple) else (item, None)
+            weight = 1.0 if weight is None else float(weight)
+            shape = parse_query_shape(query)
+            names = {a for a, t in shape["tables"].items() if t == table}
+            if not names:
+                continue
+            with conn.cursor() as cursor:
+                cursor.execute("EXPLAIN PARTITIONS " + _on_shadow(query, table, shadow))
+                columns = [d[0] for d in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            scanned = []
+            for row in plan:
+                if str(row.get("table")).lower() in names | {shadow}:
+                    scanned += [p for p in str(row.get("partitions") or "").split(",") if p]
+            # Subpartition-free schemes: one name per partition
+            scanned = list(dict.fromkeys(scanned))
+            fraction = (sum(rows_by_partition.get(p, 0) for p in scanned) / total_rows) if total_rows else 1.0
+            report["queries"].append({"query": query, "partitions": scanned, "scanned": len(scanned),
+                                      "total": len(rows_by_partition), "row_fraction": fraction})
+            weighted += weight * fraction
+            total_weight += weight
+            if verbose:
+                print(f"  {len(scanned):>3}/{len(rows_by_partition)} partitions ({fraction:6.1%} of rows): "
+                      f"{' '.join(query.split())[:80]}")
+        if total_weight:
+            report["scan_reduction"] = 1.0 - weighted / total_weight
+            if verbose:
+                print(f"✓ Pruning on {shadow}: {report['scan_reduction']:.1%} less scanned "
+                      f"(estimated {advice['scan_reduction']:.1%})")
+    finally:
+        if not keep:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+    return report
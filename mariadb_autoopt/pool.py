@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+
+def connection_settings_from_env(**overrides):
+    """Read connection settings from the AUTOOPT_DB_* environment variables."""
+    settings = {
+        "host": os.getenv("AUTOOPT_DB_HOST", "localhost"),
+        "port": int(os.getenv("AUTOOPT_DB_PORT", "3306")),
+        "user": os.getenv("AUTOOPT_DB_USER", "autoopt_user"),
+        "password": os.getenv("AUTOOPT_DB_PASS", ""),
+        "database": os.getenv("AUTOOPT_DB_NAME", "test_autoopt"),
+    }
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def make_connection_factory(**settings):
+    """Return a zero-argument callable that opens a new pymysql connection."""
+    import pymysql
+
+    def factory():
+        return pymysql.connect(
+            autocommit=True,
+            connect_timeout=10,
+            charset='utf8mb4',
+            **settings
+        )
+
+    return factory
+
+
+class ConnectionPool:
+    """Small thread-safe pool of DB-API connections.
+
+    DB-API connections must not be shared between threads, so workers borrow
+    one with ``acquire()`` for the duration of a task and hand it back after.
+    Connections are opened lazily, up to ``size`` at a time.
+    """
+
+    def __init__(self, factory, size=4):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _get(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+
+        try:
+            conn = self.factory()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a connection; it is returned to the pool when the block exits."""
+        conn = self._get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every connection the pool has opened."""
+        with self._lock:
+            conns, self._all = self._all, []
+            self._opened = 0
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
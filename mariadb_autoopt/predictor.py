@@ -0,0 +1,139 @@
+"""
+Execution-time prediction from EXPLAIN plans.
+
+A gradient-boosted regressor is trained on the benchmark history in the
+learning store (plan features -> median run time) so slow queries can be
+assessed, and candidate indexes ranked, without running the query itself.
+"""
+
+import math
+
+from .analyzer import PLAN_FEATURES, explain_json, iter_plan_tables, plan_features
+from .calibration import server_host
+from .optimizer import parse_index_statement
+
+
+def table_sizes(conn, tables):
+    """Approximate row counts {table: rows} from information_schema for the current database."""
+    tables = sorted(set(tables))
+    if not tables:
+        return {}
+    placeholders = ", ".join(["%s"] * len(tables))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+            tables,
+        )
+        return {name: rows or 0 for name, rows in cursor.fetchall()}
+
+
+def query_plan_features(conn, query):
+    """EXPLAIN FORMAT=JSON the query (without running it) and return its plan_features."""
+    plan = explain_json(conn, query)
+    sizes = table_sizes(conn, [t["table_name"] for t in iter_plan_tables(plan)])
+    return plan_features(plan, sizes)
+
+
+def record_benchmark(store, conn, query, times):
+    """Add a benchmark to the store's training history, with the plan and the server it ran on."""
+    return store.record_latency(query, query_plan_features(conn, query), times, host=server_host(conn))
+
+
+class LatencyModel:
+    """Regressor predicting a query's median run time (seconds) from its plan features."""
+
+    def __init__(self, min_samples=20, **params):
+        self.min_samples = min_samples
+        self.params = {"n_estimators": 200, "max_depth": 3, "learning_rate": 0.05, **params}
+        self.model = None
+        self.report = None
+        self.trained_samples = 0
+
+    @property
+    def trained(self):
+        return self.model is not None
+
+    @staticmethod
+    def _vector(features):
+        return [float(features.get(name, 0.0)) for name in PLAN_FEATURES]
+
+    def train(self, store, host=None):
+        """Fit on the store's latency samples and return the cross-validated accuracy report."""
+        import numpy as np
+        from sklearn.ensemble import GradientBoostingRegressor
+        from sklearn.model_selection import KFold, cross_val_predict
+
+        samples = store.latency_samples(host=host)
+        if len(samples) < self.min_samples:
+            raise ValueError(f"Need at least {self.min_samples} benchmark samples, have {len(samples)}")
+
+        X = np.array([self._vector(s["plan_features"]) for s in samples])
+        # Run times span orders of magnitude, so fit (and score) in log space
+        y = np.log(np.array([max(s["median"], 1e-6) for s in samples]))
+
+        folds = KFold(n_splits=min(5, len(samples)), shuffle=True, random_state=0)
+        predicted = cross_val_predict(GradientBoostingRegressor(**self.params), X, y, cv=folds)
+        ratio = np.exp(np.abs(predicted - y))
+        self.report = {
+            "samples": len(samples),
+            "median_abs_pct_error": float(np.median(np.abs(np.exp(predicted - y) - 1)) * 100),
+            "within_2x_pct": float(np.mean(ratio <= 2) * 100),
+            "r2_log": float(1 - np.sum((y - predicted) ** 2) / max(np.sum((y - y.mean()) ** 2), 1e-12)),
+        }
+
+        self.model = GradientBoostingRegressor(**self.params).fit(X, y)
+        self.trained_samples = len(samples)
+        return self.report
+
+    def retrain(self, store, host=None, min_new=10):
+        """Train again once min_new samples have been recorded since the last fit; returns the report."""
+        available = len(store.latency_samples(host=host))
+        if available >= self.min_samples and (not self.trained or available - self.trained_samples >= min_new):
+            return self.train(store, host=host)
+        return self.report
+
+    def accuracy_report(self):
+        """Cross-validated accuracy from the last training run, as text."""
+        if self.report is None:
+            return "Latency model not trained"
+        r = self.report
+        return (f"Latency model: {r['samples']} samples, median error {r['median_abs_pct_error']:.0f}%, "
+                f"{r['within_2x_pct']:.0f}% within 2x, R² (log) {r['r2_log']:.2f}")
+
+    def predict_features(self, features):
+        if not self.trained:
+            raise RuntimeError("LatencyModel is not trained")
+        return math.exp(self.model.predict([self._vector(features)])[0])
+
+    def predict(self, conn, query):
+        """Predicted run time in seconds; only EXPLAINs the query."""
+        return self.predict_features(query_plan_features(conn, query))
+
+    def rank_indexes(self, conn, query, candidates):
+        """Rank CREATE INDEX candidates by predicted run time, best first.
+
+        Each index is created, the query EXPLAINed and its time predicted, and
+        the index dropped again; the query itself never runs. Returns
+        [(statement, predicted_seconds, predicted_gain_pct)] and the baseline
+        prediction.
+        """
+        baseline = self.predict(conn, query)
+        ranking = []
+        for statement in candidates:
+            parsed = parse_index_statement(statement)
+            if parsed is None:
+                continue
+            name, table, _ = parsed
+            with conn.cursor() as cursor:
+                try:
+                    cursor.execute(statement)
+                except Exception:
+                    continue
+                try:
+                    predicted = self.predict(conn, query)
+                finally:
+                    cursor.execute(f"DROP INDEX `{name}` ON `{table}`")
+            ranking.append((statement, predicted, (baseline - predicted) / baseline * 100))
+        ranking.sort(key=lambda item: item[1])
+        return ranking, baseline
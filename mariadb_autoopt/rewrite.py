@@ -0,0 +1,229 @@
+"""
+Correlated scalar subquery rewrites, checked for equivalence before benchmarking.
+
+A scalar subquery such as
+
+    (SELECT COUNT(*) FROM routes r2 WHERE r2.airline_id = al.airline_id AND r2.stops = 0)
+
+runs once per outer row. It can be answered by one pre-aggregated derived table
+LEFT JOINed on the correlation columns:
+
+    LEFT JOIN (SELECT r2.airline_id AS k1, COUNT(*) AS v FROM routes r2
+               WHERE r2.stops = 0 GROUP BY r2.airline_id) sq1 ON sq1.k1 = al.airline_id
+
+COUNT becomes COALESCE(..., 0), because a missing group means zero rather
+than NULL. In the SELECT list of a grouped outer query the value is wrapped in
+MAX(), since it is constant per correlation key. Rewrites are only proposed as
+advice: rewrite_advice() checks that both queries return the same multiset
+of rows (by streamed row hashes) and then benchmarks them.
+"""
+
+import hashlib
+import re
+from collections import Counter
+from decimal import Decimal
+
+from .analyzer import (build_from, build_select, mask_query, parse_query_shape, split_clauses, split_from_items,
+                       split_top_level_and, subquery_spans)
+
+_EQUALITY = re.compile(r'^\s*`?(\w+)`?\.`?(\w+)`?\s*=\s*`?(\w+)`?\.`?(\w+)`?\s*$')
+_REWRITABLE_AGGREGATES = {"COUNT", "SUM", "MIN", "MAX", "AVG"}
+
+
+def _parse_correlated(subquery, outer_aliases):
+    """Describe a rewritable correlated scalar subquery, or return None."""
+    clauses = split_clauses(subquery)
+    if set(clauses) - {"select", "from", "where"} or "from" not in clauses:
+        return None
+    items = split_from_items(clauses["from"])
+    if len(items) != 1 or not items[0]["table"]:
+        return None
+    inner = items[0]
+    inner_names = {inner["alias"].lower(), inner["table"].lower()}
+
+    select = parse_query_shape(subquery)["select"]
+    if len(select) != 1 or select[0]["aggregate"] not in _REWRITABLE_AGGREGATES:
+        return None
+
+    correlations, filters = [], []
+    for conjunct in split_top_level_and(clauses.get("where", "")):
+        refs = {a.lower() for a in re.findall(r'`?(\w+)`?\s*\.', mask_query(conjunct))}
+        outer = refs - inner_names
+        if not outer:
+            filters.append(conjunct)
+            continue
+        m = _EQUALITY.match(conjunct)
+        if not m or not outer <= outer_aliases:
+            return None
+        left, right = (m.group(1), m.group(2)), (m.group(3), m.group(4))
+        if left[0].lower() in inner_names and right[0].lower() in outer_aliases:
+            correlations.append((left[1], f"{right[0]}.{right[1]}"))
+        elif right[0].lower() in inner_names and left[0].lower() in outer_aliases:
+            correlations.append((right[1], f"{left[0]}.{left[1]}"))
+        else:
+            return None
+    if not correlations:
+        return None
+
+    return {
+        "aggregate": select[0]["aggregate"],
+        "distinct": select[0]["distinct"],
+        "argument": select[0]["argument"],
+        "ref": inner["ref"],
+        "alias": inner["alias"],
+        "correlations": correlations,
+        "filters": filters,
+    }
+
+
+def find_correlated_subqueries(query):
+    """Correlated scalar subqueries in the outer SELECT list and WHERE clause that can be rewritten.
+
+    Returns [{"clause", "start", "end", "text", "aggregate", "distinct",
+    "argument", "ref", "alias", "correlations": [(inner_column, outer_expr)],
+    "filters"}]; start/end index into that clause of split_clauses(query).
+    """
+    clauses = split_clauses(query)
+    outer_aliases = set(parse_query_shape(query)["tables"])
+    found = []
+    for clause in ("select", "where"):
+        text = clauses.get(clause, "")
+        for start, end in subquery_spans(text):
+            parsed = _parse_correlated(text[start + 1:end - 1], outer_aliases)
+            if parsed:
+                found.append({"clause": clause, "start": start, "end": end, "text": text[start:end], **parsed})
+    return found
+
+
+def rewrite_correlated_subqueries(query):
+    """Rewrite correlated scalar subqueries as LEFT JOINs to pre-aggregated derived tables.
+
+    Returns (rewritten_sql, subqueries); rewritten_sql is None when nothing
+    could be rewritten.
+    """
+    subqueries = find_correlated_subqueries(query)
+    if not subqueries:
+        return None, []
+
+    clauses = split_clauses(query)
+    grouped = bool(clauses.get("group by")) or any(
+        item["aggregate"] for item in parse_query_shape(query)["select"]
+    )
+    items = split_from_items(clauses["from"])
+    from_text = build_from(items)
+    if any(it["join"] == "," for it in items):
+        # LEFT JOIN binds tighter than a comma; keep the ON able to see every table
+        from_text = f"({from_text})"
+
+    replacements = {"select": [], "where": []}
+    for n, sq in enumerate(subqueries, 1):
+        derived = f"sq{n}"
+        keys = ", ".join(f"{sq['alias']}.{col} AS k{i}" for i, (col, _) in enumerate(sq["correlations"], 1))
+        group = ", ".join(f"{sq['alias']}.{col}" for col, _ in sq["correlations"])
+        value = f"{sq['aggregate']}({'DISTINCT ' if sq['distinct'] else ''}{sq['argument']})"
+        inner = f"SELECT {keys}, {value} AS v FROM {sq['ref']}"
+        if sq["filters"]:
+            inner += " WHERE " + " AND ".join(sq["filters"])
+        inner += f" GROUP BY {group}"
+        on = " AND ".join(f"{derived}.k{i} = {outer}" for i, (_, outer) in enumerate(sq["correlations"], 1))
+        from_text += f" LEFT JOIN ({inner}) {derived} ON {on}"
+
+        expr = f"{derived}.v"
+        if sq["clause"] == "select" and grouped:
+            expr = f"MAX({expr})"
+        if sq["aggregate"] == "COUNT":
+            expr = f"COALESCE({expr}, 0)"
+        replacements[sq["clause"]].append((sq["start"], sq["end"], expr))
+
+    for clause, spans in replacements.items():
+        text = clauses.get(clause, "")
+        for start, end, expr in sorted(spans, reverse=True):
+            text = text[:start] + expr + text[end:]
+        if spans:
+            clauses[clause] = text
+    return build_select(clauses, from_text), subqueries
+
+
+def _normalize_value(value):
+    # DECIMAL vs DOUBLE vs BIGINT for the same number must hash alike
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, Decimal)):
+        return format(Decimal(str(value)).normalize(), 'f')
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    return value
+
+
+def result_digest(conn, sql, batch_size=1000):
+    """Multiset of row hashes of sql's result, streamed from the server in batches."""
+    try:
+        import pymysql.cursors
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+    except Exception:
+        cursor = conn.cursor()
+
+    digests = Counter()
+    try:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                key = repr(tuple(_normalize_value(v) for v in row)).encode()
+                digests[hashlib.blake2b(key, digest_size=16).digest()] += 1
+    finally:
+        cursor.close()
+    return digests
+
+
+def check_equivalence(conn, original, rewritten):
+    """Compare the row multisets of two queries; returns (equivalent, details).
+
+    Row order is ignored, so queries whose LIMIT cuts through ties may be
+    reported as different even when both answers are valid.
+    """
+    a, b = result_digest(conn, original), result_digest(conn, rewritten)
+    details = {
+        "rows_original": sum(a.values()),
+        "rows_rewritten": sum(b.values()),
+        "missing": sum((a - b).values()),
+        "extra": sum((b - a).values()),
+    }
+    return a == b, details
+
+
+def rewrite_advice(conn, query, runs=3, verbose=True):
+    """Rewrite correlated subqueries, verify equivalence and benchmark original vs rewrite.
+
+    Returns {"rewritten", "subqueries", "equivalent", "details", "before",
+    "after", "improvement"}; the benchmark is skipped when the results differ.
+    """
+    from .core import benchmark_query
+
+    rewritten, subqueries = rewrite_correlated_subqueries(query)
+    advice = {"rewritten": rewritten, "subqueries": subqueries, "equivalent": None, "details": None,
+              "before": None, "after": None, "improvement": None}
+    if rewritten is None:
+        if verbose:
+            print("No rewritable correlated subqueries found")
+        return advice
+
+    if verbose:
+        print(f"Rewrote {len(subqueries)} correlated subquer{'y' if len(subqueries) == 1 else 'ies'}:")
+        print(rewritten)
+    advice["equivalent"], advice["details"] = check_equivalence(conn, query, rewritten)
+    if not advice["equivalent"]:
+        if verbose:
+            print(f"✗ Results differ: {advice['details']}")
+        return advice
+
+    before = benchmark_query(conn, query, runs=runs)
+    after = benchmark_query(conn, rewritten, runs=runs)
+    advice["before"], advice["after"] = before, after
+    advice["improvement"] = (before["median"] - after["median"]) / before["median"] * 100
+    if verbose:
+        print(f"✓ Same {advice['details']['rows_original']:,} rows; "
+              f"{before['median']:.3f}s -> {after['median']:.3f}s ({advice['improvement']:.1f}% faster)")
+    return advice
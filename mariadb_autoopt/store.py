@@ -0,0 +1,311 @@
+"""
+Persistent learning store for optimization outcomes.
+
+Every measured optimization (query shape, tables, predicates, strategy,
+indexes applied and the before/after timing distributions) is appended to an
+embedded SQLite file, so learnings survive restarts and can be shared between
+processes on one machine by pointing AUTOOPT_STORE at the same file. The file
+uses WAL journaling, which needs shared memory, so it must not live on a
+network filesystem.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import threading
+import time
+
+from .analyzer import fingerprint_query, parse_query_shape
+from .features import FeatureIndex, query_features
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".mariadb_autoopt", "learnings.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outcomes (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint   TEXT NOT NULL,
+    table_set     TEXT NOT NULL,
+    query         TEXT NOT NULL,
+    tables        TEXT NOT NULL,
+    predicates    TEXT NOT NULL,
+    strategy      TEXT,
+    indexes       TEXT NOT NULL,
+    before_times  TEXT NOT NULL,
+    after_times   TEXT NOT NULL,
+    before_median REAL,
+    after_median  REAL,
+    improvement   REAL,
+    host          TEXT,
+    created_at    REAL NOT NULL,
+    features      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outcomes_fingerprint ON outcomes (fingerprint, created_at);
+CREATE INDEX IF NOT EXISTS idx_outcomes_table_set ON outcomes (table_set, improvement);
+CREATE TABLE IF NOT EXISTS latency_samples (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint   TEXT NOT NULL,
+    query         TEXT NOT NULL,
+    plan_features TEXT NOT NULL,
+    times         TEXT NOT NULL,
+    median        REAL NOT NULL,
+    host          TEXT,
+    created_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_latency_samples_host ON latency_samples (host, created_at);
+CREATE TABLE IF NOT EXISTS state (
+    key         TEXT PRIMARY KEY,
+    value       TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+"""
+
+_JSON_COLUMNS = ("tables", "predicates", "indexes", "before_times", "after_times", "features",
+                 "plan_features", "times")
+
+# Columns added after the first release, created on open for older store files
+_ADDED_COLUMNS = {"features": "TEXT"}
+
+
+def table_set_key(tables):
+    """Canonical key for a set of table names."""
+    return ",".join(sorted({t.lower() for t in tables if t}))
+
+
+def improvement_pct(before, after):
+    """Percentage improvement of after over before (negative when it got slower)."""
+    if not before or after is None:
+        return None
+    return (before - after) / before * 100
+
+
+class LearningStore:
+    """SQLite-backed history of optimization outcomes, indexed by fingerprint and table set."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("AUTOOPT_STORE", DEFAULT_STORE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if self.path != ":memory:":
+                # Lets readers in other processes work while one writes (local filesystems only)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(outcomes)")}
+            for column, decl in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE outcomes ADD COLUMN {column} {decl}")
+        self._index = None
+        self._index_max_id = 0
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rows(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        out = []
+        for row in rows:
+            rec = dict(row)
+            for col in _JSON_COLUMNS:
+                if col in rec and rec[col] is not None:
+                    rec[col] = json.loads(rec[col])
+            out.append(rec)
+        return out
+
+    def record_outcome(self, query, strategy, before_times, after_times, indexes=(), host=None,
+                       explain_df=None):
+        """Store one measured optimization and return its row id.
+
+        Pass the baseline EXPLAIN DataFrame as explain_df to include plan access
+        types in the similarity features.
+        """
+        shape = parse_query_shape(query)
+        tables = sorted({t for t in shape["tables"].values() if t})
+        before_times = [float(t) for t in before_times]
+        after_times = [float(t) for t in (after_times or [])]
+        before_median = statistics.median(before_times) if before_times else None
+        after_median = statistics.median(after_times) if after_times else None
+
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                """
+                INSERT INTO outcomes (fingerprint, table_set, query, tables, predicates, strategy, indexes,
+                                      before_times, after_times, before_median, after_median, improvement,
+                                      host, created_at, features)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    fingerprint_query(query),
+                    table_set_key(tables),
+                    query,
+                    json.dumps(tables),
+                    json.dumps([list(p) for p in shape["predicates"]]),
+                    strategy,
+                    json.dumps(list(indexes)),
+                    json.dumps(before_times),
+                    json.dumps(after_times),
+                    before_median,
+                    after_median,
+                    improvement_pct(before_median, after_median),
+                    host or socket.gethostname(),
+                    time.time(),
+                    json.dumps(query_features(query, explain_df)),
+                ),
+            )
+            return cur.lastrowid
+
+    def by_fingerprint(self, fingerprint, limit=20):
+        """Outcomes for one query shape (see fingerprint_query), newest first."""
+        return self._rows(
+            "SELECT * FROM outcomes WHERE fingerprint = ? ORDER BY created_at DESC LIMIT ?",
+            (fingerprint, limit),
+        )
+
+    def by_tables(self, tables, min_improvement=None, limit=20):
+        """Outcomes for queries over exactly this set of tables, best improvement first."""
+        sql = "SELECT * FROM outcomes WHERE table_set = ?"
+        params = [table_set_key(tables)]
+        if min_improvement is not None:
+            sql += " AND improvement > ?"
+            params.append(min_improvement)
+        sql += " ORDER BY improvement DESC LIMIT ?"
+        params.append(limit)
+        return self._rows(sql, params)
+
+    def best_outcome(self, query, min_improvement=15.0):
+        """Best past outcome for this query: same fingerprint first, then same table set."""
+        same_shape = [r for r in self.by_fingerprint(fingerprint_query(query))
+                      if r["improvement"] is not None and r["improvement"] > min_improvement]
+        if same_shape:
+            return max(same_shape, key=lambda r: r["improvement"])
+
+        tables = {t for t in parse_query_shape(query)["tables"].values() if t}
+        if not tables:
+            return None
+        similar = self.by_tables(tables, min_improvement=min_improvement, limit=1)
+        return similar[0] if similar else None
+
+    def _feature_index(self):
+        """Feature matrix over all stored outcomes, extended incrementally with new rows."""
+        if self._index is None:
+            self._index = FeatureIndex()
+        for row in self._rows(
+            "SELECT id, query, features FROM outcomes WHERE id > ? ORDER BY id", (self._index_max_id,)
+        ):
+            # Outcomes recorded before features were stored get them computed from the query text
+            self._index.add(row["id"], row["features"] or query_features(row["query"]))
+            self._index_max_id = row["id"]
+        return self._index
+
+    def similar_outcomes(self, query, k=5, explain_df=None, min_similarity=0.3):
+        """Past outcomes of the k most similar queries as [(outcome, similarity), ...]."""
+        neighbours = self._feature_index().nearest(query_features(query, explain_df), k=k,
+                                                   min_similarity=min_similarity)
+        if not neighbours:
+            return []
+        ids = [key for key, _ in neighbours]
+        rows = {r["id"]: r for r in self._rows(
+            f"SELECT * FROM outcomes WHERE id IN ({','.join('?' * len(ids))})", ids
+        )}
+        return [(rows[key], sim) for key, sim in neighbours if key in rows]
+
+    def recommend(self, query, k=10, explain_df=None, min_similarity=0.3, min_improvement=15.0):
+        """Propose strategies and indexes that helped the most similar past queries.
+
+        Each candidate is scored by the sum of similarity * improvement over the
+        neighbours it helped. Returns {"strategies": [(name, score)],
+        "indexes": [(index, score)], "neighbours": [(outcome, similarity)]}.
+        """
+        neighbours = [
+            (outcome, sim) for outcome, sim in self.similar_outcomes(query, k, explain_df, min_similarity)
+            if outcome["improvement"] is not None and outcome["improvement"] > min_improvement
+        ]
+        strategies, indexes = {}, {}
+        for outcome, sim in neighbours:
+            score = sim * outcome["improvement"]
+            if outcome["strategy"]:
+                strategies[outcome["strategy"]] = strategies.get(outcome["strategy"], 0.0) + score
+            for index in outcome["indexes"]:
+                indexes[index] = indexes.get(index, 0.0) + score
+
+        def ranked(scores):
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+        return {"strategies": ranked(strategies), "indexes": ranked(indexes), "neighbours": neighbours}
+
+    def record_latency(self, query, plan_features, times, host=None):
+        """Store one benchmark (run times) together with the plan features it ran under.
+
+        host is the database server the times were measured on
+        (calibration.server_host), not the machine running the client.
+        """
+        times = [float(t) for t in times]
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                """
+                INSERT INTO latency_samples (fingerprint, query, plan_features, times, median, host, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (fingerprint_query(query), query, json.dumps(plan_features), json.dumps(times),
+                 statistics.median(times), host, time.time()),
+            )
+            return cur.lastrowid
+
+    def latency_samples(self, host=None, limit=None):
+        """Benchmark history for training the latency model, oldest first (optionally one host only)."""
+        sql = "SELECT * FROM latency_samples"
+        params = []
+        if host is not None:
+            sql += " WHERE host = ?"
+            params.append(host)
+        sql += " ORDER BY created_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._rows(sql, params)
+
+    def query_history(self, table=None, limit=1000):
+        """Texts of recorded queries (optimized or latency-sampled), newest first.
+
+        With table, only queries whose FROM clause reads that table.
+        """
+        sql = ("SELECT query, created_at FROM outcomes WHERE query LIKE ? "
+               "UNION ALL SELECT query, created_at FROM latency_samples WHERE query LIKE ? "
+               "ORDER BY created_at DESC")
+        pattern = f"%{table}%" if table else "%"
+        queries = []
+        for row in self._rows(sql, (pattern, pattern)):
+            if table and table.lower() not in parse_query_shape(row["query"])["tables"].values():
+                continue
+            queries.append(row["query"])
+            if len(queries) >= limit:
+                break
+        return queries
+
+    def get_state(self, key, default=None):
+        """Load a JSON value saved with put_state (e.g. the strategy bandit's posterior)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put_state(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0]
@@ -0,0 +1,582 @@
+"""
+Summary tables for aggregations that dashboards run over and over.
+
+A dashboard that refreshes every few seconds re-joins and re-aggregates the
+whole fact table each time, although only a handful of rows changed. A
+summary table stores the aggregation at a finer grain (every column the
+queries group or filter on) together with re-aggregatable measures
+(COUNT(*), SUM, COUNT, MIN, MAX), so each query becomes a small GROUP BY over
+the summary:
+
+    COUNT(*)  -> SUM(cnt)          AVG(r.stops) -> SUM(sum_r_stops) / SUM(cnt_r_stops)
+
+find_repeated_aggregations() groups a workload by join skeleton,
+design_summary() builds the table definition and its refresh, either a delta
+from a watermark column (an AUTO_INCREMENT id or insert timestamp of the
+fact table), triggers on the fact table or a full rebuild.
+summary_rewrite() points matching queries at the summary and
+evaluate_summary() compares their latency with the refresh cost.
+"""
+
+import hashlib
+import re
+import time
+
+from .analyzer import (build_from, build_select, fetch_column_types, mask_query, parse_query_shape,
+                       referenced_columns, split_clauses, split_from_items, split_top_level_and)
+from .optimizer import MAX_KEY_BYTES, column_key_bytes
+
+SUMMARY_PREFIX = "autoopt_sum_"
+SUMMARY_STATE_TABLE = "autoopt_summary_state"
+REFRESH_MODES = ("watermark", "trigger", "full")
+
+_COLUMN_RE = re.compile(r'(?<![\w.`@])(?:`?(\w+)`?\s*\.\s*)?`?([a-z_]\w*)`?(?!\w|\s*[(.])', re.IGNORECASE)
+_AGG_CALL_RE = re.compile(r'\b(count|sum|avg|min|max)\s*\(\s*(distinct\s+)?(\*|(?:`?\w+`?\s*\.\s*)?`?\w+`?)\s*\)',
+                          re.IGNORECASE)
+_OTHER_AGG_RE = re.compile(r'\b(count|sum|avg|min|max|group_concat|std\w*|var\w*|bit_\w+|json_\w*agg)\s*\(|'
+                           r'\bover\s*\(', re.IGNORECASE)
+_JOIN_CONDITION_RE = re.compile(r'^\s*`?(\w+)`?\s*\.\s*`?(\w+)`?\s*=\s*`?(\w+)`?\s*\.\s*`?(\w+)`?\s*$')
+
+
+def _blanked(text):
+    """mask_query with literal contents blanked too, so they can't look like identifiers."""
+    return re.sub(r"'x*'|\"x*\"", lambda m: ' ' * len(m.group(0)), mask_query(text))
+
+
+def _replace(text, pattern, replacement):
+    """Like pattern.sub(replacement, text) outside literals and comments; replacement may return None to skip."""
+    out, last = [], 0
+    for m in pattern.finditer(_blanked(text)):
+        new = replacement(m)
+        if new is None:
+            continue
+        out += [text[last:m.start()], new]
+        last = m.end()
+    return "".join(out + [text[last:]])
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def measure_column(kind, alias=None, column=None):
+    """Summary column name of a measure: cnt for COUNT(*), else <kind>_<alias>_<column>."""
+    return "cnt" if alias is None else f"{kind}_{alias}_{column}"
+
+
+def aggregation_shape(query):
+    """Split a GROUP BY query into what a summary table needs.
+
+    Returns {"key", "from", "fact", "fact_alias", "joins", "filters": [(text, rewritten, {(alias, column)})],
+    "grain": {(alias, column)}, "measures": {(kind, alias, column)}, "distinct", "clauses"}, where
+    clauses are the query's clauses rewritten to summary columns. The fact table is the first table of
+    the FROM clause. Raises ValueError for queries a summary can't answer.
+    """
+    clauses = split_clauses(query)
+    if not clauses.get("group by"):
+        raise ValueError("no GROUP BY")
+    if re.search(r'\(\s*select\b', mask_query(query), re.IGNORECASE):
+        raise ValueError("subqueries aren't supported")
+    if re.search(r'\bwith\s+rollup\b', clauses["group by"], re.IGNORECASE):
+        raise ValueError("WITH ROLLUP isn't supported")
+    items = split_from_items(clauses["from"])
+    if any(item["table"] is None for item in items):
+        raise ValueError("derived tables aren't supported")
+    if any(item["join"] and "RIGHT" in item["join"] for item in items):
+        raise ValueError("RIGHT JOIN can drop fact rows")
+    aliases = {item["alias"].lower(): item["table"].lower() for item in items}
+    fact_alias = items[0]["alias"].lower()
+    referenced = referenced_columns(query)
+    if referenced["unresolved"]:
+        raise ValueError(f"qualify the columns {', '.join(sorted(referenced['unresolved']))}")
+    single = len(aliases) == 1
+    table_columns = referenced["columns"].get(aliases[fact_alias], set()) if single else set()
+
+    grain, measures, distinct = set(), {("cnt", None, None)}, False
+
+    def ref(qualifier, column):
+        qualifier, column = (qualifier or "").lower(), column.lower()
+        if qualifier:
+            return (qualifier, column) if qualifier in aliases else None
+        return (fact_alias, column) if single and column in table_columns else None
+
+    def aggregate(m):
+        nonlocal distinct
+        function, argument = m.group(1).lower(), m.group(3)
+        if argument == "*":
+            if function != "count" or m.group(2):
+                raise ValueError(f"unsupported aggregate {m.group(0)}")
+            return "SUM(`cnt`)"
+        arg = re.fullmatch(r'(?:`?(\w+)`?\s*\.\s*)?`?(\w+)`?', argument.strip())
+        found = ref(arg.group(1), arg.group(2))
+        if found is None:
+            raise ValueError(f"can't resolve {m.group(0)}")
+        alias, col = found
+        if m.group(2) and function in ("count", "sum", "avg"):
+            # The column joins the grain; groups whose count dropped to 0 don't count
+            grain.add(found)
+            distinct = True
+            return f"{function.upper()}(DISTINCT IF(`cnt` > 0, `{alias}_{col}`, NULL))"
+        if function == "avg":
+            measures.update({("sum", alias, col), ("cnt", alias, col)})
+            return f"(SUM(`sum_{alias}_{col}`) / SUM(`cnt_{alias}_{col}`))"
+        kind = "cnt" if function == "count" else function
+        measures.add((kind, alias, col))
+        return f"{'SUM' if kind in ('cnt', 'sum') else function.upper()}(`{measure_column(kind, alias, col)}`)"
+
+    def rewrite(text, columns):
+        blanked = _blanked(text)
+        handled = {m.start() for m in _AGG_CALL_RE.finditer(blanked)}
+        for m in _OTHER_AGG_RE.finditer(blanked):
+            if m.start() not in handled:
+                raise ValueError(f"unsupported aggregate in {_normalize(text)[:60]}")
+
+        def column(m):
+            found = ref(m.group(1), m.group(2))
+            if found is None:
+                return None
+            columns.add(found)
+            return f"`{found[0]}_{found[1]}`"
+
+        return _replace(_replace(text, _AGG_CALL_RE, aggregate), _COLUMN_RE, column)
+
+    joins, filters = [], []
+    for conjunct in split_top_level_and(clauses.get("where", "")):
+        m = _JOIN_CONDITION_RE.match(conjunct)
+        if m and {m.group(1).lower(), m.group(3).lower()} <= set(aliases) and m.group(1).lower() != m.group(3).lower():
+            joins.append(_normalize(conjunct))
+            continue
+        columns = set()
+        filters.append((_normalize(conjunct), rewrite(conjunct, columns), columns))
+
+    select = []
+    for item in parse_query_shape(query)["select"]:
+        expr = item["expr"]
+        if re.fullmatch(r'\s*(?:`?\w+`?\s*\.\s*)?\*\s*', expr):
+            raise ValueError("SELECT * isn't supported")
+        plain = re.fullmatch(r'\s*(?:`?\w+`?\s*\.\s*)?`?(\w+)`?\s*', expr)
+        name = item["alias"] or (plain.group(1) if plain else _normalize(expr))
+        # Keep every result column's name: a.country is `a_country` in the summary
+        select.append(f"{rewrite(expr, grain)} AS `{name.replace('`', '``')}`")
+    modifier = re.match(r'\s*((?:distinct|distinctrow)\s+)', clauses["select"], re.IGNORECASE)
+    rewritten = {"select": (modifier.group(1).upper() if modifier else "") + ", ".join(select)}
+    for name in ("group by", "having", "order by"):
+        if clauses.get(name):
+            rewritten[name] = rewrite(clauses[name], grain)
+    if clauses.get("limit"):
+        rewritten["limit"] = clauses["limit"]
+
+    skeleton = _normalize(clauses["from"]).lower() + "|" + "|".join(sorted(j.lower() for j in joins))
+    return {"key": hashlib.md5(skeleton.encode()).hexdigest(), "from": clauses["from"], "fact": aliases[fact_alias],
+            "fact_alias": fact_alias, "joins": joins, "filters": filters, "grain": grain, "measures": measures,
+            "distinct": distinct, "clauses": rewritten}
+
+
+def find_repeated_aggregations(queries, min_count=3, skipped=None):
+    """Group a workload's GROUP BY queries by join skeleton (FROM clause and join conditions).
+
+    queries are strings or (query, weight) pairs, e.g. LearningStore.query_history().
+    Returns [{"key", "from", "fact", "weight", "queries": {query: weight}}] for
+    groups with a total weight of at least min_count, heaviest first. GROUP BY
+    queries no summary can answer are appended to skipped as (query, reason).
+    """
+    groups = {}
+    for item in queries:
+        query, weight = item if isinstance(item, tuple) else (item, None)
+        weight = 1.0 if weight is None else float(weight)
+        try:
+            shape = aggregation_shape(query)
+        except ValueError as e:
+            if skipped is not None and re.search(r'\bgroup\s+by\b', mask_query(query), re.IGNORECASE):
+                skipped.append((query, str(e)))
+            continue
+        group = groups.setdefault(shape["key"], {"key": shape["key"], "from": shape["from"], "fact": shape["fact"],
+                                                 "weight": 0.0, "queries": {}})
+        group["weight"] += weight
+        text = query.strip().rstrip(";").strip()
+        group["queries"][text] = group["queries"].get(text, 0.0) + weight
+    return sorted((g for g in groups.values() if g["weight"] >= min_count), key=lambda g: -g["weight"])
+
+
+def watermark_column(conn, table):
+    """An ever-increasing column of table for delta refreshes: AUTO_INCREMENT, else an insert timestamp."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COLUMN_NAME, DATA_TYPE, COLUMN_DEFAULT, EXTRA FROM information_schema.COLUMNS "
+                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (table,))
+        columns = cursor.fetchall()
+    for name, _type, _default, extra in columns:
+        if "auto_increment" in str(extra or "").lower():
+            return name.lower()
+    for name, data_type, default, extra in columns:
+        # ON UPDATE timestamps move on updates too, which a delta would count twice
+        if data_type.lower() in ("timestamp", "datetime") and "current_timestamp" in str(default or "").lower() \
+                and "on update" not in str(extra or "").lower():
+            return name.lower()
+    return None
+
+
+def _summary_name(fact, key):
+    return f"{(SUMMARY_PREFIX + fact)[:52]}_{key[:8]}"
+
+
+def design_summary(conn, group, refresh="auto"):
+    """Summary table definition and refresh plan for a find_repeated_aggregations() group.
+
+    refresh is "watermark" (delta of the fact rows past the last refresh; needs
+    an append-only fact table), "trigger" (AFTER INSERT/UPDATE/DELETE triggers
+    on the fact table; deletes and updates need invertible measures, i.e. no
+    MIN/MAX) or "full" (rebuild). "auto" picks watermark when the fact table
+    has a watermark column, else triggers. Filters every query shares are
+    built into the summary; the columns of the others join the grain.
+    Returns {"name", "fact", "fact_alias", "from", "joins", "baked", "grain",
+    "measures", "refresh", "watermark", "unique_key", "select", "create",
+    "triggers", "queries", "weight", "notes"}.
+    """
+    shapes = [aggregation_shape(q) for q in group["queries"]]
+    baked = set.intersection(*({text for text, _, _ in s["filters"]} for s in shapes))
+    grain, measures = set(), set()
+    for shape in shapes:
+        grain |= shape["grain"]
+        measures |= shape["measures"]
+        for text, _, columns in shape["filters"]:
+            if text not in baked:
+                grain |= columns
+    first = shapes[0]
+    summary = {
+        "name": _summary_name(first["fact"], group["key"]), "key": group["key"],
+        "fact": first["fact"], "fact_alias": first["fact_alias"],
+        "from": first["from"], "joins": first["joins"], "baked": sorted(baked),
+        "grain": sorted(grain), "measures": sorted(measures, key=lambda m: (m[1] is not None, m)),
+        "queries": dict(group["queries"]), "weight": group["weight"], "notes": [],
+    }
+
+    aliases = {item["alias"].lower(): item["table"].lower() for item in split_from_items(first["from"])}
+    types = fetch_column_types(conn, set(aliases.values()))
+    grain_types = [types.get((aliases[a], c), ("varchar", "varchar(255)")) for a, c in grain]
+    summary["unique_key"] = (len(grain) <= 32 and sum(column_key_bytes(t) for _, t in grain_types) <= MAX_KEY_BYTES
+                             and not any(d.endswith(("text", "blob")) or d in ("json", "geometry")
+                                         for d, _ in grain_types))
+    if not summary["unique_key"]:
+        summary["notes"].append("The grain is too wide for a unique key: refreshes append rows instead of merging.")
+
+    invertible = not any(kind in ("min", "max") for kind, _, _ in measures)
+    summary["watermark"] = watermark_column(conn, summary["fact"])
+    if refresh == "auto":
+        refresh = "watermark" if summary["watermark"] else "trigger"
+    if refresh not in REFRESH_MODES:
+        raise ValueError(f"refresh must be one of {REFRESH_MODES} or 'auto'")
+    if refresh == "watermark" and not summary["watermark"]:
+        raise ValueError(f"{summary['fact']} has no AUTO_INCREMENT or insert-timestamp column")
+    summary["refresh"] = refresh
+
+    summary["select"] = summary_select(summary)
+    summary["create"] = _create_statement(summary, summary["select"])
+
+    summary["triggers"] = []
+    if refresh == "trigger":
+        columns = sorted(c for t, c in types if t == summary["fact"])
+        insert = _merge_statement(summary, summary_select(summary, from_text=_row_source(summary, "NEW", columns)))
+        delete = _merge_statement(summary, summary_select(summary, sign=-1,
+                                                          from_text=_row_source(summary, "OLD", columns)))
+        name, fact = summary["name"], summary["fact"]
+        summary["triggers"].append(f"CREATE TRIGGER `{name}_ai` AFTER INSERT ON `{fact}` FOR EACH ROW {insert}")
+        # Undoing a row leaves groups at count 0, which DISTINCT only skips when they are merged
+        if invertible and (summary["unique_key"] or not any(s["distinct"] for s in shapes)):
+            summary["triggers"].append(f"CREATE TRIGGER `{name}_ad` AFTER DELETE ON `{fact}` FOR EACH ROW {delete}")
+            summary["triggers"].append(f"CREATE TRIGGER `{name}_au` AFTER UPDATE ON `{fact}` FOR EACH ROW "
+                                       f"BEGIN {delete}; {insert}; END")
+        else:
+            summary["notes"].append("MIN/MAX or DISTINCT can't be undone row by row: only inserts are maintained, "
+                                    "run refresh_summary(full=True) after updates or deletes.")
+    if refresh != "full":
+        summary["notes"].append(f"Only changes to {summary['fact']} are tracked; "
+                                "refresh_summary(full=True) after editing the joined tables.")
+    return summary
+
+
+def summary_select(summary, sign=1, from_text=None, extra_where=()):
+    """The SELECT computing the summary rows (negated measures with sign=-1)."""
+    minus = "-" if sign < 0 else ""
+    columns = [f"`{a}`.`{c}` AS `{a}_{c}`" for a, c in summary["grain"]]
+    for kind, alias, col in summary["measures"]:
+        if alias is None:
+            expr = "COUNT(*)"
+        else:
+            expr = {"cnt": "COUNT", "sum": "SUM", "min": "MIN", "max": "MAX"}[kind] + f"(`{alias}`.`{col}`)"
+        columns.append(f"{minus}{expr} AS `{measure_column(kind, alias, col)}`")
+    clauses = {"select": ", ".join(columns), "from": summary["from"],
+               "group by": ", ".join(f"`{a}`.`{c}`" for a, c in summary["grain"])}
+    where = summary["joins"] + summary["baked"] + list(extra_where)
+    return build_select(clauses, from_text=from_text, extra_where=where)
+
+
+def _row_source(summary, pseudo, columns):
+    """The FROM clause with the fact table replaced by the trigger's NEW/OLD row."""
+    items = split_from_items(summary["from"])
+    row = ", ".join(f"{pseudo}.`{c}` AS `{c}`" for c in columns)
+    items[0]["ref"] = f"(SELECT {row}) AS `{items[0]['alias']}`"
+    return build_from(items)
+
+
+def _merge_statement(summary, select):
+    """INSERT ... SELECT adding select's rows into the summary (merged into existing groups with a unique key)."""
+    target = f"`{summary['name']}`"
+    names = [f"`{a}_{c}`" for a, c in summary["grain"]] + [f"`{measure_column(*m)}`" for m in summary["measures"]]
+    sql = f"INSERT INTO {target} ({', '.join(names)}) {select}"
+    if not summary["unique_key"]:
+        return sql
+    updates = []
+    for kind, alias, col in summary["measures"]:
+        name = f"`{measure_column(kind, alias, col)}`"
+        old, new = f"{target}.{name}", f"VALUES({name})"
+        if kind == "cnt":
+            updates.append(f"{old} = {old} + {new}")
+        elif kind == "sum":
+            updates.append(f"{old} = COALESCE({old} + {new}, {old}, {new})")
+        else:
+            function = "LEAST" if kind == "min" else "GREATEST"
+            updates.append(f"{old} = {function}(COALESCE({old}, {new}), COALESCE({new}, {old}))")
+    return sql + " ON DUPLICATE KEY UPDATE " + ", ".join(updates)
+
+
+def summary_rewrite(query, summary):
+    """query rewritten to read summary, or None when the summary can't answer it."""
+    try:
+        shape = aggregation_shape(query)
+    except ValueError:
+        return None
+    grain = set(summary["grain"])
+    if shape["key"] != summary["key"] or not shape["measures"] <= set(summary["measures"]) \
+            or not shape["grain"] <= grain:
+        return None
+    if not set(summary["baked"]) <= {text for text, _, _ in shape["filters"]}:
+        return None
+    where = []
+    for text, rewritten, columns in shape["filters"]:
+        if text in summary["baked"]:
+            continue
+        if not columns <= grain:
+            return None
+        where.append(rewritten)
+    clauses = dict(shape["clauses"])
+    # Groups whose rows were all deleted stay behind with a count of 0
+    clauses["having"] = "SUM(`cnt`) > 0" + (f" AND ({clauses['having']})" if clauses.get("having") else "")
+    return build_select(clauses, from_text=f"`{summary['name']}`", extra_where=where)
+
+
+def _state_table(cursor):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {SUMMARY_STATE_TABLE} ("
+                   "name VARCHAR(64) NOT NULL PRIMARY KEY, watermark VARCHAR(64) NOT NULL, "
+                   "refreshed_at DATETIME NOT NULL)")
+
+
+def load_watermark(conn, name):
+    """The watermark of the last refresh of summary name (as text), or None."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT watermark FROM {SUMMARY_STATE_TABLE} WHERE name = %s", (name,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _save_watermark(conn, name, watermark):
+    # Same transaction as the merge it records (no DDL here: that would commit)
+    with conn.cursor() as cursor:
+        cursor.execute(f"REPLACE INTO {SUMMARY_STATE_TABLE} (name, watermark, refreshed_at) VALUES (%s, %s, NOW())",
+                       (name, str(watermark)))
+
+
+def _max_watermark(conn, summary):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(`{summary['watermark']}`) FROM `{summary['fact']}`")
+        return cursor.fetchone()[0]
+
+
+def _bounded(summary, high, low=None):
+    """Conditions restricting the fact rows to watermarks in (low, high]."""
+    if high is None:
+        return ["1 = 0"]  # empty fact table
+
+    def literal(value):
+        text = str(value)
+        if re.fullmatch(r'-?\d+', text):
+            return text
+        return "'" + text.replace("\\", "\\\\").replace("'", "''") + "'"
+
+    column = f"`{summary['fact_alias']}`.`{summary['watermark']}`"
+    conditions = [f"{column} <= {literal(high)}"]
+    if low is not None:
+        conditions.append(f"{column} > {literal(low)}")
+    return conditions
+
+
+def _create_statement(summary, select):
+    keys = ", ".join(f"`{a}_{c}`" for a, c in summary["grain"])
+    unique = f"(UNIQUE KEY `grain` ({keys})) " if summary["unique_key"] else ""
+    return f"CREATE TABLE `{summary['name']}` {unique}{select}"
+
+
+def _drop(cursor, name):
+    for suffix in ("ai", "ad", "au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS `{name}_{suffix}`")
+    cursor.execute(f"DROP TABLE IF EXISTS `{name}`")
+
+
+def create_summary(conn, summary, verbose=True):
+    """Create and fill the summary table (replacing an old one) and install its triggers.
+
+    Returns {"name", "rows", "seconds", "watermark"}. Rows the fact table gains
+    between filling the table and creating the triggers are missed: create
+    trigger-refreshed summaries in a quiet period.
+    """
+    name = summary["name"]
+    t0 = time.perf_counter()
+    watermark = None
+    with conn.cursor() as cursor:
+        _drop(cursor, name)
+        _state_table(cursor)
+    if summary["refresh"] == "watermark":
+        watermark = _max_watermark(conn, summary)
+        create = _create_statement(summary, summary_select(summary, extra_where=_bounded(summary, watermark)))
+    else:
+        create = summary["create"]
+    with conn.cursor() as cursor:
+        cursor.execute(create)
+        for statement in summary["triggers"]:
+            cursor.execute(statement)
+        cursor.execute(f"SELECT COUNT(*) FROM `{name}`")
+        rows = int(cursor.fetchone()[0])
+    if watermark is not None:
+        _save_watermark(conn, name, watermark)
+    conn.commit()
+    seconds = time.perf_counter() - t0
+    if verbose:
+        print(f"✓ Created {name}: {rows:,} rows in {seconds:.2f}s ({summary['refresh']} refresh)")
+    return {"name": name, "rows": rows, "seconds": seconds, "watermark": watermark}
+
+
+def refresh_summary(conn, summary, full=False, verbose=True):
+    """Bring the summary up to date and return {"refresh", "rows", "seconds", "watermark"}.
+
+    Watermark summaries merge the fact rows past the stored watermark up to the
+    current maximum (this assumes ids or timestamps are committed roughly in
+    order); full=True or refresh="full" rebuilds the summary in one
+    transaction. Trigger summaries are always current, so only full=True does
+    anything for them.
+    """
+    name = summary["name"]
+    mode = "full" if full else summary["refresh"]
+    t0 = time.perf_counter()
+    rows, watermark = 0, None
+    if mode == "full":
+        extra = []
+        if summary["refresh"] == "watermark":
+            watermark = _max_watermark(conn, summary)
+            extra = _bounded(summary, watermark)
+        names = [f"`{a}_{c}`" for a, c in summary["grain"]] + [f"`{measure_column(*m)}`" for m in summary["measures"]]
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM `{name}`")
+            cursor.execute(f"INSERT INTO `{name}` ({', '.join(names)}) {summary_select(summary, extra_where=extra)}")
+            rows = cursor.rowcount
+    elif mode == "watermark":
+        low, watermark = load_watermark(conn, name), _max_watermark(conn, summary)
+        if watermark is not None and str(watermark) != low:
+            select = summary_select(summary, extra_where=_bounded(summary, watermark, low))
+            with conn.cursor() as cursor:
+                cursor.execute(_merge_statement(summary, select))
+                rows = cursor.rowcount
+    if watermark is not None:
+        _save_watermark(conn, name, watermark)
+    conn.commit()
+    seconds = time.perf_counter() - t0
+    if verbose:
+        print(f"✓ Refreshed {name} ({mode}): {rows:,} rows in {seconds:.3f}s")
+    return {"refresh": mode, "rows": rows, "seconds": seconds, "watermark": watermark}
+
+
+def drop_summary(conn, summary):
+    """Drop the summary table, its triggers and its watermark."""
+    with conn.cursor() as cursor:
+        _drop(cursor, summary["name"])
+        _state_table(cursor)
+        cursor.execute(f"DELETE FROM {SUMMARY_STATE_TABLE} WHERE name = %s", (summary["name"],))
+    conn.commit()
+
+
+def evaluate_summary(conn, summary, runs=3, verbose=True):
+    """Time each query against its summary rewrite and weigh the saving against the refresh cost.
+
+    Returns {"queries": [{"query", "rewrite", "before", "after", "speedup", "weight"}],
+    "saved_per_run", "refresh_seconds", "break_even_runs", "summary_rows", "fact_rows"}.
+    saved_per_run is the weighted mean saving per query execution and
+    break_even_runs the executions one refresh needs to pay for itself
+    (None for trigger summaries, whose cost lands on the writes instead).
+    """
+    from .core import benchmark_query
+
+    report = {"queries": [], "saved_per_run": None, "refresh_seconds": None, "break_even_runs": None}
+    saved, total_weight = 0.0, 0.0
+    for query, weight in summary["queries"].items():
+        rewrite = summary_rewrite(query, summary)
+        if rewrite is None:
+            continue
+        before = benchmark_query(conn, query, runs)["median"]
+        after = benchmark_query(conn, rewrite, runs)["median"]
+        report["queries"].append({"query": query, "rewrite": rewrite, "before": before, "after": after,
+                                  "speedup": before / after if after else None, "weight": weight})
+        saved += weight * (before - after)
+        total_weight += weight
+        if verbose:
+            print(f"  {before * 1000:8.1f} ms -> {after * 1000:7.1f} ms  {' '.join(query.split())[:70]}")
+    if total_weight:
+        report["saved_per_run"] = saved / total_weight
+
+    if summary["refresh"] != "trigger":
+        report["refresh_seconds"] = refresh_summary(conn, summary, verbose=False)["seconds"]
+        if report["saved_per_run"] and report["saved_per_run"] > 0:
+            report["break_even_runs"] = report["refresh_seconds"] / report["saved_per_run"]
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM `{summary['name']}`")
+        report["summary_rows"] = int(cursor.fetchone()[0])
+        cursor.execute(f"SELECT COUNT(*) FROM `{summary['fact']}`")
+        report["fact_rows"] = int(cursor.fetchone()[0])
+
+    if verbose and report["saved_per_run"] is not None:
+        print(f"✓ {report['saved_per_run'] * 1000:.1f} ms saved per query on {report['summary_rows']:,} summary rows "
+              f"(fact table: {report['fact_rows']:,})")
+        if report["break_even_runs"] is not None:
+            print(f"  {summary['refresh']} refresh: {report['refresh_seconds'] * 1000:.1f} ms, "
+                  f"repaid after {report['break_even_runs']:.1f} query runs")
+        elif summary["refresh"] == "trigger":
+            print("  trigger refresh: no refresh runs; each write to "
+                  f"{summary['fact']} also updates the summary")
+    return report
+
+
+def summary_advice(conn, queries, min_count=3, refresh="auto", apply=False, runs=3, verbose=True):
+    """Find repeated aggregations in a workload and design (apply=True: create and evaluate) their summaries.
+
+    Returns the design_summary() dicts, with "created" and "evaluation" when applied.
+    """
+    summaries, skipped = [], []
+    groups = find_repeated_aggregations(queries, min_count, skipped)
+    if verbose:
+        for query, reason in skipped:
+            print(f"ℹ No summary for {' '.join(query.split())[:60]}...: {reason}")
+    for group in groups:
+        try:
+            summary = design_summary(conn, group, refresh)
+        except ValueError as e:
+            if verbose:
+                print(f"✗ {group['fact']}: {e}")
+            continue
+        summaries.append(summary)
+        if verbose:
+            grain = ", ".join(f"{a}.{c}" for a, c in summary["grain"])
+            print(f"💡 {len(summary['queries'])} queries ({summary['weight']:g} runs) aggregate {summary['fact']} "
+                  f"by ({grain}): summary {summary['name']}, {summary['refresh']} refresh")
+            for note in summary["notes"]:
+                print(f"   ℹ {note}")
+        if apply:
+            summary["created"] = create_summary(conn, summary, verbose)
+            summary["evaluation"] = evaluate_summary(conn, summary, runs, verbose)
+    return summaries
@@ -0,0 +1,71 @@
+import re
+from .analyzer import fingerprint_query
+
+
+def split_statements(text):
+    """Split a block of SQL text into individual statements."""
+    import sqlparse
+
+    statements = []
+    for stmt in sqlparse.split(text):
+        stmt = stmt.strip().rstrip(';').strip()
+        if stmt:
+            statements.append(stmt)
+    return statements
+
+
+def iter_slow_log(lines):
+    """Yield (query, query_time) pairs from a MariaDB/MySQL slow query log."""
+    query_time = None
+    buf = []
+    for line in lines:
+        if line.startswith('#'):
+            m = re.search(r'Query_time:\s*([\d.]+)', line)
+            if m:
+                query_time = float(m.group(1))
+            continue
+
+        stripped = line.strip()
+        if not buf:
+            # Session bookkeeping written before every statement
+            lowered = stripped.lower()
+            if not stripped or lowered.startswith(('set timestamp=', 'use ')):
+                continue
+            if re.match(r'^(/\S+|tcp port:|time\s+id\s+command)', lowered):
+                continue
+
+        buf.append(line.rstrip('\n'))
+        if stripped.endswith(';'):
+            query = '\n'.join(buf).strip().rstrip(';').strip()
+            buf = []
+            if query:
+                yield query, query_time
+            query_time = None
+
+    if buf:
+        query = '\n'.join(buf).strip().rstrip(';').strip()
+        if query:
+            yield query, query_time
+
+
+def dedupe_queries(queries):
+    """Group queries by fingerprint, keeping the first text seen for each shape.
+
+    Accepts plain query strings or (query, query_time) pairs and returns a dict
+    of fingerprint -> {"query", "count", "total_time"} in first-seen order.
+    """
+    unique = {}
+    for item in queries:
+        if isinstance(item, tuple):
+            query, query_time = item
+        else:
+            query, query_time = item, None
+
+        fp = fingerprint_query(query)
+        entry = unique.get(fp)
+        if entry is None:
+            entry = unique[fp] = {"query": query, "count": 0, "total_time": None}
+        entry["count"] += 1
+        if query_time is not None:
+            entry["total_time"] = (entry["total_time"] or 0.0) + query_time
+    return unique
@@ -26,7 +26,6 @@ print(" Packages installed and warnings suppressed!")
 import os
 import time
 import json
-import hashlib
 import statistics
 import re
 
@@ -53,13 +52,50 @@ print(" Libraries imported successfully!")
 # 🔹 SMART AUTO-OPTIMIZER DECISION ENGINE
 # ---------------------------------------------
 
-# Global query history for learning
-query_history = {}
+# Persistent learning store (SQLite file, shared across sessions via AUTOOPT_STORE)
+from mariadb_autoopt.store import LearningStore
 
+learning_store = LearningStore()
 
-def get_query_hash(query):
-    """Create a hash of the query for tracking performance history"""
-    return hashlib.md5(query.strip().encode()).hexdigest()[:10]
+# Strategy selection bandit, its posterior kept in the same store
+from mariadb_autoopt.analyzer import nonsargable_columns, plan_cost, run_explain
+from mariadb_autoopt.bandit import StrategyBandit, speedup_reward, strategy_context
+
+strategy_bandit = StrategyBandit.load(learning_store)
+
+# Latency model trained on the benchmark history in the same store
+from mariadb_autoopt.predictor import LatencyModel, record_benchmark
+
+latency_model = LatencyModel()
+
+# Optimizer cost -> seconds on this database host (micro-benchmarked once, then stored)
+from mariadb_autoopt.calibration import load_or_calibrate
+from mariadb_autoopt.explore import explore_variants
+from mariadb_autoopt.rewrite import find_correlated_subqueries, rewrite_advice
+from mariadb_autoopt.core import create_covering_indexes, create_order_indexes
+
+# Queries the calibrated cost model puts under this wall time aren't worth indexing
+# (the old "cost < 50" rule, expressed in seconds so it holds on any hardware)
+FAST_QUERY_SECONDS = 0.05
+host_calibration = None
+
+STRATEGY_LABELS = {
+    "analyze_only": "Analysis Only (no indexes)",
+    "join_optimize": "Join Optimization (focus on foreign keys)",
+    "aggregation_optimize": "Aggregation Optimization (group by indexes)",
+    "critical_optimize": "Critical Optimization (high-cost query)",
+    "selective_optimize": "Selective Optimization (targeted indexes)",
+}
+
+# The kinds of index each strategy may build in create_smart_indexes()
+STRATEGY_INDEXES = {
+    "join_optimize": ("join_key",),
+    "aggregation_optimize": ("ordered",),
+    "critical_optimize": ("composite", "join_key", "filter", "covering", "ordered"),
+    "selective_optimize": ("composite", "filter"),
+}
+JOIN_KEY_COLUMNS = ['source_airport_id', 'dest_airport_id', 'airline_id']
+FILTER_COLUMNS = ['country', 'city', 'stops', 'active']
 
 
 def detect_table_size(conn, table_name="routes"):
@@ -102,10 +138,9 @@ def get_query_cost(conn, query):
             cursor.execute(f"EXPLAIN FORMAT=JSON {query}")
             result = cursor.fetchone()
             if result and result[0]:
-                explain_data = json.loads(result[0])
-                cost = explain_data.get('query_block', {}).get('cost_info', {}).get('query_cost', None)
+                cost = plan_cost(json.loads(result[0]))
                 if cost:
-                    return float(cost)
+                    return cost
     except Exception as e:
         print(f" Could not get query cost: {e}")
 
@@ -124,8 +159,24 @@ def get_query_cost(conn, query):
     return base_cost
 
 
+def get_host_calibration(conn):
+    """Load (or run, the first time on this server) the cost-to-seconds calibration"""
+    global host_calibration
+    if host_calibration is None:
+        try:
+            print(" Calibrating optimizer cost for this host (first run only)...")
+            host_calibration = load_or_calibrate(conn, learning_store)
+            print(f" Calibration for {host_calibration.host}: "
+                  f"{host_calibration.cost_fit[1] * 1000:.4f} ms per cost unit, "
+                  f"median error {host_calibration.relative_error():.0%}")
+        except Exception as e:
+            print(f" Cost calibration unavailable: {e}")
+            host_calibration = False
+    return host_calibration or None
+
+
 def enhanced_optimization_strategy(conn, query):
-    """Enhanced strategy that focuses on actual performance bottlenecks"""
+    """Pick a strategy with a contextual bandit learned from past rewards on this host"""
     size_label, rows = detect_table_size(conn)
     query_type = detect_query_type(query)
     cost = get_query_cost(conn, query)
@@ -134,22 +185,38 @@ def enhanced_optimization_strategy(conn, query):
     print(f" Query Type: {query_type}")
     print(f" Estimated Query Cost: {cost:.1f}")
 
-    # More conservative strategy
-    if size_label == "small" or cost < 50:
-        print(" Mode: Analysis Only (query already efficient)")
-        return "analyze_only"
-    elif query_type == "join" and rows > 10000:
-        print(" Mode: Join Optimization (focus on foreign keys)")
-        return "join_optimize"
-    elif query_type == "aggregation" and "GROUP BY" in query.upper():
-        print(" Mode: Aggregation Optimization (group by indexes)")
-        return "aggregation_optimize"
-    elif cost > 1000:
-        print(" Mode: Critical Optimization (high-cost query)")
-        return "critical_optimize"
-    else:
-        print("⚡ Mode: Selective Optimization (targeted indexes)")
-        return "selective_optimize"
+    calibration = get_host_calibration(conn)
+    if calibration is not None:
+        est_seconds = calibration.cost_to_seconds(cost)
+        print(f" Calibrated Estimate: {est_seconds:.3f}s on {calibration.host}")
+        if est_seconds < FAST_QUERY_SECONDS:
+            print(f" Mode: {STRATEGY_LABELS['analyze_only']} (estimated under {FAST_QUERY_SECONDS}s)")
+            return "analyze_only", None
+
+    try:
+        explain_df, _ = run_explain(conn, query, analyze=False)
+    except Exception:
+        explain_df = None
+    context = strategy_context(rows, cost, query, explain_df)
+
+    # Thompson sampling: explores while uncertain, exploits once rewards are known
+    strategy, _ = strategy_bandit.choose(context)
+    expected = strategy_bandit.expected_rewards(context)
+    print(f" Mode: {STRATEGY_LABELS[strategy]} "
+          f"(expected reward {expected[strategy]:+.3f}, tried {strategy_bandit.pulls[strategy]}x)")
+    return strategy, context
+
+
+def record_strategy_reward(strategy, context, before_times=None, after_times=None, build_seconds=0.0):
+    """Feed the validated speedup per index build cost back into the bandit and persist it"""
+    if context is None:
+        # Decided by the calibrated fast-query rule, not by the bandit
+        return None
+    reward = speedup_reward(before_times, after_times, build_seconds)
+    strategy_bandit.update(strategy, context, reward)
+    strategy_bandit.save(learning_store)
+    print(f" Bandit reward for {strategy}: {reward:+.3f}")
+    return reward
 
 
 def get_actual_columns_from_query(conn, query):
@@ -212,12 +279,18 @@ def get_actual_columns_from_query(conn, query):
                 actual_columns.append((actual_table, column))
                 print(f"    Column found: {actual_table}.{column}")
 
+    # Drop columns the WHERE clause only uses inside a function or LIKE '%...': an index can't serve them
+    unusable = nonsargable_columns(query)
+    for table, column in sorted(set(actual_columns) & unusable):
+        print(f"    Skipping {table}.{column}: only used in non-sargable predicates")
+
     # Remove duplicates and return
-    return list(set(actual_columns))
+    return list(set(actual_columns) - unusable)
 
 
-def create_smart_indexes(conn, query):
-    """Create indexes based on actual query patterns with table validation"""
+def create_smart_indexes(conn, query, strategy="critical_optimize"):
+    """Create the kinds of index the strategy allows (STRATEGY_INDEXES) for the query's columns"""
+    kinds = STRATEGY_INDEXES.get(strategy, STRATEGY_INDEXES["critical_optimize"])
     actual_columns = get_actual_columns_from_query(conn, query)
     created_indexes = []
 
@@ -262,7 +335,7 @@ def create_smart_indexes(conn, query):
         print(f"    Creating indexes for {table}: {valid_columns}")
 
         # Create composite index for multiple columns
-        if len(valid_columns) >= 2:
+        if "composite" in kinds and len(valid_columns) >= 2:
             idx_name = f"idx_{table}_composite_{'_'.join(valid_columns[:2])}"
             composite_cols = ', '.join(valid_columns[:2])
             sql = f"CREATE INDEX {idx_name} ON {table} ({composite_cols})"
@@ -275,9 +348,9 @@ def create_smart_indexes(conn, query):
             except Exception as e:
                 print(f"   ️ Failed to create index {idx_name}: {e}")
 
-        # Also create single-column indexes for important columns
+        # Single-column indexes on join keys and on common filter columns
         for column in valid_columns:
-            if column in ['country', 'city', 'stops', 'active', 'source_airport_id', 'dest_airport_id', 'airline_id']:
+            if ("join_key" in kinds and column in JOIN_KEY_COLUMNS) or ("filter" in kinds and column in FILTER_COLUMNS):
                 idx_name = f"idx_{table}_{column}"
                 sql = f"CREATE INDEX {idx_name} ON {table} ({column})"
 
@@ -289,6 +362,26 @@ def create_smart_indexes(conn, query):
                 except Exception as e:
                     print(f"    Failed to create index {idx_name}: {e}")
 
+    # Covering indexes spare the row lookup per match; keep only those EXPLAIN reads index-only
+    covering = create_covering_indexes(conn, query, verbose=False) if "covering" in kinds else []
+    for candidate in covering:
+        if candidate["kept"]:
+            created_indexes.append(candidate["index"])
+            print(f"    Created covering index: {candidate['index']} ({', '.join(candidate['columns'])})")
+        elif candidate["status"] != "exists":
+            print(f"    Dropped covering index {candidate['index']}: {candidate['status']}")
+
+    # Ordered indexes for top-N ORDER BY ... LIMIT and GROUP BY MIN/MAX; kept when the sort disappears
+    ordered = create_order_indexes(conn, query, verbose=False) if "ordered" in kinds else []
+    for candidate in ordered:
+        if candidate["kept"]:
+            created_indexes.append(candidate["index"])
+            print(f"    Created {candidate['shape']} index: {candidate['index']} (no filesort/temporary)")
+        elif candidate["status"] == "advice":
+            print(f"    {candidate['note']}")
+        elif candidate["status"] not in ("exists", "not_needed"):
+            print(f"    Dropped {candidate['shape']} index {candidate['index']}: {candidate['status']}")
+
     return created_indexes
 
 
@@ -346,31 +439,80 @@ def filter_bad_suggestions(suggestions, query):
     return good_suggestions
 
 
-def record_query_performance(query_hash, before_time, after_time, strategy):
-    """Record query performance for learning"""
-    if before_time > 0 and after_time is not None:
-        # FIXED: Correct improvement calculation
-        if after_time < before_time:  # Actually faster
-            improvement = ((before_time - after_time) / before_time) * 100
-        else:  # Got slower
-            improvement = -((after_time - before_time) / before_time) * 100
-        query_history[query_hash] = {
-            'improvement': improvement,
-            'strategy': strategy,
-            'before_time': before_time,
-            'after_time': after_time,
-            'timestamp': time.time()
-        }
+def record_query_performance(query, before_times, after_times, strategy, indexes=()):
+    """Record measured query performance in the persistent learning store"""
+    if before_times and after_times:
+        learning_store.record_outcome(query, strategy, before_times, after_times, indexes=indexes)
 
 
-def reuse_learnings(query, current_strategy):
-    """Check if past optimizations worked for similar queries"""
-    query_sig = query.lower().split("where")[0].split("group by")[0].split("order by")[0].strip()
+def record_latency_sample(conn, query, stats):
+    """Add a benchmark and the plan it ran under to the latency model's training history"""
+    try:
+        record_benchmark(learning_store, conn, query, stats['times'])
+    except Exception as e:
+        print(f" Could not record latency sample: {e}")
+
+
+def predict_query_time(conn, query):
+    """Predict run time from the plan once enough benchmarks are stored (None until then)"""
+    try:
+        if latency_model.retrain(learning_store) is None:
+            return None
+        return latency_model.predict(conn, query)
+    except Exception as e:
+        print(f" Latency prediction unavailable: {e}")
+        return None
+
+
+def explore_without_indexes(conn, query):
+    """Try session settings, join orders and index hints when new indexes didn't pay off"""
+    print("\n Exploring optimizer settings and join orders instead...")
+    try:
+        exploration = explore_variants(conn, query, runs=3, max_orderings=6, verbose=False)
+    except Exception as e:
+        print(f" Exploration failed: {e}")
+        return None
+    best = exploration['best']
+    if best:
+        print(f" Best variant: {best['name']} ({best['speedup_pct']:.1f}% faster)")
+        print(f"    Lock it in with: {best['hint'][:200]}")
+    else:
+        print(" No setting or join order beat the current plan")
+    return best
 
-    for q_hash, history in query_history.items():
-        if history['improvement'] > 15:  # Only reuse strategies that worked well
-            print(f" Past optimization worked ({history['improvement']:.1f}% improvement) — reusing strategy")
-            return history['strategy']
+
+def advise_subquery_rewrite(conn, query):
+    """Suggest a JOIN rewrite for correlated subqueries, verified equivalent and benchmarked"""
+    if not find_correlated_subqueries(query):
+        return None
+    print("\n Correlated subqueries found - trying a pre-aggregated JOIN rewrite...")
+    try:
+        advice = rewrite_advice(conn, query, runs=3, verbose=False)
+    except Exception as e:
+        print(f" Rewrite check failed: {e}")
+        return None
+    if not advice['equivalent']:
+        print(f" Rewrite rejected: results differ ({advice['details']})")
+    else:
+        print(f" Rewrite returns the same {advice['details']['rows_original']:,} rows: "
+              f"{advice['before']['median']:.3f}s -> {advice['after']['median']:.3f}s "
+              f"({advice['improvement']:.1f}% faster)")
+        print(f"    Rewritten query: {advice['rewritten'][:300]}...")
+    return advice
+
+
+def reuse_learnings(query, current_strategy):
+    """Reuse the strategy that helped the most similar past queries (nearest-neighbour search)"""
+    # Only reuse strategies that worked well (>15% improvement)
+    proposal = learning_store.recommend(query, k=10, min_improvement=15)
+    if proposal['strategies']:
+        strategy, score = proposal['strategies'][0]
+        best, similarity = proposal['neighbours'][0]
+        print(f" Similar past query ({similarity:.0%} similar, {best['improvement']:.1f}% improvement) "
+              f"— reusing strategy {strategy}")
+        for index, _ in proposal['indexes'][:3]:
+            print(f"    Index that helped similar queries: {index}")
+        return strategy
 
     return current_strategy
 
@@ -379,19 +521,26 @@ def reuse_learnings(query, current_strategy):
 query_cache = {}
 
 
+# Connection settings shared by the demo connection and the loading pool
+DB_SETTINGS = {
+    'host': 'localhost',
+    'user': 'autoopt_user',
+    'password': 'rn8205',
+    'database': 'test_autoopt',
+    'local_infile': True,
+}
+
+
 # Enhanced database connection with retry logic
 def connect_to_database(max_retries=3):
     """Connect to database with comprehensive error handling and retry logic"""
     for attempt in range(max_retries):
         try:
             conn = pymysql.connect(
-                host='localhost',
-                user='autoopt_user',
-                password='rn8205',
-                database='test_autoopt',
                 autocommit=True,
                 connect_timeout=10,
-                charset='utf8mb4'
+                charset='utf8mb4',
+                **DB_SETTINGS
             )
             print(" Connected to database successfully!")
 
@@ -429,276 +578,31 @@ if not conn:
     print(" Cannot continue without database connection")
     exit(1)
 
-# ✅ STEP 1: LOAD OPENFLIGHTS DATASET
-print("\n LOADING OPENFLIGHTS DATASET")
+# ✅ STEPS 1-3: CREATE MARIA DB TABLES AND LOAD THE OPENFLIGHTS DATASET
+print("\n LOADING OPENFLIGHTS DATASET INTO MARIA DB")
 print("=" * 50)
 
 # Set correct path
 data_path = "data/"
 
-# Load .dat files using Pandas
-print(" Loading OpenFlights dataset files...")
-
-try:
-    airports = pd.read_csv(data_path + "airports.dat",
-                           header=None,
-                           names=[
-                               "airport_id", "name", "city", "country",
-                               "iata", "icao", "latitude", "longitude",
-                               "altitude", "timezone", "dst", "tz_database_time_zone",
-                               "type", "source"
-                           ],
-                           na_values="\\N")
-
-    airlines = pd.read_csv(data_path + "airlines.dat",
-                           header=None,
-                           names=[
-                               "airline_id", "name", "alias", "iata",
-                               "icao", "callsign", "country", "active"
-                           ],
-                           na_values="\\N")
-
-    routes = pd.read_csv(data_path + "routes.dat",
-                         header=None,
-                         names=[
-                             "airline", "airline_id", "source_airport",
-                             "source_airport_id", "dest_airport",
-                             "dest_airport_id", "codeshare",
-                             "stops", "equipment"
-                         ],
-                         na_values="\\N")
-
-    print(" OpenFlights dataset loaded successfully!")
-    print(f"Airports: {len(airports):,} records")
-    print(f" Airlines: {len(airlines):,} records")
-    print(f" Routes: {len(routes):,} records")
-
-    #  CRITICAL FIX: Replace NaN with None (important for MySQL)
-    print("\n🔧 Converting NaN values to None for MySQL compatibility...")
-    airports = airports.where(pd.notnull(airports), None)
-    airlines = airlines.where(pd.notnull(airlines), None)
-    routes = routes.where(pd.notnull(routes), None)
-
-    #  Additional safe string handling
-    airports = airports.astype(object).where(pd.notnull(airports), None)
-    airlines = airlines.astype(object).where(pd.notnull(airlines), None)
-    routes = routes.astype(object).where(pd.notnull(routes), None)
-
-    print(" NaN to None conversion completed!")
-
-    # Show sample data
-    print("\n SAMPLE AIRPORTS DATA:")
-    print(airports.head(3))
-
-    print("\n SAMPLE AIRLINES DATA:")
-    print(airlines.head(3))
-
-    print("\n SAMPLE ROUTES DATA:")
-    print(routes.head(3))
-
-except Exception as e:
-    print(f"Error loading OpenFlights dataset: {e}")
-    print(" Make sure the data files are in the correct path: ../data/")
-    exit(1)
-
-# STEP 2: CREATE MARIA DB TABLES FOR OPENFLIGHTS DATASET
-print("\n CREATING MARIA DB TABLES FOR OPENFLIGHTS")
-print("=" * 50)
+# Stream the .dat files with LOAD DATA LOCAL INFILE (multi-row INSERT when the server refuses it),
+# one table per pooled connection. Secondary indexes are skipped: step 4 starts from an unindexed database.
+from mariadb_autoopt.loader import OPENFLIGHTS_TABLES, load_openflights
+from mariadb_autoopt.pool import ConnectionPool, make_connection_factory
 
 try:
-    with conn.cursor() as cursor:
-        # Drop existing tables if they exist
-        cursor.execute("DROP TABLE IF EXISTS routes, airports, airlines")
-
-        # Create airports table
-        cursor.execute("""
-                       CREATE TABLE IF NOT EXISTS airports
-                       (
-                           airport_id
-                           INT
-                           PRIMARY
-                           KEY,
-                           name
-                           VARCHAR
-                       (
-                           255
-                       ),
-                           city VARCHAR
-                       (
-                           100
-                       ),
-                           country VARCHAR
-                       (
-                           100
-                       ),
-                           iata VARCHAR
-                       (
-                           10
-                       ),
-                           icao VARCHAR
-                       (
-                           10
-                       ),
-                           latitude DOUBLE,
-                           longitude DOUBLE,
-                           altitude INT,
-                           timezone FLOAT,
-                           dst VARCHAR
-                       (
-                           10
-                       ),
-                           tz_database_time_zone VARCHAR
-                       (
-                           100
-                       ),
-                           type VARCHAR
-                       (
-                           50
-                       ),
-                           source VARCHAR
-                       (
-                           50
-                       )
-                           )
-                       """)
-
-        # Create airlines table
-        cursor.execute("""
-                       CREATE TABLE IF NOT EXISTS airlines
-                       (
-                           airline_id
-                           INT
-                           PRIMARY
-                           KEY,
-                           name
-                           VARCHAR
-                       (
-                           255
-                       ),
-                           alias VARCHAR
-                       (
-                           255
-                       ),
-                           iata VARCHAR
-                       (
-                           10
-                       ),
-                           icao VARCHAR
-                       (
-                           10
-                       ),
-                           callsign VARCHAR
-                       (
-                           255
-                       ),
-                           country VARCHAR
-                       (
-                           100
-                       ),
-                           active VARCHAR
-                       (
-                           5
-                       )
-                           )
-                       """)
-
-        # Create routes table
-        cursor.execute("""
-                       CREATE TABLE IF NOT EXISTS routes
-                       (
-                           id
-                           INT
-                           AUTO_INCREMENT
-                           PRIMARY
-                           KEY,
-                           airline
-                           VARCHAR
-                       (
-                           10
-                       ),
-                           airline_id INT,
-                           source_airport VARCHAR
-                       (
-                           10
-                       ),
-                           source_airport_id INT,
-                           dest_airport VARCHAR
-                       (
-                           10
-                       ),
-                           dest_airport_id INT,
-                           codeshare VARCHAR
-                       (
-                           10
-                       ),
-                           stops INT,
-                           equipment VARCHAR
-                       (
-                           255
-                       )
-                           )
-                       """)
-
-        print(" OpenFlights tables created successfully!")
-
+    with ConnectionPool(make_connection_factory(**DB_SETTINGS), size=len(OPENFLIGHTS_TABLES)) as load_pool:
+        load_results = load_openflights(load_pool, data_path, indexes=False)
 except Exception as e:
-    print(f" Error creating tables: {e}")
+    print(f" Error loading OpenFlights dataset: {e}")
+    print(" Make sure the data files are in the correct path: data/")
     exit(1)
 
-#  STEP 3: INSERT DATA FROM PANDAS → MARIADB
-print("\n INSERTING OPENFLIGHTS DATA INTO MARIA DB")
-print("=" * 50)
-
-
-def insert_dataframe_to_table(conn, df, table_name, batch_size=1000):
-    """Insert DataFrame data into MariaDB table with batch processing"""
-    if df.empty:
-        print(f" DataFrame for {table_name} is empty")
-        return 0
-
-    try:
-        with conn.cursor() as cursor:
-            total_rows = len(df)
-            print(f" Inserting {total_rows:,} rows into {table_name}...")
-
-            # Get column names
-            columns = df.columns.tolist()
-            placeholders = ', '.join(['%s'] * len(columns))
-            column_names = ', '.join(columns)
-
-            insert_sql = f"INSERT IGNORE INTO {table_name} ({column_names}) VALUES ({placeholders})"
-
-            # Batch insert for performance
-            inserted_count = 0
-            for i in range(0, total_rows, batch_size):
-                batch = df.iloc[i:i + batch_size]
-                batch_data = [tuple(row) for row in batch.itertuples(index=False)]
-
-                cursor.executemany(insert_sql, batch_data)
-                inserted_count += len(batch_data)
-
-                if i + batch_size < total_rows:
-                    print(f"   {min(i + batch_size, total_rows):,}/{total_rows:,} rows inserted...")
-
-            conn.commit()
-            print(f" Successfully inserted {inserted_count:,} rows into {table_name}")
-            return inserted_count
-
-    except Exception as e:
-        print(f" Error inserting data into {table_name}: {e}")
-        conn.rollback()
-        return 0
-
-
-# Insert all three datasets
-airports_inserted = insert_dataframe_to_table(conn, airports, "airports")
-airlines_inserted = insert_dataframe_to_table(conn, airlines, "airlines")
-routes_inserted = insert_dataframe_to_table(conn, routes, "routes")
-
 print(f"\n DATA INSERTION SUMMARY:")
-print(f"    Airports: {airports_inserted:,} rows")
-print(f"    Airlines: {airlines_inserted:,} rows")
-print(f"    Routes: {routes_inserted:,} rows")
+for table, result in load_results["tables"].items():
+    print(f"    {table.capitalize()}: {result['rows']:,} rows ({result['rows_per_second'] or 0:,.0f} rows/s)")
+print(f"    Total: {load_results['rows']:,} rows in {load_results['seconds']:.2f}s "
+      f"on {load_results['workers']} connections")
 
 # Check final table sizes
 print("\n FINAL TABLE SIZES IN DATABASE:")
@@ -894,6 +798,9 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
 
     # Get baseline performance
     print(f"\n BASELINE PERFORMANCE:")
+    predicted = predict_query_time(conn, query)
+    if predicted is not None:
+        print(f" Predicted from plan: {predicted:.3f}s ({latency_model.accuracy_report()})")
     baseline_stats = run_query_multiple_times(conn, query, num_runs=3, clear_cache=True)
 
     if not baseline_stats:
@@ -901,6 +808,7 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
         return None
 
     print(f" Baseline (median): {baseline_stats['median']:.3f}s")
+    record_latency_sample(conn, query, baseline_stats)
 
     # Only optimize if query is slow enough to benefit (adjustable threshold)
     if baseline_stats['median'] < optimization_threshold:  # Now adjustable
@@ -913,11 +821,13 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
             'skipped': True
         }
 
-    # Use enhanced strategy
-    strategy = enhanced_optimization_strategy(conn, query)
+    # Use enhanced strategy, unless a past optimization of this query shape says otherwise
+    strategy, context = enhanced_optimization_strategy(conn, query)
+    strategy = reuse_learnings(query, strategy)
 
     if strategy == "analyze_only":
         print(" Analysis only - no indexes created")
+        record_strategy_reward(strategy, context)
         return {
             'before_time': baseline_stats['median'],
             'after_time': baseline_stats['median'],
@@ -926,12 +836,18 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
             'skipped': True
         }
 
+    # Correlated subqueries can only be fixed so far by indexes; check a JOIN rewrite first
+    advise_subquery_rewrite(conn, query)
+
     # Create smart indexes
     print(f"\n Applying {strategy} strategy...")
-    created_indexes = create_smart_indexes(conn, query)
+    build_start = time.perf_counter()
+    created_indexes = create_smart_indexes(conn, query, strategy)
+    build_seconds = time.perf_counter() - build_start
 
     if not created_indexes:
         print(" No relevant indexes to create")
+        record_strategy_reward(strategy, context)
         return {
             'before_time': baseline_stats['median'],
             'after_time': baseline_stats['median'],
@@ -951,10 +867,15 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
         return None
 
     print(f" Optimized (median): {optimized_stats['median']:.3f}s")
+    record_latency_sample(conn, query, optimized_stats)
 
     # Calculate improvement
     improvement = ((baseline_stats['median'] - optimized_stats['median']) / baseline_stats['median']) * 100
 
+    record_query_performance(query, baseline_stats['times'], optimized_stats['times'], strategy,
+                             indexes=created_indexes)
+    record_strategy_reward(strategy, context, baseline_stats['times'], optimized_stats['times'], build_seconds)
+
     # Validate improvement
     if validate_query_improvement(conn, query, baseline_stats['median'], optimized_stats['median']):
         print(f" VALIDATED: {improvement:.1f}% improvement")
@@ -964,6 +885,7 @@ def run_smart_optimizer_demo(conn, query, description, optimization_threshold=0.
         # Roll back indexes
         cleanup_indexes(conn, created_indexes)
         keep_indexes = False
+        explore_without_indexes(conn, query)
 
     # Create visualization
     if keep_indexes:
@@ -1187,7 +1109,8 @@ print("\n OPTIMIZATION STRATEGY SUMMARY:")
 size_label, rows = detect_table_size(conn, "routes")
 print(f" Routes Table Size: {rows:,} rows ({size_label})")
 print(f" Query Cache: {len(query_cache)} queries cached")
-print(f" Learning History: {len(query_history)} queries learned")
+print(f" Learning History: {learning_store.count()} outcomes stored in {learning_store.path}")
+print(f" Strategy Bandit: " + ", ".join(f"{arm} {n}x" for arm, n in strategy_bandit.pulls.items()))
 
 if 'avg_improvement' in locals():
     print(f"⚡ Average Performance Improvement: {avg_improvement:.1f}%")
@@ -8,8 +8,6 @@ import os
 import sys
 import re
 import warnings
-import requests
-import io
 
 # Suppress pandas warnings
 warnings.filterwarnings('ignore', message='.*pandas only supports SQLAlchemy connectable.*')
@@ -18,6 +16,10 @@ warnings.filterwarnings('ignore', message='.*pandas only supports SQLAlchemy con
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from mariadb_autoopt import optimizer  # ✅ Use your existing modules
+from mariadb_autoopt.core import create_covering_indexes, create_order_indexes
+from mariadb_autoopt.datasets import DEFAULT_DATA_DIR, load_openflights_datasets
+from mariadb_autoopt.loader import OPENFLIGHTS_TABLES, create_openflights_tables, load_openflights
+from mariadb_autoopt.pool import ConnectionPool
 
 # --- Database Connection Setup ---
 DB_HOST = os.getenv("AUTOOPT_DB_HOST", "serverless-us-central1.sysp0000.db2.skysql.com")
@@ -27,23 +29,33 @@ DB_PASS = os.getenv("AUTOOPT_DB_PASS", "Rn@08022005")
 DB_NAME = os.getenv("AUTOOPT_DB_NAME", "autoopt_db")
 
 # --- Connect Function ---
+def open_connection():
+    return pymysql.connect(
+        host=DB_HOST, 
+        port=DB_PORT, 
+        user=DB_USER,
+        password=DB_PASS, 
+        database=DB_NAME, 
+        ssl={'ssl': {}},
+        connect_timeout=10,
+        local_infile=True,  # Bulk loading with LOAD DATA LOCAL INFILE
+        autocommit=True  # Better transaction handling
+    )
+
 def get_connection():
     try:
-        conn = pymysql.connect(
-            host=DB_HOST, 
-            port=DB_PORT, 
-            user=DB_USER,
-            password=DB_PASS, 
-            database=DB_NAME, 
-            ssl={'ssl': {}},
-            connect_timeout=10,
-            autocommit=True  # Better transaction handling
-        )
-        return conn
+        return open_connection()
     except Exception as e:
         st.error(f"❌ Database connection failed: {e}")
         return None
 
+def source_datasets():
+    """The data/*.dat files as DataFrames, memory-mapped from the dataset cache (None if a file is missing)"""
+    try:
+        return load_openflights_datasets(DEFAULT_DATA_DIR)
+    except OSError:
+        return None
+
 def clear_database_cache(conn):
     """Clear database cache for consistent benchmarking"""
     try:
@@ -243,6 +255,24 @@ def create_smart_indexes_for_query(conn, query):
                     if "Duplicate key name" not in str(e):
                         st.warning(f"Failed to create index {idx_name}: {e}")
     
+    # Covering indexes spare the row lookup per match; keep only those EXPLAIN reads index-only
+    for candidate in create_covering_indexes(conn, query, verbose=False):
+        if candidate["kept"]:
+            created_indexes.append(candidate["index"])
+            st.success(f"✓ Covering index: `{candidate['index']}` ({', '.join(candidate['columns'])})")
+        elif candidate["status"] != "exists":
+            st.info(f"Dropped covering index `{candidate['index']}`: {candidate['status']}")
+    
+    # Ordered indexes for top-N ORDER BY ... LIMIT and GROUP BY MIN/MAX; kept when the sort disappears
+    for candidate in create_order_indexes(conn, query, verbose=False):
+        if candidate["kept"]:
+            created_indexes.append(candidate["index"])
+            st.success(f"✓ {candidate['shape']} index: `{candidate['index']}` (no filesort/temporary)")
+        elif candidate["status"] == "advice":
+            st.info(candidate["note"])
+        elif candidate["status"] not in ("exists", "not_needed"):
+            st.info(f"Dropped {candidate['shape']} index `{candidate['index']}`: {candidate['status']}")
+    
     return created_indexes
 
 def display_performance_comparison(baseline_stats, optimized_stats, improvement_validated=True):
@@ -365,182 +395,41 @@ def check_data_volume(conn):
     
     return table_counts
 
-def download_openflights_data():
-    """Download the complete OpenFlights dataset from GitHub"""
-    base_url = "https://raw.githubusercontent.com/jpatokal/openflights/master/data/"
-    datasets = {
-        "airports": f"{base_url}airports.dat",
-        "airlines": f"{base_url}airlines.dat", 
-        "routes": f"{base_url}routes.dat"
-    }
-    
-    data = {}
-    for name, url in datasets.items():
-        try:
-            st.write(f"📥 Downloading {name} dataset...")
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            # Read into pandas
-            if name == "airports":
-                df = pd.read_csv(io.StringIO(response.text), header=None, names=[
-                    "airport_id", "name", "city", "country", "iata", "icao", 
-                    "latitude", "longitude", "altitude", "timezone", "dst", 
-                    "tz_database_time_zone", "type", "source"
-                ], na_values="\\N")
-            elif name == "airlines":
-                df = pd.read_csv(io.StringIO(response.text), header=None, names=[
-                    "airline_id", "name", "alias", "iata", "icao", "callsign", 
-                    "country", "active"
-                ], na_values="\\N")
-            elif name == "routes":
-                df = pd.read_csv(io.StringIO(response.text), header=None, names=[
-                    "airline", "airline_id", "source_airport", "source_airport_id",
-                    "dest_airport", "dest_airport_id", "codeshare", "stops", "equipment"
-                ], na_values="\\N")
-            
-            # Convert NaN to None for MySQL
-            df = df.where(pd.notnull(df), None)
-            df = df.astype(object).where(pd.notnull(df), None)
-            
-            data[name] = df
-            st.success(f"✅ Downloaded {name}: {len(df):,} records")
-            
-        except Exception as e:
-            st.error(f"❌ Failed to download {name}: {e}")
-            return None
-    
-    return data
-
 def load_complete_openflights_data(conn):
     """Load COMPLETE OpenFlights dataset with ALL data"""
     try:
         st.write("## 🗂️ Loading Complete OpenFlights Dataset")
-        st.write("This will download and load the FULL OpenFlights dataset with:")
-        st.write("- 🌍 7,000+ airports worldwide")
-        st.write("- ✈️ 6,000+ airlines") 
-        st.write("- 🛣️ 67,000+ flight routes")
-        st.write("This may take 1-2 minutes...")
-        
-        # Download data
-        data = download_openflights_data()
-        if not data:
-            st.error("❌ Failed to download OpenFlights data")
+        missing = [spec["file"] for spec in OPENFLIGHTS_TABLES.values()
+                   if not os.path.exists(os.path.join(DEFAULT_DATA_DIR, spec["file"]))]
+        if missing:
+            st.error(f"❌ Missing OpenFlights data files in {DEFAULT_DATA_DIR}: {', '.join(missing)}")
             return False
+
+        st.write("This will load the FULL OpenFlights dataset from the repository's data/ directory with:")
+        for name, frame in source_datasets().items():
+            st.write(f"- {len(frame):,} {name}")
+        st.write("This may take 1-2 minutes...")
         
-        # Create tables
-        with conn.cursor() as cursor:
-            # Drop existing tables if they exist
-            cursor.execute("DROP TABLE IF EXISTS routes, airports, airlines")
-            
-            # Create airports table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS airports (
-                    airport_id INT PRIMARY KEY,
-                    name VARCHAR(255),
-                    city VARCHAR(100),
-                    country VARCHAR(100),
-                    iata VARCHAR(10),
-                    icao VARCHAR(10),
-                    latitude DOUBLE,
-                    longitude DOUBLE,
-                    altitude INT,
-                    timezone FLOAT,
-                    dst VARCHAR(10),
-                    tz_database_time_zone VARCHAR(100),
-                    type VARCHAR(50),
-                    source VARCHAR(50)
-                )
-            """)
-            
-            # Create airlines table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS airlines (
-                    airline_id INT PRIMARY KEY,
-                    name VARCHAR(255),
-                    alias VARCHAR(255),
-                    iata VARCHAR(10),
-                    icao VARCHAR(10),
-                    callsign VARCHAR(255),
-                    country VARCHAR(100),
-                    active VARCHAR(5)
-                )
-            """)
-            
-            # Create routes table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS routes (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    airline VARCHAR(10),
-                    airline_id INT,
-                    source_airport VARCHAR(10),
-                    source_airport_id INT,
-                    dest_airport VARCHAR(10),
-                    dest_airport_id INT,
-                    codeshare VARCHAR(10),
-                    stops INT,
-                    equipment VARCHAR(255)
-                )
-            """)
-        
+        # Create the tables and stream the files in (LOAD DATA LOCAL INFILE, else multi-row INSERT),
+        # one table per pooled connection
+        create_openflights_tables(conn)
         st.success("✅ Tables created successfully!")
-        
-        # Insert data with batch processing
-        def insert_dataframe_to_table(conn, df, table_name, batch_size=1000):
-            if df.empty:
-                st.warning(f"DataFrame for {table_name} is empty")
-                return 0
-
-            try:
-                with conn.cursor() as cursor:
-                    total_rows = len(df)
-                    st.write(f"Inserting {total_rows:,} rows into {table_name}...")
-
-                    # Get column names
-                    columns = df.columns.tolist()
-                    placeholders = ', '.join(['%s'] * len(columns))
-                    column_names = ', '.join(columns)
-
-                    insert_sql = f"INSERT IGNORE INTO {table_name} ({column_names}) VALUES ({placeholders})"
-
-                    # Batch insert for performance
-                    inserted_count = 0
-                    progress_bar = st.progress(0)
-                    
-                    for i in range(0, total_rows, batch_size):
-                        batch = df.iloc[i:i + batch_size]
-                        batch_data = [tuple(row) for row in batch.itertuples(index=False)]
-                        
-                        try:
-                            cursor.executemany(insert_sql, batch_data)
-                            inserted_count += len(batch_data)
-                        except Exception as e:
-                            st.warning(f"Batch insert warning: {e}")
-                            # Continue with next batch
-
-                        # Update progress
-                        progress = min(i + batch_size, total_rows) / total_rows
-                        progress_bar.progress(progress)
-
-                    conn.commit()
-                    st.success(f"✅ Successfully inserted {inserted_count:,} rows into {table_name}")
-                    return inserted_count
-
-            except Exception as e:
-                st.error(f"Error inserting data into {table_name}: {e}")
-                conn.rollback()
-                return 0
-
-        # Insert all datasets
-        airports_inserted = insert_dataframe_to_table(conn, data["airports"], "airports")
-        airlines_inserted = insert_dataframe_to_table(conn, data["airlines"], "airlines") 
-        routes_inserted = insert_dataframe_to_table(conn, data["routes"], "routes")
+        st.write(f"Loading {', '.join(OPENFLIGHTS_TABLES)} in parallel...")
+        with ConnectionPool(open_connection, size=len(OPENFLIGHTS_TABLES)) as pool:
+            loaded = load_openflights(pool, DEFAULT_DATA_DIR, create=False, indexes=False, verbose=False)
+        results = loaded["tables"]
+        for table, result in results.items():
+            if result.get("fallback_reason"):
+                st.info(f"LOAD DATA LOCAL INFILE unavailable, used multi-row INSERT: {result['fallback_reason']}")
+            st.success(f"✅ Loaded {result['rows']:,} rows into {table} "
+                       f"({result['rows_per_second'] or 0:,.0f} rows/s)")
+        st.write(f"Loaded {loaded['rows']:,} rows in {loaded['seconds']:.2f}s on {loaded['workers']} connections")
 
         st.success("🎉 Complete OpenFlights dataset loaded successfully!")
         st.write("**Final Data Volume:**")
-        st.write(f"- Airports: {airports_inserted:,} rows")
-        st.write(f"- Airlines: {airlines_inserted:,} rows")
-        st.write(f"- Routes: {routes_inserted:,} rows")
+        st.write(f"- Airports: {results['airports']['rows']:,} rows")
+        st.write(f"- Airlines: {results['airlines']['rows']:,} rows")
+        st.write(f"- Routes: {results['routes']['rows']:,} rows")
         
         return True
 
@@ -821,6 +710,16 @@ if run_comparison or show_suggestions:
     finally:
         safe_close_connection(conn)
 
+# --- Source Data Browser ---
+with st.sidebar.expander("🔎 Browse Source Data"):
+    source = source_datasets()
+    if source is None:
+        st.warning(f"OpenFlights data files not found in {DEFAULT_DATA_DIR}")
+    else:
+        dataset = st.selectbox("Dataset:", list(source))
+        st.caption(f"{len(source[dataset]):,} records in {OPENFLIGHTS_TABLES[dataset]['file']}")
+        st.dataframe(source[dataset].head(100))
+
 # --- Current Index Status ---
 st.sidebar.header("Database Status")
 if st.sidebar.button("📊 Show Current Indexes"):
@@ -861,7 +760,7 @@ st.sidebar.info(
 with st.sidebar.expander("🔧 Optimization Strategy"):
     st.write("""
     **Complete OpenFlights Demo:**
-    - ✅ Downloads FULL OpenFlights data from GitHub
+    - ✅ Loads FULL OpenFlights data from data/
     - ✅ 7,000+ airports, 6,000+ airlines, 67,000+ routes
     - ✅ Drops ALL indexes before each run
     - ✅ Uses 10ms optimization threshold